@@ -0,0 +1,388 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+import numpy as np
+import plotly.graph_objects as go
+
+import geometry
+import rose
+import rose_bouquet
+import rose_field
+import rose_head
+import traces
+from plot_export import figure_to_html, write_html
+from transforms import rotation_matrices
+
+# Baseline results that `--compare` checks against by default
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark-baseline.json'
+
+# Numbers of roses in the generated rose field scenes; 1000 needs several GB of memory
+SCENE_SIZES = (1, 10, 100, 1000)
+DEFAULT_SCENE_SIZES = (1, 10, 100)
+
+# Relative growth of the peak memory or output size that counts as a regression in comparison mode
+DEFAULT_TOLERANCE = 0.15
+
+# Relative slowdown that counts as a regression; the best of several runs still varies by up to
+# 1.3x between runs of the whole suite, so timings need a wider margin than sizes
+DEFAULT_TIME_TOLERANCE = 0.5
+
+# Number of times a benchmark that looks slower than its baseline is measured again, keeping the fastest run
+CONFIRM_RUNS = 3
+
+
+class Benchmark(NamedTuple):
+    """
+    Describes one measured operation.
+
+    Attributes:
+        name (str): Unique name of the benchmark, used as the key in saved results.
+        setup (Callable): Called once before measuring; its result is passed to `run`.
+        run (Callable): The operation being measured. If it returns a str or bytes, the
+            length of that output is recorded as well.
+    """
+    name: str
+    setup: Callable
+    run: Callable
+
+
+def build_rose_field(num_roses: int, seed: int = 0, dtype: np.dtype = np.float64) -> go.Figure:
+    """
+    Build a figure with a square grid of stems, each topped with a rose.
+
+    Args:
+        num_roses (int): Number of roses in the scene.
+        seed (int): Seed for the thorn angles.
+        dtype (np.dtype): Floating point type of every coordinate.
+
+    Returns:
+        go.Figure: The figure holding every stem, rose and a single merged thorn trace.
+    """
+    fig = go.Figure()
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(num_roses)))
+
+    thorns = []
+    for index in range(num_roses):
+        x_offset, y_offset = 2.0 * (index % side), 2.0 * (index // side)
+        thorns.append(traces.create_stem(fig, height=3, x_offset=x_offset, y_offset=y_offset,
+                                         rng=rng, add_thorns=False, dtype=dtype))
+        x_top, y_top, z_top = geometry.get_stem_top_center(3, x_offset, y_offset)
+        traces.create_rose(fig, x_top, y_top, z_top - 0.4, dtype=dtype)
+    traces.add_thorn_trace(fig, np.concatenate(thorns))
+
+    return fig
+
+
+def dense_rose_head(n_radial: int = 25, n_theta: int = 1152) -> tuple:
+    """
+    Evaluate the rose head on the full meshgrid, the way `geometry` did before its kernel was factored.
+
+    Kept as the reference that the separable `geometry.rose_head_kernel` is timed and checked against.
+
+    Args:
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+
+    Returns:
+        tuple: The (n_theta, n_radial) X, Y and Z arrays of a rose head at the origin.
+    """
+    xr, tr = np.meshgrid(np.linspace(0, 1, n_radial), np.linspace(0, 20 * np.pi, n_theta) + 4 * np.pi)
+    p = (np.pi / 2) * np.exp(-tr / (8 * np.pi))
+    cr = np.sin(15 * tr) / 150
+    u = 1 - (1 - np.mod(3.6 * tr, 2 * np.pi) / np.pi) ** 4 / 2 + cr
+    yr = 2 * (xr**2 - xr)**2 * np.sin(p)
+    rr = u * (xr * np.sin(p) + yr * np.cos(p))
+    hr = u * (xr * np.cos(p) - yr * np.sin(p))
+    return rr * np.cos(tr), rr * np.sin(tr), hr + 0.35
+
+
+def check_kernel(num_heads: int = 16, seed: int = 0) -> float:
+    """
+    Check that the separable rose head kernel reproduces the dense reference.
+
+    Args:
+        num_heads (int): Number of randomly rotated and moved heads to compare in the batched call.
+        seed (int): Seed for the rotations and offsets.
+
+    Returns:
+        float: The largest absolute difference found.
+    """
+    rng = np.random.default_rng(seed)
+    angles, offsets = rng.uniform(-np.pi, np.pi, (num_heads, 3)), rng.uniform(-5, 5, (num_heads, 3))
+    dense = dense_rose_head()
+
+    errors = [np.abs(np.stack(geometry.rose_head_template()) - np.stack(dense)).max()]
+    batch = geometry.meshgrid_transforms_batch(offsets, rotation_matrices(angles))
+    for head, angle, offset in zip(batch, angles, offsets):
+        expected = np.stack(geometry.rotate_xyz(*dense, *angle)) + offset[:, None, None]
+        errors.append(np.abs(head - expected).max())
+    return float(max(errors))
+
+
+def check_float32(num_roses: int = 100, seed: int = 0) -> dict:
+    """
+    Compare a scene built in float32 with the same scene built in float64.
+
+    Args:
+        num_roses (int): Number of roses in the rose field scene.
+        seed (int): Seed for the thorn angles.
+
+    Returns:
+        dict: The largest coordinate difference and the tolerance it must stay within, which is
+              a few float32 rounding steps of the largest coordinate, plus the bytes of
+              coordinate arrays held by each figure and the peak traced memory of each build.
+    """
+    figures, peaks = {}, {}
+    for dtype in (np.float64, np.float32):
+        build_rose_field(1, seed, dtype)  # Warm the template caches, which are not part of the scene
+        gc.collect()
+        tracemalloc.start()
+        figures[dtype] = build_rose_field(num_roses, seed, dtype)
+        peaks[dtype] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    pairs = [(np.asarray(full[key]), np.asarray(single[key]))
+             for full, single in zip(figures[np.float64].data, figures[np.float32].data) for key in 'xyz']
+    assert all(values.dtype == np.float32 for _, values in pairs)
+    max_abs = max(np.nanmax(np.abs(full)) for full, _ in pairs)
+
+    return {'max_error': float(max(np.nanmax(np.abs(single - full)) for full, single in pairs)),
+            'tolerance': float(4 * np.finfo(np.float32).eps * max_abs),
+            'bytes': {dtype: sum(np.asarray(trace[key]).nbytes for trace in fig.data for key in 'xyz')
+                      for dtype, fig in figures.items()},
+            'peak_bytes': peaks}
+
+
+def transform_loop(offsets: np.ndarray, angles: np.ndarray) -> list:
+    """
+    Place many rose heads one at a time, the way the figure builders do.
+
+    Args:
+        offsets (np.ndarray): The (N, 3) offset of every head.
+        angles (np.ndarray): The (N, 3) rotation angles of every head.
+
+    Returns:
+        list: The (X, Y, Z) arrays of every head.
+    """
+    heads = []
+    for offset, angle in zip(offsets, angles):
+        X, Y, Z = geometry.rotate_xyz(*geometry.rose_head_template(), *angle)
+        heads.append((X + offset[0], Y + offset[1], Z + offset[2]))
+    return heads
+
+
+def benchmarks(scene_sizes: List[int] = DEFAULT_SCENE_SIZES) -> List[Benchmark]:
+    """
+    List every benchmark of the geometry, figure assembly and HTML export hot paths.
+
+    Args:
+        scene_sizes (list): Numbers of roses for the rose field scenes.
+
+    Returns:
+        list: The benchmarks, in the order they are run.
+    """
+    surface = geometry.meshgrid_transforms()
+    wrap_adjustments = np.pi * np.cos(np.linspace(0, 2 * np.pi, 60))
+
+    batch_rng = np.random.default_rng(0)
+    batch_offsets, batch_angles = batch_rng.uniform(-5, 5, (64, 3)), batch_rng.uniform(-np.pi, np.pi, (64, 3))
+
+    cases = [
+        # Geometry kernels
+        Benchmark('geometry/rose_head_template (dense)', lambda: None, lambda _: dense_rose_head()),
+        Benchmark('geometry/rose_head_template (uncached)', lambda: None,
+                  lambda _: geometry.rose_head_template.__wrapped__(25, 1152)),
+        Benchmark('geometry/meshgrid_transforms', lambda: None,
+                  lambda _: geometry.meshgrid_transforms(0.2, 0.1, 2.6)),
+        Benchmark('geometry/meshgrid_transforms[out]', lambda: np.empty((3, 1152, 25)),
+                  lambda out: geometry.meshgrid_transforms(0.2, 0.1, 2.6, out=out)),
+        Benchmark('geometry/meshgrid_transforms[float32]', lambda: None,
+                  lambda _: geometry.meshgrid_transforms(0.2, 0.1, 2.6, dtype=np.float32)),
+        Benchmark('geometry/place 64 heads (loop)', lambda: None,
+                  lambda _: transform_loop(batch_offsets, batch_angles)),
+        Benchmark('geometry/place 64 heads (batch)', lambda: None,
+                  lambda _: geometry.meshgrid_transforms_batch(batch_offsets, rotation_matrices(batch_angles))),
+        Benchmark('geometry/place 64 heads (batch, out)', lambda: np.empty((64, 3, 1152, 25)),
+                  lambda out: geometry.meshgrid_transforms_batch(batch_offsets, rotation_matrices(batch_angles),
+                                                                 out=out)),
+        Benchmark('geometry/rotate_xyz', lambda: None,
+                  lambda _: geometry.rotate_xyz(*surface, 0.3, -0.2, 1.1)),
+        Benchmark('geometry/rotate_xyz[float32]', lambda: [values.astype(np.float32) for values in surface],
+                  lambda single: geometry.rotate_xyz(*single, 0.3, -0.2, 1.1)),
+        Benchmark('geometry/create_stem', lambda: None,
+                  lambda _: traces.create_stem(go.Figure(), height=3, angle_x=0.3, angle_z=1.1,
+                                               rng=np.random.default_rng(0))),
+        Benchmark('geometry/create_asymmetrical_wrap', lambda: None,
+                  lambda _: rose_bouquet.create_asymmetrical_wrap(go.Figure(), base_radius=0.15, top_radius=2.15,
+                                                                  height=2.3, z_offset=0.6, color='pink',
+                                                                  angular_adjustments=wrap_adjustments)),
+    ]
+
+    # Named scenes served on the flower pages
+    scenes = {
+        'single_rose': lambda: rose.build_single_rose_figure(seed=0),
+        'rose_head': rose_head.build_rose_head_figure,
+        'bouquet': lambda: rose_bouquet.build_rose_bouquet_figure(seed=0),
+        'bouquet[float32]': lambda: rose_bouquet.build_rose_bouquet_figure(seed=0, dtype=np.float32),
+    }
+    scenes.update({f'field_{size}': (lambda size=size: build_rose_field(size)) for size in scene_sizes})
+    scenes.update({f'field_{size}[float32]': (lambda size=size: build_rose_field(size, dtype=np.float32))
+                   for size in scene_sizes})
+    scenes.update({f'instanced_field_{size}': (lambda size=size: rose_field.build_rose_field(
+        **rose_field.random_rose_field(size))) for size in scene_sizes})
+    scenes.update({f'instanced_field_{size}[lod]': (lambda size=size: rose_field.build_rose_field(
+        **rose_field.random_rose_field(size), lod=True)) for size in scene_sizes})
+
+    for scene, build in scenes.items():
+        cases.append(Benchmark(f'{scene}/assemble', lambda: None, lambda _, build=build: build()))
+        for encoding in (None, 'float32'):
+            cases.append(Benchmark(f'{scene}/to_html[{encoding or "json"}]', build,
+                                   lambda fig, encoding=encoding: figure_to_html(fig, encoding, include_plotlyjs='cdn')))
+        cases.append(Benchmark(f'{scene}/write_html[float32]', build,
+                               lambda fig: write_html(fig, os.devnull, 'float32', include_plotlyjs='cdn')))
+
+    return cases
+
+
+def measure(benchmark: Benchmark, min_time: float = 0.5, max_repeats: int = 50) -> dict:
+    """
+    Time a benchmark and measure its peak traced memory and output size.
+
+    The operation is repeated until `min_time` has elapsed (or `max_repeats` runs were
+    made) and the fastest run is reported. Peak memory is taken from a separate run under
+    `tracemalloc`, so tracing overhead does not distort the timings.
+
+    Args:
+        benchmark (Benchmark): The benchmark to measure.
+        min_time (float): Minimum total time in seconds to spend on timed runs.
+        max_repeats (int): Maximum number of timed runs.
+
+    Returns:
+        dict: The best time in seconds, the number of timed runs, the peak memory in bytes
+              and the output size in bytes (None if the operation returns no text).
+    """
+    state = benchmark.setup()
+
+    timings = []
+    while len(timings) < max_repeats and (sum(timings) < min_time or len(timings) < 3):
+        gc.collect()
+        start = time.perf_counter()
+        output = benchmark.run(state)
+        timings.append(time.perf_counter() - start)
+    output_bytes = len(output) if isinstance(output, (str, bytes)) else None
+    del output
+
+    gc.collect()
+    tracemalloc.start()
+    benchmark.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'seconds': min(timings), 'runs': len(timings), 'peak_bytes': peak, 'output_bytes': output_bytes}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float = DEFAULT_TOLERANCE,
+            time_tolerance: float = DEFAULT_TIME_TOLERANCE, remeasure: Callable = None) -> List[str]:
+    """
+    Compare results against a saved baseline and print the relative change of every metric.
+
+    A timing beyond its tolerance only counts as a regression if it is still too slow after
+    `CONFIRM_RUNS` more measurements, of which the fastest is kept, so a busy moment during
+    one benchmark is not reported.
+
+    Args:
+        results (dict): Freshly measured results keyed by benchmark name.
+        baseline (dict): Previously saved results keyed by benchmark name.
+        tolerance (float): Relative increase of the peak memory or output size above which it
+            counts as a regression.
+        time_tolerance (float): Relative increase of the time above which it counts as a regression.
+        remeasure (Callable, optional): Measures the benchmark of the given name again, like `measure`.
+            Timings are not confirmed if None.
+
+    Returns:
+        list: Descriptions of every regression found.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f'{name:<45} (not in baseline)')
+            continue
+
+        changes = []
+        for metric in ('seconds', 'peak_bytes', 'output_bytes'):
+            old, new = baseline[name].get(metric), result[metric]
+            if not old or new is None:
+                continue
+            limit = 1 + (time_tolerance if metric == 'seconds' else tolerance)
+            if metric == 'seconds' and new / old > limit and remeasure is not None:
+                new = min([new] + [remeasure(name)['seconds'] for _ in range(CONFIRM_RUNS)])
+            ratio = new / old
+            changes.append(f'{metric} x{ratio:.2f}')
+            if ratio > limit:
+                regressions.append(f'{name}: {metric} {old:.4g} -> {new:.4g} (x{ratio:.2f})')
+        print(f"{name:<45} {', '.join(changes)}")
+
+    return regressions
+
+
+def format_result(name: str, result: dict) -> str:
+    """
+    Format one benchmark result as a table row.
+
+    Args:
+        name (str): The benchmark name.
+        result (dict): The measured result.
+
+    Returns:
+        str: A single line with the time, peak memory and output size.
+    """
+    output = f"{result['output_bytes'] / 1e6:9.3f} MB" if result['output_bytes'] is not None else ' ' * 12
+    return f"{name:<45} {result['seconds'] * 1e3:10.2f} ms {result['peak_bytes'] / 1e6:9.2f} MB peak {output}"
+
+
+# ****
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the rose geometry and HTML export hot paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SCENE_SIZES), choices=SCENE_SIZES,
+                        help='numbers of roses in the rose field scenes')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--save', nargs='?', const=BASELINE_PATH, type=Path, help='save the results as a baseline')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, type=Path, help='compare against a baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative increase of the peak memory or output size that counts as a regression')
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE,
+                        help='relative slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    print(f'rose head kernel vs. dense reference: max error {check_kernel():.2e}')
+    single = check_float32()
+    print(f"float32 vs. float64 field of 100 roses: max error {single['max_error']:.2e} "
+          f"(tolerance {single['tolerance']:.2e}), coordinates {single['bytes'][np.float64] / 1e6:.1f} MB -> "
+          f"{single['bytes'][np.float32] / 1e6:.1f} MB, build peak {single['peak_bytes'][np.float64] / 1e6:.1f} MB -> "
+          f"{single['peak_bytes'][np.float32] / 1e6:.1f} MB")
+
+    cases = {benchmark.name: benchmark for benchmark in benchmarks(args.sizes) if args.filter in benchmark.name}
+    results = {}
+    for name, benchmark in cases.items():
+        results[name] = measure(benchmark)
+        print(format_result(name, results[name]))
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        print(f'saved baseline to {args.save}')
+
+    if args.compare:
+        print(f'\ncomparison with {args.compare}:')
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance, args.time_tolerance,
+                              lambda name: measure(cases[name]))
+        if regressions:
+            print('\nregressions:\n    ' + '\n    '.join(regressions))
+            sys.exit(1)
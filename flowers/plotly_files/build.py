@@ -0,0 +1,296 @@
+import argparse
+import ast
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from precompress import CODINGS, precompress, require_brotli, served_bytes
+
+# Directory holding the flower scripts and the artifacts they generate
+PLOT_DIR = Path(__file__).resolve().parent
+
+# Records the input hash each artifact was last built from
+MANIFEST_PATH = PLOT_DIR / 'build-manifest.json'
+
+# Third-party packages whose versions can change the generated bytes
+PINNED_PACKAGES = ('numpy', 'plotly')
+
+# Local files a page loads: its scripts and the data blocks of the 'shared' encoding
+ASSET_PATTERN = re.compile(r'src="([^":]+\.js)"|"href":\s*"([^":]+)"')
+
+
+class Artifact(NamedTuple):
+    """
+    Describes how one plot artifact is generated.
+
+    Attributes:
+        module (str): Name of the flower module that generates the artifact.
+        function (str): Name of the function in that module generating the artifact. It must
+            accept a `file` keyword argument and write the artifact to that path.
+        params (dict): Keyword arguments passed to the function. Anything random must be
+            seeded here so that rebuilding produces byte-identical output.
+        inputs (tuple): Further files, relative to the plot directory, whose content the
+            artifact depends on, such as the template and script a page renders.
+    """
+    module: str
+    function: str
+    params: dict
+    inputs: tuple = ()
+
+
+# Every artifact the flower pages load, keyed by output file name
+ARTIFACTS: Dict[str, Artifact] = {
+    'rose-plot.html': Artifact('rose', 'plot_single_rose',
+                               {'encoding': 'shared', 'seed': 0, 'div_id': 'rose-plot'}),
+    'rose-head-plot.html': Artifact('rose_head', 'plot_rose_head',
+                                    {'encoding': 'shared', 'div_id': 'rose-head-plot'}),
+    'rose-bouquet-plot.html': Artifact('rose_bouquet', 'plot_rose_bouquet',
+                                       {'encoding': 'shared', 'seed': 0, 'div_id': 'rose-bouquet-plot'}),
+    'rose-bloom-plot.html': Artifact('rose_bloom', 'plot_rose_bloom',
+                                     {'encoding': 'shared', 'div_id': 'rose-bloom-plot'}),
+    'rose-poster.png': Artifact('poster', 'write_poster', {'scene': 'rose'}),
+    'rose-head-poster.png': Artifact('poster', 'write_poster', {'scene': 'rose_head'}),
+    'rose-bouquet-poster.png': Artifact('poster', 'write_poster', {'scene': 'bouquet'}),
+    # The flower pages one directory up, showing the geometry and figure code of the plot they embed
+    '../index.html': Artifact('pages', 'write_page',
+                              {'excerpt': ['geometry.HEAD_LIFT', 'geometry.PETAL_FREQUENCY', 'geometry.PETAL_DECAY',
+                                           'geometry.rose_head_factors', 'geometry.rose_head_kernel',
+                                           'geometry.meshgrid_transforms', 'geometry.stem_surface',
+                                           'geometry.generate_thorns', 'transforms.rotation_matrix',
+                                           'transforms.affine_matrix', 'rose.build_single_rose_figure'],
+                               'title': '3D Rose', 'plot': 'rose-plot.html', 'poster': 'rose-poster.png'},
+                              ('page-template.html', 'geometry.py', 'transforms.py', 'rose.py')),
+    '../rose-head.html': Artifact('pages', 'write_page',
+                                  {'excerpt': ['geometry.HEAD_LIFT', 'geometry.PETAL_FREQUENCY', 'geometry.PETAL_DECAY',
+                                               'geometry.rose_head_factors', 'geometry.rose_head_kernel',
+                                               'geometry.rose_head_template', 'geometry.meshgrid_transforms',
+                                               'rose_head.build_rose_head_figure'],
+                                   'title': '3D Rose Head', 'plot': 'rose-head-plot.html',
+                                   'poster': 'rose-head-poster.png'},
+                                  ('page-template.html', 'geometry.py', 'rose_head.py')),
+    '../rose-bouquet.html': Artifact('pages', 'write_page',
+                                     {'excerpt': ['geometry.STEM_ROWS', 'geometry.get_stem_top_center',
+                                                  'geometry.stem_surface', 'geometry.generate_thorns',
+                                                  'geometry.thorn_lines', 'geometry.wrap_surface',
+                                                  'transforms.rotation_matrix', 'transforms.affine_matrix',
+                                                  'rose_bouquet.build_rose_bouquet_figure'],
+                                      'title': '3D Rose Bouquet', 'plot': 'rose-bouquet-plot.html',
+                                      'poster': 'rose-bouquet-poster.png'},
+                                     ('page-template.html', 'geometry.py', 'transforms.py', 'rose_bouquet.py')),
+}
+
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    """
+    Check whether a module-level statement is an `if __name__ == '__main__':` block.
+
+    Args:
+        node (ast.stmt): A statement from a module's body.
+
+    Returns:
+        bool: True for the block that only runs when the module is executed as a script.
+    """
+    return (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == '__name__'
+            and any(isinstance(value, ast.Constant) and value.value == '__main__' for value in node.test.comparators))
+
+
+def local_dependencies(module: str) -> List[Path]:
+    """
+    Find the source files of a flower module and of every sibling module it imports.
+
+    Args:
+        module (str): Name of a module in the plot directory.
+
+    Returns:
+        list: Sorted paths of the module's own source and its local imports, recursively,
+              leaving out what only the modules' `__main__` blocks import.
+    """
+    seen = set()
+    pending = [module]
+    while pending:
+        name = pending.pop()
+        path = PLOT_DIR / f'{name}.py'
+        if name in seen or not path.exists():
+            continue
+        seen.add(name)
+
+        # Imports of a script's `__main__` block only serve running it by hand, not the artifact
+        body = [node for node in ast.parse(path.read_text()).body if not _is_main_guard(node)]
+        for node in (child for statement in body for child in ast.walk(statement)):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module)
+
+    return sorted(PLOT_DIR / f'{name}.py' for name in seen)
+
+
+def input_hash(artifact: Artifact) -> str:
+    """
+    Compute a content hash of everything that determines an artifact's bytes.
+
+    The hash covers the generating function and parameters, the source of the module and
+    its local imports, the artifact's further input files, and the versions of the
+    third-party packages used to render it.
+
+    Args:
+        artifact (Artifact): The artifact to hash.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the artifact's inputs.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([artifact.module, artifact.function, artifact.params], sort_keys=True).encode())
+    for path in local_dependencies(artifact.module) + [PLOT_DIR / name for name in artifact.inputs]:
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    for package in PINNED_PACKAGES:
+        digest.update(f'{package}=={importlib.metadata.version(package)}'.encode())
+    return digest.hexdigest()
+
+
+def output_hash(path: Path) -> str:
+    """
+    Compute the content hash of a built file.
+
+    Args:
+        path (Path): The file.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of its bytes.
+    """
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def build_artifact(name: str) -> dict:
+    """
+    Generate one artifact and write it atomically to the plot directory.
+
+    This runs in a worker process, so the flower modules (and Plotly) are only imported
+    once there is something to build.
+
+    Args:
+        name (str): The artifact's output file name, a key of `ARTIFACTS`.
+
+    Returns:
+        dict: The artifact name, its output size in bytes and SHA-256, the local assets it loads
+              and the build time in seconds.
+    """
+    artifact = ARTIFACTS[name]
+    start = time.perf_counter()
+
+    # Stream next to the target and swap it in so readers never see a partial file
+    output = PLOT_DIR / name
+    temporary = output.with_name(output.name + '.tmp')
+    generate = getattr(importlib.import_module(artifact.module), artifact.function)
+    generate(**artifact.params, file=temporary)
+    os.replace(temporary, output)
+
+    # Paths inside the figure JSON are string literals, whose slashes Plotly escapes
+    matches = ASSET_PATTERN.findall(output.read_text(encoding='utf-8')) if output.suffix == '.html' else []
+    assets = sorted({json.loads(f'"{script or block}"') for script, block in matches})
+    return {'name': name, 'bytes': output.stat().st_size, 'sha256': output_hash(output), 'assets': assets,
+            'seconds': time.perf_counter() - start}
+
+
+def load_manifest() -> dict:
+    """
+    Load the manifest of previously built artifacts.
+
+    Returns:
+        dict: A mapping of artifact name to its recorded input hash, output size and hash and
+              local assets, empty if nothing has been built yet.
+    """
+    if not MANIFEST_PATH.exists():
+        return {}
+    return json.loads(MANIFEST_PATH.read_text())
+
+
+def build(names: List[str] = None, force: bool = False, jobs: int = None) -> dict:
+    """
+    Regenerate every stale plot artifact in parallel across a process pool.
+
+    An artifact is stale when its output file or one of the local assets it loads is
+    missing, when the hash of its inputs differs from the one recorded in the manifest, or
+    when its output no longer has the recorded content, e.g. after a script wrote it by hand.
+    Up-to-date artifacts are skipped without importing any of the plotting code. Afterwards
+    every built page and the local assets it loads get '.br' and '.gz' siblings (see
+    `precompress.precompress`), again only where their content changed. Without brotli
+    nothing is built, since the committed '.br' siblings could not be kept current.
+
+    Args:
+        names (list, optional): Artifact names to consider. All artifacts if None.
+        force (bool): Rebuild the artifacts even if they are up to date.
+        jobs (int, optional): Number of worker processes. Defaults to the CPU count.
+
+    Returns:
+        dict: The updated manifest.
+
+    Raises:
+        RuntimeError: If the brotli package is not installed.
+    """
+    require_brotli()
+
+    manifest = load_manifest()
+    hashes = {name: input_hash(ARTIFACTS[name]) for name in (names or ARTIFACTS)}
+
+    def is_stale(name: str, digest: str) -> bool:
+        entry = manifest.get(name, {})
+        files = [name] + entry.get('assets', [])
+        if force or entry.get('hash') != digest or not all((PLOT_DIR / path).exists() for path in files):
+            return True
+        return output_hash(PLOT_DIR / name) != entry.get('sha256')
+
+    stale = [name for name, digest in hashes.items() if is_stale(name, digest)]
+    for name in hashes:
+        if name not in stale:
+            print(f'up to date  {name}')
+
+    if stale:
+        with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count(), len(stale))) as pool:
+            for result in pool.map(build_artifact, stale):
+                name = result['name']
+                manifest[name] = {'hash': hashes[name], 'bytes': result['bytes'], 'sha256': result['sha256'],
+                                  'assets': result['assets']}
+                print(f"built       {name} ({result['bytes'] / 1e6:.2f} MB in {result['seconds']:.2f} s)")
+
+        MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+
+    # Siblings cover every published file, not only the requested artifacts, since assets are shared between pages
+    files = [PLOT_DIR / path for name, entry in manifest.items() for path in [name] + entry['assets']]
+    compressed = precompress(files, jobs)
+    sizes = ', '.join(f'{served_bytes(compressed, coding) / 1e6:.2f} MB {coding}' for coding in CODINGS)
+    print(f"precompressed {len(compressed)} files: {sum(entry['bytes'] for entry in compressed.values()) / 1e6:.2f} MB raw, "
+          f'{sizes}')
+
+    return manifest
+
+
+# ****
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Regenerate the flower plot artifacts that are out of date.')
+    parser.add_argument('names', nargs='*', metavar='artifact',
+                        help=f"artifacts to build (default: all of {', '.join(ARTIFACTS)})")
+    parser.add_argument('--force', action='store_true', help='rebuild even if the inputs are unchanged')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(ARTIFACTS)
+    if unknown:
+        parser.error(f"unknown artifacts: {', '.join(sorted(unknown))}")
+    try:
+        require_brotli()
+    except RuntimeError as error:
+        parser.error(str(error))
+
+    start = time.perf_counter()
+    build(args.names, force=args.force, jobs=args.jobs)
+    print(f'done in {time.perf_counter() - start:.2f} s')
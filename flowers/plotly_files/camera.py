@@ -0,0 +1,88 @@
+import numpy as np
+from typing import TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Vertical field of view of Plotly's 3D scenes, which place the camera like gl-plot3d
+FIELD_OF_VIEW = np.pi / 4
+
+
+def scene_transform(fig: 'go.Figure', vertices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute how Plotly maps data coordinates into the normalized box its camera looks at.
+
+    Plotly scales the padded range of each axis to the scene's aspect ratio around the origin.
+    With the default 'auto' aspect mode the ratio follows the data ranges, unless they differ by
+    more than a factor of four, in which case the box becomes a cube.
+
+    Args:
+        fig (go.Figure): The figure whose scene settings to use.
+        vertices (np.ndarray): All (N, 3) vertices of the scene, to find the data bounds.
+
+    Returns:
+        tuple: The (3,) center of the data bounds and the (3,) scale that maps data offsets
+               from that center into the normalized box.
+    """
+    scene = fig.layout.scene
+    low, high = np.nanmin(vertices, axis=0), np.nanmax(vertices, axis=0)
+    ranges = np.where(high > low, high - low, 1.0)
+
+    # Plotly pads autoranged axes by 1/32 of their range on both sides
+    padded = ranges * (1 + 2 / 32)
+
+    mode = scene.aspectmode or 'auto'
+    if mode == 'manual' and scene.aspectratio.x is not None:
+        ratio = np.array([scene.aspectratio.x, scene.aspectratio.y, scene.aspectratio.z], dtype=float)
+    elif mode == 'data' or (mode == 'auto' and ranges.max() / ranges.min() <= 4):
+        ratio = ranges / np.cbrt(np.prod(ranges))
+    else:
+        ratio = np.ones(3)
+    return (low + high) / 2, ratio / padded
+
+
+def camera_matrix(fig: 'go.Figure', width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build the view-projection matrix of a figure's scene camera.
+
+    Args:
+        fig (go.Figure): The figure whose `scene.camera` eye, up, center and projection to use.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+
+    Returns:
+        tuple: The 4x4 matrix from normalized scene coordinates to clip space, and the 3x3
+               rotation into camera space used for lighting.
+    """
+    camera = fig.layout.scene.camera
+    eye = np.array([camera.eye.x, camera.eye.y, camera.eye.z], dtype=float) if camera.eye.x is not None \
+        else np.array([1.25, 1.25, 1.25])
+    up = np.array([camera.up.x, camera.up.y, camera.up.z], dtype=float) if camera.up.x is not None \
+        else np.array([0.0, 0.0, 1.0])
+    center = np.array([camera.center.x, camera.center.y, camera.center.z], dtype=float) \
+        if camera.center.x is not None else np.zeros(3)
+
+    # Camera frame looking from the eye towards the center
+    forward = (center - eye) / np.linalg.norm(center - eye)
+    right = np.cross(forward, up)
+    right /= np.linalg.norm(right)
+    rotation = np.stack([right, np.cross(right, forward), -forward])
+    view = np.eye(4)
+    view[:3, :3] = rotation
+    view[:3, 3] = -rotation @ eye
+
+    distance = np.linalg.norm(center - eye)
+    aspect = width / height
+    near, far = 0.01, distance + 10
+    projection = np.zeros((4, 4))
+    if camera.projection.type == 'orthographic':
+        half = distance * np.tan(FIELD_OF_VIEW / 2)
+        projection[0, 0], projection[1, 1] = 1 / (half * aspect), 1 / half
+        projection[2, 2], projection[2, 3] = -2 / (far - near), -(far + near) / (far - near)
+        projection[3, 3] = 1
+    else:
+        focal = 1 / np.tan(FIELD_OF_VIEW / 2)
+        projection[0, 0], projection[1, 1] = focal / aspect, focal
+        projection[2, 2], projection[2, 3] = (far + near) / (near - far), 2 * far * near / (near - far)
+        projection[3, 2] = -1
+    return projection @ view, rotation
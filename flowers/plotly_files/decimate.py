@@ -0,0 +1,239 @@
+import json
+from typing import TYPE_CHECKING, List, Tuple
+
+import numpy as np
+from merged_mesh import surface_grid
+from plot_export import encode_trace
+from profiling import record_arrays, span
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Bisection steps when searching the smallest threshold that meets a vertex budget
+BUDGET_STEPS = 40
+
+# Bisection steps when tightening the threshold to a tolerance, each measuring the full deviation
+TOLERANCE_STEPS = 12
+
+
+def split_errors(points: np.ndarray) -> np.ndarray:
+    """
+    Rank the grid lines along the first axis by the error their removal would cause.
+
+    This runs the Douglas-Peucker recursion to the end, treating every grid line as one point:
+    a segment between two kept lines is split at the line farthest from their linear
+    interpolation, measured as the largest vertex distance along it. The error of a line is
+    the smaller of its own split distance and that of every segment it was split from. Keeping
+    the lines whose error exceeds a tolerance therefore gives exactly the lines Douglas-Peucker
+    keeps for that tolerance, for every tolerance at once.
+
+    Args:
+        points (np.ndarray): The (lines, samples, 3) vertex positions of the grid lines.
+
+    Returns:
+        np.ndarray: The (lines,) errors, infinite for the two end lines, which are always kept.
+    """
+    count = len(points)
+    errors = np.full(count, np.inf)
+    pending = [(0, count - 1, np.inf)]
+    while pending:
+        first, last, limit = pending.pop()
+        if last - first < 2:
+            continue
+
+        # Distance of every interior line to the interpolation between the segment's end lines
+        t = (np.arange(first + 1, last) - first)[:, None, None] / (last - first)
+        interpolated = points[first] + t * (points[last] - points[first])
+        distances = np.sqrt(((points[first + 1:last] - interpolated) ** 2).sum(axis=2)).max(axis=1)
+
+        split = first + 1 + int(np.argmax(distances))
+        errors[split] = min(limit, distances[split - first - 1])
+        pending += [(first, split, errors[split]), (split, last, errors[split])]
+    return errors
+
+
+def _interpolate(values: np.ndarray, kept: np.ndarray, count: int, axis: int) -> np.ndarray:
+    """
+    Linearly interpolate the kept grid lines back to the full line count along one axis.
+
+    Args:
+        values (np.ndarray): The decimated grid, with `len(kept)` lines along `axis`.
+        kept (np.ndarray): The sorted indices of the kept lines in the full grid.
+        count (int): The number of lines of the full grid.
+        axis (int): The axis the lines are indexed by.
+
+    Returns:
+        np.ndarray: The grid with `count` lines along `axis`.
+    """
+    index = np.arange(count)
+    upper = np.clip(np.searchsorted(kept, index, side='right'), 1, len(kept) - 1)
+    lower = upper - 1
+    t = (index - kept[lower]) / (kept[upper] - kept[lower])
+    shape = [1] * values.ndim
+    shape[axis] = count
+    t = t.reshape(shape)
+    return np.take(values, lower, axis) * (1 - t) + np.take(values, upper, axis) * t
+
+
+def grid_deviation(grid: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> float:
+    """
+    Measure how far a decimated grid strays from the original one.
+
+    The decimated surface is sampled at the grid parameters of every original vertex by
+    bilinear interpolation between the kept rows and columns, which is where Plotly's
+    triangulated surface passes as well.
+
+    Args:
+        grid (np.ndarray): The original (rows, cols, 3) vertex positions.
+        rows (np.ndarray): The sorted indices of the kept rows.
+        cols (np.ndarray): The sorted indices of the kept columns.
+
+    Returns:
+        float: The largest distance between an original vertex and the decimated surface.
+    """
+    decimated = grid[np.ix_(rows, cols)]
+    restored = _interpolate(_interpolate(decimated, cols, grid.shape[1], 1), rows, grid.shape[0], 0)
+    return float(np.sqrt(((restored - grid) ** 2).sum(axis=2)).max())
+
+
+def decimate_grid(X: np.ndarray, Y: np.ndarray, Z: np.ndarray, tolerance: float = None,
+                  max_vertices: int = None) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Choose the rows and columns of a surface grid to keep for an error or vertex budget.
+
+    Dropping whole rows and columns keeps the result a structured grid, so it still renders as
+    a Plotly Surface (or, triangulated, as a Mesh3d). Rows are ranked on the full columns and
+    columns on the full rows with `split_errors`, and one threshold selects both. Where a
+    dropped row crosses a dropped column their errors can add up, so the threshold is
+    tightened until the measured deviation meets the tolerance.
+
+    Args:
+        X (np.ndarray): The (rows, cols) x-coordinates of the grid.
+        Y (np.ndarray): The (rows, cols) y-coordinates of the grid.
+        Z (np.ndarray): The (rows, cols) z-coordinates of the grid.
+        tolerance (float, optional): The largest allowed distance between an original vertex and
+            the decimated surface (see `grid_deviation`).
+        max_vertices (int, optional): The largest number of vertices to keep. When both are
+            given, the budget wins over the tolerance.
+
+    Returns:
+        tuple: The kept row indices, the kept column indices and the measured deviation from
+               the original grid.
+    """
+    grid = np.stack([X, Y, Z], axis=-1)
+    with span('rank lines'):
+        row_errors = split_errors(grid)
+        col_errors = split_errors(grid.transpose(1, 0, 2))
+
+    def select(limit: float) -> Tuple[np.ndarray, np.ndarray]:
+        return np.flatnonzero(row_errors > limit), np.flatnonzero(col_errors > limit)
+
+    def count(limit: float) -> int:
+        return int((row_errors > limit).sum()) * int((col_errors > limit).sum())
+
+    limit = 0.0
+    if tolerance is not None:
+        # Bisect for the largest threshold whose measured deviation fits; a threshold of 0 always does
+        with span('fit tolerance'):
+            low, high = 0.0, tolerance
+            if grid_deviation(grid, *select(high)) <= tolerance:
+                low = high
+            for _ in range(TOLERANCE_STEPS if low < high else 0):
+                middle = (low + high) / 2
+                low, high = (middle, high) if grid_deviation(grid, *select(middle)) <= tolerance else (low, middle)
+            limit = low
+
+    rows, cols = select(limit)
+    if max_vertices is not None and count(limit) > max_vertices:
+        # The vertex count only falls as the threshold grows, so bisect for the smallest one that fits
+        low, high = limit, float(np.nanmax(np.concatenate([row_errors[1:-1], col_errors[1:-1], [limit]])))
+        for _ in range(BUDGET_STEPS):
+            middle = (low + high) / 2
+            low, high = (low, middle) if count(middle) <= max_vertices else (middle, high)
+        rows, cols = select(high)
+
+        # Spend what is left of the budget on the next most important rows
+        order = np.argsort(-row_errors, kind='stable')
+        rows = np.sort(order[:max(len(rows), max_vertices // len(cols))])
+
+    with span('measure deviation'):
+        deviation = grid_deviation(grid, rows, cols)
+    return rows, cols, deviation
+
+
+def decimate_figure(fig: 'go.Figure', tolerance: float = None,
+                    max_vertices: int = None) -> Tuple['go.Figure', List[dict]]:
+    """
+    Decimate every Surface trace of a figure, keeping its colors unchanged.
+
+    Each surface keeps the color range of its full grid, so dropping the rows that hold the
+    extreme values does not shift its colorscale.
+
+    Args:
+        fig (go.Figure): The figure whose surfaces should be decimated.
+        tolerance (float, optional): The error bound per surface (see `decimate_grid`).
+        max_vertices (int, optional): The vertex budget per surface (see `decimate_grid`).
+
+    Returns:
+        tuple: A new figure with the same layout and decimated surfaces, and one report per
+               surface with its name, vertex counts, measured deviation and float32 encoded sizes.
+    """
+    import plotly.graph_objects as go
+
+    data, reports = [], []
+    for index, trace in enumerate(fig.data):
+        if trace.type != 'surface':
+            data.append(trace)
+            continue
+
+        X, Y, Z, values = surface_grid(trace)
+        rows, cols, deviation = decimate_grid(X, Y, Z, tolerance, max_vertices)
+        record_arrays(rows, cols)
+
+        # Keep the full grid's automatic color range, as Plotly would have computed it
+        decimated = trace.to_plotly_json()
+        decimated.update(x=X[np.ix_(rows, cols)], y=Y[np.ix_(rows, cols)], z=Z[np.ix_(rows, cols)],
+                         cmin=np.nanmin(values) if trace.cmin is None else trace.cmin,
+                         cmax=np.nanmax(values) if trace.cmax is None else trace.cmax)
+        if trace.surfacecolor is not None:
+            decimated['surfacecolor'] = values[np.ix_(rows, cols)]
+        data.append(decimated)
+
+        before = {key: trace[key] for key in ('x', 'y', 'z', 'surfacecolor') if trace[key] is not None}
+        after = {key: decimated[key] for key in before}
+        reports.append({'trace': trace.name or f'surface-{index}',
+                        'vertices_before': Z.size, 'vertices_after': len(rows) * len(cols),
+                        'grid': [len(rows), len(cols)], 'max_deviation': deviation,
+                        'bytes_before': len(json.dumps(encode_trace(before))),
+                        'bytes_after': len(json.dumps(encode_trace(after)))})
+
+    return go.Figure(data=data, layout=fig.layout), reports
+
+
+# ****
+if __name__ == '__main__':
+    from rose_bouquet import build_rose_bouquet_figure
+
+    # One rose head, stem and wrap of the bouquet at decreasing vertex budgets
+    fig = build_rose_bouquet_figure(seed=0)
+    samples = {'rose head': fig.data[1], 'stem': fig.data[0], 'wrap': fig.data[-1]}
+    for name, trace in samples.items():
+        X, Y, Z, _ = surface_grid(trace)
+        extent = float(np.linalg.norm([np.ptp(X), np.ptp(Y), np.ptp(Z)]))
+        print(f'{name} ({Z.shape[0]}x{Z.shape[1]}, {Z.size} vertices, diagonal {extent:.3f})')
+        for budget in sorted({Z.size // 2, Z.size // 4, 5000, 2000, 500} - {b for b in [5000, 2000, 500] if b >= Z.size},
+                             reverse=True):
+            single, = decimate_figure(type(fig)(data=[trace]), max_vertices=budget)[1]
+            assert single['vertices_after'] <= budget
+            print(f"  budget {budget:6d}: {single['vertices_after']:6d} vertices {str(single['grid']):>11}  "
+                  f"max deviation {single['max_deviation']:.4f} ({single['max_deviation'] / extent:.2%})  "
+                  f"{single['bytes_before'] / 1e3:7.1f} kB -> {single['bytes_after'] / 1e3:6.1f} kB")
+
+    # An error bound holds for the whole bouquet
+    tolerance = 0.002
+    decimated, reports = decimate_figure(fig, tolerance=tolerance)
+    before, after = sum(r['vertices_before'] for r in reports), sum(r['vertices_after'] for r in reports)
+    worst = max(r['max_deviation'] for r in reports)
+    print(f'bouquet at tolerance {tolerance}: {before} -> {after} vertices, max deviation {worst:.4f}, '
+          f"{sum(r['bytes_before'] for r in reports) / 1e6:.2f} MB -> {sum(r['bytes_after'] for r in reports) / 1e6:.2f} MB")
+    assert len(decimated.data) == len(fig.data) and worst <= tolerance
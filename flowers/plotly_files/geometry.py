@@ -0,0 +1,462 @@
+import numpy as np
+from functools import lru_cache
+from profiling import record_arrays, span
+from transforms import affine_matrix, apply_affine, transform_xyz
+
+# Rows and columns sampled along the height and around the circumference of every stem
+STEM_ROWS, STEM_COLS = 50, 30
+
+
+# Height the rose head rests at above its offset
+HEAD_LIFT = 0.35
+
+# Petals per turn of the rose head's spiral, the frequency of its petal amplitude
+PETAL_FREQUENCY = 3.6
+
+# Spiral angle over which the petals' opening angle decays by a factor of e
+PETAL_DECAY = 8 * np.pi
+
+
+@lru_cache(maxsize=8)
+def rose_head_factors(n_radial: int = 25, n_theta: int = 1152, petal_frequency: float = PETAL_FREQUENCY,
+                      decay: float = PETAL_DECAY) -> tuple:
+    """
+    Factor the rose head surface into per-row coefficients and per-column basis functions.
+
+    Every term of the rose head depends either on the theta row alone (the petal angle `p`,
+    the ripple `cr` and the amplitude `u`) or on the radial column alone (`xr` and the cupping
+    `2 * (xr**2 - xr)**2`). Expanding the rotation of each petal gives every coordinate as
+    `a * xr + b * g + c` with row coefficients a, b, c, so the whole head is one small matrix
+    product of the coefficients with the column basis `[xr, g, 1]`. Only 1D axes are evaluated
+    here, instead of a dozen full-size meshgrid temporaries.
+
+    Args:
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+        petal_frequency (float): Petals per turn of the spiral.
+        decay (float): Spiral angle over which the petal angle decays by a factor of e.
+
+    Returns:
+        tuple: The read-only (3, n_theta, 3) coefficients of x, y and z per row and the
+               read-only (3, n_radial) column basis.
+    """
+    xr = np.linspace(0, 1, n_radial)
+    tr = np.linspace(0, 20 * np.pi, n_theta) + 4 * np.pi
+
+    # Exponential decay of the petal angle, and the petal amplitude with its fine oscillations
+    p = (np.pi / 2) * np.exp(-tr / decay)
+    u = 1 - (1 - np.mod(petal_frequency * tr, 2 * np.pi) / np.pi) ** 4 / 2 + np.sin(15 * tr) / 150
+    s, c = np.sin(p), np.cos(p)
+
+    # rr = u (xr s + g s c) and hr = u (xr c - g s^2), turned around the spiral by tr
+    coefficients = np.zeros((3, n_theta, 3))
+    coefficients[0, :, 0], coefficients[0, :, 1] = u * s * np.cos(tr), u * s * c * np.cos(tr)
+    coefficients[1, :, 0], coefficients[1, :, 1] = u * s * np.sin(tr), u * s * c * np.sin(tr)
+    coefficients[2, :, 0], coefficients[2, :, 1], coefficients[2, :, 2] = u * c, -u * s * s, HEAD_LIFT
+    basis = np.stack([xr, 2 * (xr**2 - xr)**2, np.ones(n_radial)])
+
+    for arr in (coefficients, basis):
+        arr.setflags(write=False)
+    return coefficients, basis
+
+
+def rose_head_kernel(n_radial: int = 25, n_theta: int = 1152, out: np.ndarray = None,
+                     matrix: np.ndarray = None, offset: tuple = (0, 0, 0),
+                     scratch: np.ndarray = None, petal_frequency: float = PETAL_FREQUENCY,
+                     decay: float = PETAL_DECAY) -> np.ndarray:
+    """
+    Evaluate one rose head, optionally rotated and moved, into an output buffer.
+
+    Rotations and offsets are applied to the (3, n_theta, 3) coefficients from
+    `rose_head_factors` rather than to the vertices, since (M C) B + o = M (C B) + o when the
+    offset goes into the constant column. A single matrix product then writes the final
+    coordinates, so with `out` and `scratch` given nothing of the grid's size is allocated.
+
+    Args:
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+        out (np.ndarray, optional): A (3, n_theta, n_radial) buffer to write X, Y and Z into.
+            Any float dtype works, and the product is rounded to it as it is written; a new
+            float64 array is allocated if None.
+        matrix (np.ndarray, optional): A 3x3 rotation (or any linear map) applied about the origin.
+        offset (tuple): The (x, y, z) offset added after the rotation.
+        scratch (np.ndarray, optional): A (3, n_theta, 3) float64 buffer for the transformed
+            coefficients, for callers filling many heads.
+        petal_frequency (float): Petals per turn of the spiral (see `rose_head_factors`).
+        decay (float): Decay of the petal angle along the spiral (see `rose_head_factors`).
+
+    Returns:
+        np.ndarray: The (3, n_theta, n_radial) coordinates, which is `out` if given.
+    """
+    coefficients, basis = rose_head_factors(n_radial, n_theta, petal_frequency, decay)
+    if out is None:
+        out = np.empty((3, n_theta, n_radial))
+
+    if matrix is None and not any(offset):
+        return np.matmul(coefficients, basis, out=out)
+
+    scratch = np.empty(coefficients.shape) if scratch is None else scratch
+    if matrix is None:
+        scratch[...] = coefficients
+    else:
+        np.matmul(matrix, coefficients.reshape(3, -1), out=scratch.reshape(3, -1))
+    scratch[:, :, 2] += np.asarray(offset, dtype=float)[:, None]
+    return np.matmul(scratch, basis, out=out)
+
+
+@lru_cache(maxsize=8)
+def rose_head_template(n_radial: int = 25, n_theta: int = 1152, dtype: np.dtype = np.float64,
+                       petal_frequency: float = PETAL_FREQUENCY, decay: float = PETAL_DECAY) -> tuple:
+    """
+    Compute the offset-free rose head geometry once per sampling resolution.
+
+    The rose head surface only depends on how finely the radial and theta axes are
+    sampled, so it is evaluated once by `rose_head_kernel` and shared by every rose that
+    is drawn. Offsets and rotations are applied afterwards as a cheap transform of these
+    template arrays.
+
+    Args:
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+        dtype (np.dtype): Floating point type of the template. A float32 template is rounded
+            once from the exact float64 product, so it never accumulates single precision error.
+        petal_frequency (float): Petals per turn of the spiral (see `rose_head_factors`).
+        decay (float): Decay of the petal angle along the spiral (see `rose_head_factors`).
+
+    Returns:
+        tuple: A tuple of three read-only numpy arrays (X, Y, Z) of shape
+               (n_theta, n_radial) for a rose head centered at the origin.
+    """
+    grid = rose_head_kernel(n_radial, n_theta, np.empty((3, n_theta, n_radial), dtype=dtype),
+                            petal_frequency=petal_frequency, decay=decay)
+
+    # Only cache misses reach this point, so the allocation is recorded once per resolution
+    record_arrays(grid)
+
+    # Cached arrays are shared between callers, so guard them against mutation
+    grid.setflags(write=False)
+    return grid[0], grid[1], grid[2]
+
+
+def meshgrid_transforms(x_offset: float = 0, y_offset: float = 0, z_offset: float = 0,
+                        n_radial: int = 25, n_theta: int = 1152, out: np.ndarray = None,
+                        dtype: np.dtype = np.float64, template: tuple = None) -> tuple:
+    """
+    Calculate transformed meshgrid coordinates for 3D plotting.
+
+    This function creates a meshgrid using trigonometric and exponential transformations
+    to generate coordinates for a 3D visualization, specifically to plot a geometric
+    structure with interesting undulations and rotations that mimic a rose. Offsets 
+    can be applied to shift the entire structure along the x, y, and z axes. The
+    underlying geometry comes from the memoized `rose_head_template`, so only the
+    offsets are computed per call, directly into `out` when the caller provides a buffer.
+
+    Args:
+        x_offset (float): The offset to be added to all x-coordinates.
+        y_offset (float): The offset to be added to all y-coordinates.
+        z_offset (float): The offset to be added to all z-coordinates.
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+        out (np.ndarray, optional): A (3, n_theta, n_radial) buffer to write the coordinates into.
+        dtype (np.dtype): Floating point type of the coordinates. float32 halves their memory
+            and is the precision WebGL renders them at anyway.
+        template (tuple, optional): The (X, Y, Z) arrays of the head to place instead of the
+            default `rose_head_template`, such as a variant with other petal parameters. Its
+            shape takes precedence over `n_radial` and `n_theta`.
+
+    Returns:
+        tuple: A tuple of three numpy arrays (X, Y, Z), representing the x, y, and z
+               coordinates after applying the transformations and offsets.
+    """
+    X, Y, Z = rose_head_template(n_radial, n_theta, dtype) if template is None else template
+    if out is None:
+        out = np.empty((3,) + X.shape, dtype=dtype)
+
+    # Adding in the output's type keeps float64 offsets from promoting float32 coordinates
+    for coordinates, offset, target in zip((X, Y, Z), (x_offset, y_offset, z_offset), out):
+        np.add(coordinates, offset, out=target, dtype=target.dtype)
+    return out[0], out[1], out[2]
+
+
+def meshgrid_transforms_batch(offsets: np.ndarray, matrices: np.ndarray = None, n_radial: int = 25,
+                              n_theta: int = 1152, out: np.ndarray = None, dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Fill the coordinates of many rose heads at once.
+
+    Each head costs one small matrix product written straight into its slice of the output,
+    and the transformed coefficients reuse a single scratch buffer, so the batch allocates
+    nothing beyond `out` itself.
+
+    Args:
+        offsets (np.ndarray): The (N, 3) offset of every head.
+        matrices (np.ndarray, optional): The (N, 3, 3) rotation of every head about its own
+            origin, as from `transforms.rotation_matrices`. No rotation if None.
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+        out (np.ndarray, optional): An (N, 3, n_theta, n_radial) buffer to fill.
+        dtype (np.dtype): Floating point type of the buffer allocated when `out` is None.
+
+    Returns:
+        np.ndarray: The (N, 3, n_theta, n_radial) coordinates, which is `out` if given.
+    """
+    offsets = np.asarray(offsets, dtype=float).reshape(-1, 3)
+    if out is None:
+        out = np.empty((len(offsets), 3, n_theta, n_radial), dtype=dtype)
+    scratch = np.empty((3, n_theta, 3))
+
+    with span('rose head batch'):
+        for index, offset in enumerate(offsets):
+            rose_head_kernel(n_radial, n_theta, out[index], None if matrices is None else matrices[index],
+                             offset, scratch)
+    return out
+
+
+def rotate_xyz(X: np.ndarray, Y: np.ndarray, Z: np.ndarray, angle_x: float = 0, 
+               angle_y: float = 0, angle_z: float = 0, dtype: np.dtype = None) -> tuple:
+    """
+    Rotate a set of coordinates around the x, y, and z axes by given angles.
+
+    This function applies a sequence of rotation transformations to 3D coordinates.
+    Each rotation is performed around one of the principal axes (x, y, z), using the
+    right-hand rule. The order of rotations is first around x, then y, and finally z.
+    The rotations are composed into a single matrix by the `transforms` module.
+
+    Args:
+        X (np.ndarray): The x-coordinates of the points to rotate.
+        Y (np.ndarray): The y-coordinates of the points to rotate.
+        Z (np.ndarray): The z-coordinates of the points to rotate.
+        angle_x (float): The rotation angle around the x-axis in radians.
+        angle_y (float): The rotation angle around the y-axis in radians.
+        angle_z (float): The rotation angle around the z-axis in radians.
+        dtype (np.dtype, optional): Floating point type of the result. If None, float32
+            coordinates stay float32 and anything else is rotated in float64.
+
+    Returns:
+        tuple: A tuple of numpy arrays (X, Y, Z), representing the coordinates after
+               the rotations have been applied.
+    """
+    # Compose all three rotations into one matrix and apply it in a single pass
+    return transform_xyz(X, Y, Z, affine_matrix(angle_x, angle_y, angle_z), dtype)
+
+
+def get_stem_top_center(height: float, x_offset: float, y_offset: float, curve_factor: float = 0.2,
+                        angle_x: float = 0, angle_y: float = 0, angle_z: float = 0) -> tuple:
+    """
+    Calculate the top center position of a stem after applying a curve and rotation. The curvature 
+    introduces a lateral displacement using sinusoidal functions that depend on the stem's height.
+
+    Args:
+        height (float): The height of the stem.
+        x_offset (float): The offset to apply on the x-axis.
+        y_offset (float): The offset to apply on the y-axis.
+        curve_factor (float): The factor that determines the magnitude of the curvature.
+        angle_x (float): The rotation angle around the x-axis in radians.
+        angle_y (float): The rotation angle around the y-axis in radians.
+        angle_z (float): The rotation angle around the z-axis in radians.
+
+    Returns:
+        tuple: A tuple containing the x, y, and z coordinates of the top center position after
+               applying the curvature, offsets, and rotations.
+    """
+    # Calculate initial top center position with applied curve but no rotation
+    z_top = height
+    x_top = curve_factor * np.sin(np.pi * z_top / height) + x_offset
+    y_top = curve_factor * np.cos(np.pi * z_top / height) + y_offset
+
+    # Apply rotation transformations to the calculated position
+    x_top, y_top, z_top = rotate_xyz(np.array([x_top]), np.array([y_top]), np.array([z_top]), angle_x, angle_y, angle_z)
+
+    return x_top[0], y_top[0], z_top[0]
+
+
+def stem_surface(height: float = 1, radius: float = 0.05, x_offset: float = 0, y_offset: float = 0,
+                 z_offset: float = 0, curve_factor: float = 0.2, thorn_frequency: int = 5, angle_x: float = 0,
+                 angle_y: float = 0, angle_z: float = 0, rng: np.random.Generator = None,
+                 dtype: np.dtype = np.float64) -> tuple:
+    """
+    Compute the surface grid and thorns of a curved, tapering stem.
+
+    The stem is a cylinder whose center line bends sinusoidally with its height and whose
+    radius shrinks towards the top. Offsets are applied before the rotation, and the surface
+    and its thorns are rotated by the same matrix.
+
+    Args:
+        height (float): The height of the stem.
+        radius (float): The base radius of the stem.
+        x_offset (float): Horizontal offset on the x-axis.
+        y_offset (float): Horizontal offset on the y-axis.
+        z_offset (float): Vertical offset along the z-axis.
+        curve_factor (float): Factor that determines the magnitude of the stem's curvature.
+        thorn_frequency (int): Frequency of thorns per unit height of the stem.
+        angle_x (float): Rotation angle around the x-axis in radians.
+        angle_y (float): Rotation angle around the y-axis in radians.
+        angle_z (float): Rotation angle around the z-axis in radians.
+        rng (np.random.Generator, optional): Generator used to draw the thorn angles. A freshly
+            seeded generator is used if None.
+        dtype (np.dtype): Floating point type of the surface grids, the thorns and every
+            full-size intermediate.
+
+    Returns:
+        tuple: The (STEM_ROWS, STEM_COLS) x, y and z grids of the surface, and an array of shape
+               (num_thorns, 2, 3) holding the rotated start and end point of every thorn.
+    """
+    # NumPy scalars, such as a height from np.sqrt, would promote the grids to float64; Python floats keep `dtype`
+    height, radius, curve_factor = float(height), float(radius), float(curve_factor)
+    x_offset, y_offset, z_offset = float(x_offset), float(y_offset), float(z_offset)
+
+    with span('stem geometry'):
+        # Create meshgrid for the stem geometry
+        theta = np.linspace(0, 2 * np.pi, STEM_COLS, dtype=dtype)
+        z = np.linspace(0, height, STEM_ROWS, dtype=dtype)
+        theta, z = np.meshgrid(theta, z)
+    
+        # Calculate the curvature components of the stem
+        x_curve = curve_factor * np.sin(np.pi * z / height)
+        y_curve = curve_factor * np.cos(np.pi * z / height)
+
+        # Tapering effect for the stem's radius from base to top
+        tapering = 1 - (z / height) * 0.3
+        x = (radius * tapering * np.cos(theta)) + x_curve + x_offset
+        y = (radius * tapering * np.sin(theta)) + y_curve + y_offset
+        z = z + z_offset
+
+        # Apply rotational transformations, shared by the surface and its thorns
+        rotation = affine_matrix(angle_x, angle_y, angle_z)
+        x, y, z = transform_xyz(x, y, z, rotation, dtype)
+        record_arrays(x, y, z)
+
+    # Generate thorns along the stem and rotate them all in one batch
+    with span('thorn geometry'):
+        thorn_points = generate_thorns(height, radius, x_offset, y_offset, z_offset, curve_factor, thorn_frequency, rng,
+                                       dtype)
+        thorn_points = apply_affine(rotation, thorn_points.reshape(-1, 3)).reshape(thorn_points.shape)
+
+    return x, y, z, thorn_points
+
+
+def generate_thorns(height: float = 1, radius: float = 0.05, x_offset: float = 0, y_offset: float = 0,
+                    z_offset: float = 0, curve_factor: float = 0.2, thorn_frequency: int = 5,
+                    rng: np.random.Generator = None, dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Generate the unrotated thorn segments along a curved stem.
+
+    Thorns are spaced evenly along the stem's height and point outwards at random angles,
+    which are all drawn in one batch from the given generator. Each thorn starts on the
+    stem's center line and slopes slightly downwards.
+
+    Args:
+        height (float): The height of the stem.
+        radius (float): The base radius of the stem, which sets the thorn length.
+        x_offset (float): Horizontal offset on the x-axis.
+        y_offset (float): Horizontal offset on the y-axis.
+        z_offset (float): Vertical offset along the z-axis.
+        curve_factor (float): Factor that determines the magnitude of the stem's curvature.
+        thorn_frequency (int): Frequency of thorns per unit height of the stem.
+        rng (np.random.Generator, optional): Generator used to draw the thorn angles. A freshly
+            seeded generator is used if None.
+        dtype (np.dtype): Floating point type of the thorn points.
+
+    Returns:
+        np.ndarray: An array of shape (num_thorns, 2, 3) holding the start and end point of every thorn.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    thorn_length = radius * 1.5
+    num_thorns = int(height * thorn_frequency)
+    z_pos = np.arange(num_thorns) / num_thorns * height
+    theta_pos = rng.random(num_thorns) * 2 * np.pi
+
+    # Anchor each thorn on the closest of the stem's 50 sampled rows below it
+    z_index = (z_pos / height * 49).astype(int)
+    z_row = np.linspace(0, height, 50)[z_index]
+    x_base = curve_factor * np.sin(np.pi * z_row / height) + x_offset
+    y_base = curve_factor * np.cos(np.pi * z_row / height) + y_offset
+
+    thorn_points = np.empty((num_thorns, 2, 3), dtype=dtype)
+    thorn_points[:, 0, 0] = x_base
+    thorn_points[:, 0, 1] = y_base
+    thorn_points[:, 0, 2] = z_pos + z_offset
+    thorn_points[:, 1, 0] = x_base + thorn_length * np.cos(theta_pos)
+    thorn_points[:, 1, 1] = y_base + thorn_length * np.sin(theta_pos)
+    thorn_points[:, 1, 2] = z_pos + z_offset - thorn_length / 4
+
+    return thorn_points
+
+
+def thorn_lines(thorn_points: np.ndarray) -> tuple:
+    """
+    Lay out any number of thorn segments as one polyline with gaps.
+
+    The segments are laid out one after another with a NaN point between consecutive
+    thorns, which Plotly treats as a gap in the line, so all of them fit in one trace.
+
+    Args:
+        thorn_points (np.ndarray): An array of shape (num_thorns, 2, 3) of thorn start and end points.
+
+    Returns:
+        tuple: The x, y and z coordinates of the polyline.
+    """
+    thorn_points = np.asarray(thorn_points).reshape(-1, 2, 3)
+
+    # Append a NaN separator after every (start, end) pair
+    lines = np.full((len(thorn_points), 3, 3), np.nan, dtype=np.result_type(thorn_points, np.float32))
+    lines[:, :2] = thorn_points
+    return tuple(lines.reshape(-1, 3)[:-1].T)
+
+
+def wrap_surface(base_radius: float = 0.05, top_radius: float = 0.8, height: float = 1.2, x_offset: float = 0,
+                 y_offset: float = 0, z_offset: float = 0, angular_adjustments: np.ndarray = None,
+                 dtype: np.dtype = np.float64) -> tuple:
+    """
+    Compute the surface grid of an asymmetrical bouquet wrap.
+
+    The wrap widens from its base to an uneven top rim. Its radius and height are modulated
+    by the angle around the axis to create an appealing, asymmetrical shape.
+
+    Args:
+        base_radius (float): The starting radius at the base of the wrap.
+        top_radius (float): The nominal top radius of the wrap before adjustments.
+        height (float): The height of the wrap from base to top.
+        x_offset (float): Horizontal offset along the x-axis.
+        y_offset (float): Horizontal offset along the y-axis.
+        z_offset (float): Vertical offset along the z-axis.
+        angular_adjustments (np.ndarray, optional): An array of values to adjust the radius at various angles.
+            If None, no angular adjustments are applied.
+        dtype (np.dtype): Floating point type of the grids and every full-size intermediate.
+
+    Returns:
+        tuple: The (20, 60) x, y and z grids of the wrap.
+    """
+    # NumPy scalars would promote the grids to float64; Python floats keep `dtype`
+    base_radius, top_radius, height = float(base_radius), float(top_radius), float(height)
+    x_offset, y_offset, z_offset = float(x_offset), float(y_offset), float(z_offset)
+
+    with span('wrap geometry'):
+        # Define angles and vertical divisions for the wrap
+        theta = np.linspace(0, 2 * np.pi, 60, dtype=dtype)
+        z = np.linspace(0, height, 20, dtype=dtype)
+        theta, z = np.meshgrid(theta, z)
+
+        # Handle default case where no angular adjustments are specified
+        if angular_adjustments is None:
+            angular_adjustments = np.zeros_like(theta[0, :])  # Default to no adjustments
+        angular_adjustments = np.asarray(angular_adjustments, dtype=dtype)
+
+        # Calculate adjusted radii based on angular position
+        top_radii = top_radius + 0.4 * np.sin(3 * theta[0, :] + angular_adjustments)
+
+        # Interpolate between base and adjusted top radii
+        r = np.linspace(base_radius, 1, z.shape[0], dtype=dtype)[:, None] * top_radii
+
+        # Calculate coordinates in the xy-plane
+        x = r * np.cos(theta) + x_offset
+        y = r * np.sin(theta) + y_offset
+
+        # Adjust z-values to add vertical extrusions for asymmetry
+        z_extrusions = 0.5 * np.sin(2 * theta + angular_adjustments)  # Modulate z-values based on angle
+        z = z + z_extrusions * (z / height)  # Increase modulation towards the top
+        z += z_offset  # Apply vertical offset
+        record_arrays(x, y, z)
+
+    return x, y, z
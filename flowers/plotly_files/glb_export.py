@@ -0,0 +1,424 @@
+import json
+import os
+import struct
+from typing import TYPE_CHECKING, List, Tuple, Union
+
+import numpy as np
+from merged_mesh import colorscale_colors, grid_faces, grid_strip, parse_color, surface_grid, trace_colorscales
+from plot_export import quantize_colors
+from profiling import record_arrays, session, span
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# GLB container magic, version and chunk types (glTF 2.0 specification, section 4.4)
+GLB_MAGIC, GLB_VERSION = 0x46546C67, 2
+JSON_CHUNK, BIN_CHUNK = 0x4E4F534A, 0x004E4942
+
+# Accessor component types and primitive modes used by the exporter
+BYTE, UNSIGNED_BYTE, SHORT, UNSIGNED_SHORT, UNSIGNED_INT, FLOAT = 5120, 5121, 5122, 5123, 5125, 5126
+LINES, TRIANGLES, TRIANGLE_STRIP = 1, 4, 5
+
+# Number of components of each accessor type the exporter writes
+ACCESSOR_COMPONENTS = {'SCALAR': 1, 'VEC3': 3, 'VEC4': 4}
+
+# Extension that allows positions to be stored as normalized shorts and normals as normalized bytes,
+# supported by the common WebGL viewers
+QUANTIZATION_EXTENSION = 'KHR_mesh_quantization'
+
+# Largest magnitude of a normalized short, to which the extent of every quantized mesh is mapped
+SHORT_MAX = 32767
+
+# Buffer view targets of vertex attributes and of indices
+ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+# glTF is y-up while the flower scenes are z-up; the root node turns the scene by -90 degrees about x
+Z_UP_ROTATION = [-np.sqrt(0.5), 0.0, 0.0, np.sqrt(0.5)]
+
+def vertex_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """
+    Compute area-weighted vertex normals of a triangle mesh.
+
+    Args:
+        vertices (np.ndarray): The (N, 3) vertex positions.
+        faces (np.ndarray): The (F, 3) triangle vertex indices.
+
+    Returns:
+        np.ndarray: The (N, 3) unit normals as float32; vertices without area point along +z.
+    """
+    a, b, c = (vertices[faces[:, corner]] for corner in range(3))
+    face_normals = np.cross(b - a, c - a)
+
+    # Sum the face normals around each vertex, one bincount per axis instead of an unbuffered np.add.at
+    corners = faces.ravel()
+    normals = np.empty((len(vertices), 3))
+    for axis in range(3):
+        normals[:, axis] = np.bincount(corners, np.repeat(face_normals[:, axis], 3), minlength=len(vertices))
+
+    lengths = np.linalg.norm(normals, axis=1)
+    flat = lengths == 0
+    normals[flat] = (0, 0, 1)
+    lengths[flat] = 1
+    return (normals / lengths[:, None]).astype(np.float32)
+
+
+def _compact(vertices: np.ndarray, faces: np.ndarray, *attributes: np.ndarray) -> tuple:
+    """
+    Drop non-finite vertices, the faces that use them and any vertex no face uses.
+
+    NaN rows separate instances in stacked grids such as `rose_field`; Plotly leaves gaps there,
+    and glTF requires finite positions, so the gaps are removed from the mesh instead.
+
+    Args:
+        vertices (np.ndarray): The (N, 3) vertex positions.
+        faces (np.ndarray): The (F, K) vertex indices of triangles (K = 3) or line segments (K = 2).
+        *attributes (np.ndarray): Per-vertex arrays to compact alongside the positions.
+
+    Returns:
+        tuple: The compacted vertices, remapped faces and compacted attributes.
+    """
+    finite = np.isfinite(vertices).all(axis=1)
+    faces = faces[finite[faces].all(axis=1)]
+    used = np.zeros(len(vertices), dtype=bool)
+    used[faces.ravel()] = True
+    if used.all():
+        return (vertices, faces) + attributes
+
+    remap = np.cumsum(used) - 1
+    return (vertices[used], remap[faces]) + tuple(attribute[used] for attribute in attributes)
+
+
+def surface_primitive(trace: 'go.Surface') -> dict:
+    """
+    Triangulate a Surface trace into a colored glTF triangle primitive.
+
+    Args:
+        trace (go.Surface): The surface trace, such as a rose head, stem or wrap.
+
+    Returns:
+        dict: The 'positions', 'normals', 'colors', 'indices', 'mode' and 'opacity' of the primitive.
+    """
+    X, Y, Z, values = surface_grid(trace)
+    colorscale, = trace_colorscales([trace])
+    colors = colorscale_colors(values, colorscale, trace.cmin, trace.cmax)
+
+    vertices = np.stack([X.ravel(), Y.ravel(), Z.ravel()], axis=1)
+    faces = grid_faces(*Z.shape)
+    opacity = 1.0 if trace.opacity is None else trace.opacity
+
+    # A complete grid is drawn as one strip; grids with gaps fall back to the remaining triangles
+    if np.isfinite(vertices).all():
+        return {'positions': vertices, 'normals': vertex_normals(vertices, faces), 'colors': colors,
+                'indices': grid_strip(*Z.shape), 'mode': TRIANGLE_STRIP, 'opacity': opacity}
+
+    vertices, faces, colors = _compact(vertices, faces, colors)
+    return {'positions': vertices, 'normals': vertex_normals(vertices, faces), 'colors': colors,
+            'indices': faces, 'mode': TRIANGLES, 'opacity': opacity}
+
+
+def mesh3d_primitive(trace: 'go.Mesh3d') -> dict:
+    """
+    Convert a Mesh3d trace with vertex colors or intensities, such as a merged bouquet, into a glTF triangle primitive.
+
+    Args:
+        trace (go.Mesh3d): The mesh trace.
+
+    Returns:
+        dict: The 'positions', 'normals', 'colors', 'indices', 'mode' and 'opacity' of the primitive.
+    """
+    vertices = np.stack([np.asarray(trace[axis], dtype=float) for axis in 'xyz'], axis=1)
+    faces = np.stack([np.asarray(trace[axis], dtype=np.int64) for axis in 'ijk'], axis=1)
+    if trace.intensity is not None:
+        colorscale, = trace_colorscales([trace])
+        colors = colorscale_colors(trace.intensity, colorscale, trace.cmin, trace.cmax)
+    elif trace.vertexcolor is not None:
+        colors = np.full((len(vertices), 4), 255, dtype=np.uint8)
+        colors[:, :3] = quantize_colors(np.asarray(trace.vertexcolor))
+    else:
+        colors = np.tile(np.append(parse_color(trace.color or 'gray'), 255).astype(np.uint8), (len(vertices), 1))
+
+    vertices, faces, colors = _compact(vertices, faces, colors)
+    return {'positions': vertices, 'normals': vertex_normals(vertices, faces), 'colors': colors,
+            'indices': faces, 'mode': TRIANGLES, 'opacity': 1.0 if trace.opacity is None else trace.opacity}
+
+
+def line_primitive(trace: 'go.Scatter3d') -> dict:
+    """
+    Convert the NaN-separated polylines of a Scatter3d trace, such as the thorns, into a glTF line primitive.
+
+    Args:
+        trace (go.Scatter3d): The line trace.
+
+    Returns:
+        dict: The 'positions', 'colors', 'indices', 'mode' and 'opacity' of the primitive.
+    """
+    vertices = np.stack([np.asarray(trace[axis], dtype=float) for axis in 'xyz'], axis=1)
+    segments = np.stack([np.arange(len(vertices) - 1), np.arange(1, len(vertices))], axis=1)
+    colors = np.tile(np.append(parse_color(trace.line.color or 'gray'), 255).astype(np.uint8), (len(vertices), 1))
+
+    vertices, segments, colors = _compact(vertices, segments, colors)
+    return {'positions': vertices, 'colors': colors, 'indices': segments, 'mode': LINES,
+            'opacity': 1.0 if trace.opacity is None else trace.opacity}
+
+
+def figure_primitives(fig: 'go.Figure') -> List[Tuple[str, dict]]:
+    """
+    Convert every surface, mesh and line trace of a figure into a glTF primitive.
+
+    Args:
+        fig (go.Figure): The figure to convert.
+
+    Returns:
+        list: (name, primitive) pairs in trace order; traces without geometry are skipped.
+    """
+    converters = {'surface': surface_primitive, 'mesh3d': mesh3d_primitive}
+    primitives = []
+    for index, trace in enumerate(fig.data):
+        if trace.type in converters:
+            primitive = converters[trace.type](trace)
+        elif trace.type == 'scatter3d' and 'lines' in (trace.mode or 'lines'):
+            primitive = line_primitive(trace)
+        else:
+            continue
+        if len(primitive['indices']):
+            primitives.append((trace.name or f'{trace.type}-{index}', primitive))
+    return primitives
+
+
+class _BufferBuilder:
+    """
+    Packs arrays into a single binary buffer and describes them as glTF buffer views and accessors.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty buffer.
+        """
+        self.chunks = []
+        self.length = 0
+        self.buffer_views = []
+        self.accessors = []
+
+    def add(self, array: np.ndarray, component_type: int, accessor_type: str, target: int,
+            normalized: bool = False, bounds: bool = False, byte_stride: int = None) -> int:
+        """
+        Append an array as its own 4-byte aligned buffer view and accessor.
+
+        Args:
+            array (np.ndarray): The (count,) or (count, components) array, already in its final dtype.
+            component_type (int): The glTF component type matching the array's dtype.
+            accessor_type (str): 'SCALAR', 'VEC3' or 'VEC4'.
+            target (int): ARRAY_BUFFER for vertex attributes, ELEMENT_ARRAY_BUFFER for indices.
+            normalized (bool): Whether integer components map to [0, 1].
+            bounds (bool): Whether to record the per-component min and max, which glTF requires for POSITION.
+            byte_stride (int, optional): Distance between consecutive elements, for arrays padded to
+                4-byte aligned elements.
+
+        Returns:
+            int: The index of the new accessor.
+        """
+        data = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<')).tobytes()
+        self.buffer_views.append({'buffer': 0, 'byteOffset': self.length, 'byteLength': len(data), 'target': target})
+        if byte_stride:
+            self.buffer_views[-1]['byteStride'] = byte_stride
+        self.chunks.append(data + b'\0' * (-len(data) % 4))
+        self.length += len(data) + (-len(data) % 4)
+
+        accessor = {'bufferView': len(self.buffer_views) - 1, 'componentType': component_type,
+                    'count': len(array), 'type': accessor_type}
+        if normalized:
+            accessor['normalized'] = True
+        if bounds:
+            # Padding components of strided elements are not part of the accessor
+            components = array.reshape(len(array), -1)[:, :ACCESSOR_COMPONENTS[accessor_type]]
+            accessor['min'] = components.min(axis=0).tolist()
+            accessor['max'] = components.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+
+def figure_to_glb(fig: 'go.Figure', quantize: bool = False) -> bytes:
+    """
+    Convert the geometry of a figure into a binary glTF (GLB) file.
+
+    Every trace becomes one node and mesh with float32 positions, unit normals, RGBA vertex colors
+    and the smallest index type that fits; surface grids are drawn as a single triangle strip.
+    Translucent traces such as the bouquet wrap get a blended material with their opacity.
+    Layout and colorbars are not exported.
+
+    Args:
+        fig (go.Figure): The figure to convert.
+        quantize (bool): Whether to store positions as normalized shorts, which the mesh's node
+            scales and translates back into place, and normals as normalized bytes. Both take
+            a third of their float32 size, padded to 4-byte aligned elements, and require viewers
+            to support `QUANTIZATION_EXTENSION`.
+
+    Returns:
+        bytes: The GLB file.
+    """
+    with span('primitives'):
+        primitives = figure_primitives(fig)
+
+    with span('pack buffer'):
+        builder = _BufferBuilder()
+        materials = {}
+        meshes = []
+        nodes = []
+        for name, primitive in primitives:
+            positions = primitive['positions']
+            indices = primitive['indices'].ravel()
+            index_dtype, index_type = ((np.uint16, UNSIGNED_SHORT) if len(positions) <= 0xFFFF
+                                       else (np.uint32, UNSIGNED_INT))
+            nodes.append({'name': name, 'mesh': len(meshes)})
+
+            if quantize:
+                # The scale is the same along every axis, so that the normals stay valid in the node's frame
+                lower, upper = positions.min(axis=0), positions.max(axis=0)
+                center = (lower + upper) / 2
+                scale = max(float((upper - lower).max()) / 2, np.finfo(np.float32).tiny)
+                quantized = np.zeros((len(positions), 4), dtype=np.int16)
+                quantized[:, :3] = np.rint((positions - center) / scale * SHORT_MAX)
+                record_arrays(quantized, indices)
+                attributes = {'POSITION': builder.add(quantized, SHORT, 'VEC3', ARRAY_BUFFER, normalized=True,
+                                                      bounds=True, byte_stride=8)}
+                nodes[-1].update(translation=center.tolist(), scale=[scale] * 3)
+            else:
+                positions = positions.astype(np.float32)
+                record_arrays(positions, indices)
+                attributes = {'POSITION': builder.add(positions, FLOAT, 'VEC3', ARRAY_BUFFER, bounds=True)}
+
+            if 'normals' in primitive and quantize:
+                # Bytes padded to four per normal, since every vertex attribute element must be 4-byte aligned
+                normals = np.zeros((len(positions), 4), dtype=np.int8)
+                normals[:, :3] = np.rint(primitive['normals'] * 127)
+                attributes['NORMAL'] = builder.add(normals, BYTE, 'VEC3', ARRAY_BUFFER, normalized=True,
+                                                   byte_stride=4)
+            elif 'normals' in primitive:
+                attributes['NORMAL'] = builder.add(primitive['normals'], FLOAT, 'VEC3', ARRAY_BUFFER)
+            attributes['COLOR_0'] = builder.add(primitive['colors'], UNSIGNED_BYTE, 'VEC4', ARRAY_BUFFER,
+                                                normalized=True)
+
+            # One material per opacity, since vertex colors carry everything else
+            opacity = float(primitive['opacity'])
+            material = materials.setdefault(opacity, len(materials))
+            meshes.append({'name': name, 'primitives': [{
+                'attributes': attributes,
+                'indices': builder.add(indices.astype(index_dtype), index_type, 'SCALAR', ELEMENT_ARRAY_BUFFER),
+                'material': material, 'mode': primitive['mode']}]})
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'flowers glb_export'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'name': 'flowers', 'rotation': Z_UP_ROTATION, 'children': list(range(1, len(meshes) + 1))}]
+                 + nodes,
+        'meshes': meshes,
+        'materials': [{'pbrMetallicRoughness': {'baseColorFactor': [1.0, 1.0, 1.0, opacity],
+                                                'metallicFactor': 0.0, 'roughnessFactor': 0.9},
+                       'alphaMode': 'OPAQUE' if opacity >= 1 else 'BLEND', 'doubleSided': True}
+                      for opacity in materials],
+        'accessors': builder.accessors,
+        'bufferViews': builder.buffer_views,
+        'buffers': [{'byteLength': builder.length}],
+    }
+    if quantize:
+        gltf['extensionsUsed'] = gltf['extensionsRequired'] = [QUANTIZATION_EXTENSION]
+
+    with span('write container'):
+        document = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+        document += b' ' * (-len(document) % 4)
+        binary = b''.join(builder.chunks)
+        header = struct.pack('<III', GLB_MAGIC, GLB_VERSION, 12 + 8 + len(document) + 8 + len(binary))
+        return b''.join([header, struct.pack('<II', len(document), JSON_CHUNK), document,
+                         struct.pack('<II', len(binary), BIN_CHUNK), binary])
+
+
+def read_glb(data: bytes) -> Tuple[dict, bytes]:
+    """
+    Split a GLB file into its glTF document and binary buffer.
+
+    Args:
+        data (bytes): The GLB file.
+
+    Returns:
+        tuple: The parsed glTF JSON document and the bytes of its binary chunk.
+    """
+    magic, version, length = struct.unpack_from('<III', data)
+    if magic != GLB_MAGIC or version != GLB_VERSION or length != len(data):
+        raise ValueError('Not a glTF 2.0 binary file')
+    json_length, json_type = struct.unpack_from('<II', data, 12)
+    bin_length, bin_type = struct.unpack_from('<II', data, 20 + json_length)
+    if json_type != JSON_CHUNK or bin_type != BIN_CHUNK:
+        raise ValueError('Unexpected GLB chunk layout')
+    document = json.loads(data[20:20 + json_length])
+    return document, data[28 + json_length:28 + json_length + bin_length]
+
+
+def write_glb(fig: 'go.Figure', path: Union[str, os.PathLike], quantize: bool = False,
+              profile: str = None) -> int:
+    """
+    Export the geometry of a figure as a GLB file.
+
+    Args:
+        fig (go.Figure): The figure to export, e.g. from `rose_bouquet.build_rose_bouquet_figure`.
+        path (str or os.PathLike): Path of the .glb file to write.
+        quantize (bool): Whether to store positions and normals as normalized integers (see `figure_to_glb`).
+        profile (str, optional): Directory to write a profiling report to (see `profiling.session`).
+
+    Returns:
+        int: The number of bytes written.
+    """
+    with session('write_glb', profile):
+        data = figure_to_glb(fig, quantize)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return len(data)
+
+
+# ****
+if __name__ == '__main__':
+    import gzip
+    import tempfile
+    import time
+    from build import load_manifest
+    from plot_export import figure_to_html
+    from precompress import load_manifest as load_compression_manifest
+    from rose import build_single_rose_figure
+    from rose_bouquet import build_rose_bouquet_figure
+    from rose_head import build_rose_head_figure
+
+    # Measure the GLB against what the site ships for the same scene: the float32 page, and the published
+    # plot with its data blocks (without the shared plotly.min.js), raw and gzipped; tests/test_glb_export.py
+    # checks the round trip
+    build_manifest, compression_manifest = load_manifest(), load_compression_manifest()
+
+    def shipped_bytes(artifact: str, coding: str = None) -> int:
+        files = [artifact] + [asset for asset in build_manifest[artifact]['assets'] if asset != 'plotly.min.js']
+        entries = [compression_manifest[file] for file in files]
+        return sum(entry['bytes'] if coding is None or coding in entry['skipped'] else entry[coding]
+                   for entry in entries)
+
+    scenes = {'rose': (build_single_rose_figure(0), 'rose-plot.html'),
+              'rose head': (build_rose_head_figure(), 'rose-head-plot.html'),
+              'bouquet': (build_rose_bouquet_figure(0), 'rose-bouquet-plot.html')}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'scene.glb')
+        for name, (fig, artifact) in scenes.items():
+            page = len(figure_to_html(fig, 'float32', include_plotlyjs=False).encode('utf-8'))
+            shipped, shipped_gzip = shipped_bytes(artifact), shipped_bytes(artifact, '.gz')
+            print(f'{name}: float32 page {page / 1e6:.2f} MB, {artifact} with its data blocks '
+                  f'{shipped / 1e6:.2f} MB ({shipped_gzip / 1e6:.2f} MB gzipped)')
+
+            for quantize in (False, True):
+                start = time.perf_counter()
+                size = write_glb(fig, path, quantize)
+                seconds = time.perf_counter() - start
+                with open(path, 'rb') as f:
+                    data = f.read()
+                document, _ = read_glb(data)
+
+                compressed = len(gzip.compress(data, 9, mtime=0))
+                label = 'quantized GLB' if quantize else 'GLB'
+                print(f'  {label:<14} {len(document["meshes"]):3d} meshes {size / 1e6:6.2f} MB in {seconds:5.2f} s, '
+                      f'{size / page:6.1%} of the float32 page, {size / shipped:6.1%} of the shipped plot; '
+                      f'gzipped {compressed / 1e6:.2f} MB, {compressed / shipped_gzip:6.1%} of the shipped plot')
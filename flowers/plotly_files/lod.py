@@ -0,0 +1,178 @@
+import numpy as np
+from camera import camera_matrix, scene_transform
+from geometry import STEM_COLS, STEM_ROWS, rose_head_template
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# The (n_radial, n_theta) sampling of the rose head at each level of detail, finest first
+HEAD_TIERS = ((25, 1152), (13, 576), (9, 288), (5, 144))
+
+# The (rows, cols) sampling of the stem tube at each level of detail, finest first
+STEM_TIERS = ((STEM_ROWS, STEM_COLS), (25, 16), (13, 10), (7, 6))
+
+# Turns of the rose head's spiral, which `geometry.rose_head_factors` samples from 4 pi to 24 pi
+SPIRAL_TURNS = 10
+
+# Largest on-screen spacing, in pixels, between neighbouring samples along a head's outer petals
+MAX_SAMPLE_PIXELS = 2.0
+
+# Heads projected smaller than this many pixels across become a single marker of a shared impostor trace
+IMPOSTOR_PIXELS = 6.0
+
+# Marker color of an impostor's head, a red from the 'Reds' colorscale of the full heads
+IMPOSTOR_COLOR = 'rgb(239,59,44)'
+
+# Points along the center line of an impostor's stem
+IMPOSTOR_STEM_POINTS = 5
+
+# Viewport the projected sizes are measured in, matching the default poster size
+VIEWPORT = (1024, 1024)
+
+
+def head_sphere() -> tuple:
+    """
+    Compute the sphere around the bounding box of the default rose head.
+
+    Returns:
+        tuple: The (3,) center of the head's bounding box relative to the head's offset, and half
+               its diagonal, in the units of an unscaled rose.
+    """
+    low = np.array([values.min() for values in rose_head_template()])
+    high = np.array([values.max() for values in rose_head_template()])
+    return (low + high) / 2, float(np.linalg.norm(high - low)) / 2
+
+
+def tier_limits() -> np.ndarray:
+    """
+    Compute the smallest projected head diameter at which each level of detail is used.
+
+    A head d pixels across has an outer spiral turn of about pi * d pixels, sampled
+    n_theta / SPIRAL_TURNS times. Each tier is used down to the diameter at which the next
+    coarser tier keeps its samples within `MAX_SAMPLE_PIXELS`, and the coarsest tier down to
+    `IMPOSTOR_PIXELS`.
+
+    Returns:
+        np.ndarray: The descending (len(HEAD_TIERS),) diameters in pixels.
+    """
+    coarser = np.array([n_theta for _, n_theta in HEAD_TIERS[1:]], dtype=float)
+    return np.append(coarser * MAX_SAMPLE_PIXELS / (np.pi * SPIRAL_TURNS), IMPOSTOR_PIXELS)
+
+
+def projected_diameters(fig: 'go.Figure', centers: np.ndarray, radii: np.ndarray, bounds: np.ndarray,
+                        width: int = VIEWPORT[0], height: int = VIEWPORT[1]) -> np.ndarray:
+    """
+    Estimate how many pixels across each sphere appears through a figure's scene camera.
+
+    Data coordinates are mapped into Plotly's normalized scene box as `camera.scene_transform`
+    does, from the given bounds rather than every vertex, since the geometry is not built yet.
+    Each sphere is then projected with the layout's camera eye, up and center, and measured
+    between its top and bottom point along the camera's up direction, which works for both
+    perspective and orthographic projections.
+
+    Args:
+        fig (go.Figure): A figure whose layout holds the scene's camera and aspect mode.
+        centers (np.ndarray): The (N, 3) sphere centers in data coordinates.
+        radii (np.ndarray): The (N,) sphere radii in data units.
+        bounds (np.ndarray): Any (M, 3) points spanning the scene's data bounds.
+        width (int): Viewport width in pixels.
+        height (int): Viewport height in pixels.
+
+    Returns:
+        np.ndarray: The (N,) projected diameters in pixels, 0 for spheres behind the camera.
+    """
+    center, scale = scene_transform(fig, bounds)
+    matrix, rotation = camera_matrix(fig, width, height)
+
+    # Top and bottom point of every sphere along the camera's up direction, in the normalized box
+    middle = (centers - center) * scale
+    offset = np.asarray(radii)[:, None] * scale.max() * rotation[1]
+    points = np.concatenate([middle + offset, middle - offset])
+    clip = np.c_[points, np.ones(len(points))] @ matrix.T
+    top, bottom = np.split(clip, 2)
+
+    visible = (top[:, 3] > 0) & (bottom[:, 3] > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        extent = np.abs(top[:, 1] / top[:, 3] - bottom[:, 1] / bottom[:, 3]) * height / 2
+    return np.where(visible, extent, 0.0)
+
+
+def select_levels(diameters: np.ndarray) -> np.ndarray:
+    """
+    Choose the level of detail of every rose from its projected head diameter.
+
+    Args:
+        diameters (np.ndarray): The (N,) projected head diameters in pixels.
+
+    Returns:
+        np.ndarray: The (N,) indices into `HEAD_TIERS` and `STEM_TIERS`, where
+                    `len(HEAD_TIERS)` marks a rose drawn as an impostor.
+    """
+    return (np.asarray(diameters)[:, None] < tier_limits()).sum(axis=1)
+
+
+def level_report(levels: np.ndarray) -> dict:
+    """
+    Count the roses and surface vertices at every level of detail.
+
+    Thorns are left out, since they are line points rather than surface vertices.
+
+    Args:
+        levels (np.ndarray): The (N,) levels from `select_levels`.
+
+    Returns:
+        dict: The roses per tier, the impostor count, and the total head and stem vertices
+              before (every rose at full resolution) and after the selection, plus the
+              impostor trace's points.
+    """
+    counts = np.bincount(levels, minlength=len(HEAD_TIERS) + 1)
+    per_rose = np.array([n_radial * n_theta + rows * cols
+                         for (n_radial, n_theta), (rows, cols) in zip(HEAD_TIERS, STEM_TIERS)])
+    impostors = int(counts[-1])
+    return {
+        'tiers': {f'head {n_radial}x{n_theta}, stem {rows}x{cols}': int(count)
+                  for (n_radial, n_theta), (rows, cols), count in zip(HEAD_TIERS, STEM_TIERS, counts)},
+        'impostors': impostors,
+        'vertices_before': int(per_rose[0] * len(levels)),
+        'vertices_after': int(per_rose @ counts[:-1] + impostors * (IMPOSTOR_STEM_POINTS + 1)),
+    }
+
+
+# ****
+if __name__ == '__main__':
+    import time
+    from rose_bouquet import build_rose_bouquet_figure
+    from rose_field import build_rose_field, field_levels, random_rose_field
+
+    print('tier limits (px):', ', '.join(f'{limit:.1f}' for limit in tier_limits()))
+
+    # The bouquet's heads are all close to its camera, so every one keeps the full resolution
+    bouquet = build_rose_bouquet_figure(seed=0)
+    centers = np.array([[(np.nanmin(trace[axis]) + np.nanmax(trace[axis])) / 2 for axis in 'xyz']
+                        for trace in bouquet.data[1:12:2]])
+    bounds = np.concatenate([np.c_[np.ravel(trace.x), np.ravel(trace.y), np.ravel(trace.z)] for trace in bouquet.data])
+    diameters = projected_diameters(bouquet, centers, np.full(len(centers), head_sphere()[1]), bounds)
+    print('bouquet heads (px):', ', '.join(f'{d:.0f}' for d in diameters), '->', select_levels(diameters))
+
+    # Fields viewed from Plotly's default camera, from a low camera looking across the field and as a thumbnail;
+    # tests/test_lod.py checks that the built figures match these reports
+    build_rose_field(**random_rose_field(1))
+    low = dict(eye=dict(x=-1.6, y=-1.6, z=0.25), center=dict(x=0, y=0, z=-0.1))
+    for name, camera, viewport in (('default', None, VIEWPORT), ('low', low, VIEWPORT), ('thumbnail', None, (320, 240))):
+        for num_roses in (100, 1000, 10000):
+            layout = random_rose_field(num_roses)
+            report = level_report(field_levels(layout['positions'], layout['heights'], layout['orientations'],
+                                               layout['scales'], camera, viewport=viewport))
+
+            # The full-resolution field of 10,000 roses takes several GB, so only its level of detail is built
+            timings = {}
+            for lod in (False, True) if num_roses <= 1000 else (True,):
+                start = time.perf_counter()
+                build_rose_field(**layout, camera=camera, lod=lod, viewport=viewport)
+                timings[lod] = time.perf_counter() - start
+            full = f"{timings[False]:.2f} s -> " if False in timings else ''
+            print(f"{num_roses:5d} roses, {name + ':':10} {report['vertices_before']:9d} -> "
+                  f"{report['vertices_after']:8d} vertices ({report['vertices_after'] / report['vertices_before']:6.1%}), "
+                  f"tiers {list(report['tiers'].values())} + {report['impostors']} impostors, "
+                  f"build {full}{timings[True]:.2f} s")
@@ -0,0 +1,262 @@
+import re
+import numpy as np
+from css_colors import CSS_COLORS
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Tuple
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Matches rgb(r, g, b) and rgba(r, g, b, a) color strings
+RGB_PATTERN = re.compile(r'rgba?\(\s*([\d.]+)\s*,\s*([\d.]+)\s*,\s*([\d.]+)')
+
+
+@lru_cache(maxsize=16)
+def grid_faces(rows: int, cols: int) -> np.ndarray:
+    """
+    Compute the triangle indices that tessellate a structured grid of the given shape.
+
+    Every quad between neighbouring grid rows and columns becomes two triangles, which is
+    the same tessellation Plotly uses when it draws a Surface trace. The result only depends
+    on the grid shape, so it is memoized and shared by all grids of the same resolution.
+
+    Args:
+        rows (int): Number of grid rows.
+        cols (int): Number of grid columns.
+
+    Returns:
+        np.ndarray: A read-only (2 * (rows - 1) * (cols - 1), 3) array of vertex indices into
+                    the row-major flattened grid.
+    """
+    # Corner indices of every quad in the grid
+    index = np.arange(rows * cols, dtype=np.int32).reshape(rows, cols)
+    a, b = index[:-1, :-1].ravel(), index[:-1, 1:].ravel()
+    c, d = index[1:, :-1].ravel(), index[1:, 1:].ravel()
+
+    faces = np.concatenate([np.stack([a, b, d], axis=1), np.stack([a, d, c], axis=1)])
+    faces.setflags(write=False)
+    return faces
+
+
+@lru_cache(maxsize=16)
+def grid_strip(rows: int, cols: int) -> np.ndarray:
+    """
+    Compute a single triangle strip that covers a structured grid of the given shape.
+
+    Each pair of neighbouring rows becomes one strip that alternates between the two rows,
+    and consecutive strips are joined by repeating their end points, which only adds
+    degenerate triangles. The strip draws the same triangles as `grid_faces` with about a
+    third of the indices.
+
+    Args:
+        rows (int): Number of grid rows.
+        cols (int): Number of grid columns.
+
+    Returns:
+        np.ndarray: A read-only array of 2 * (rows - 1) * (cols + 1) - 2 vertex indices into
+                    the row-major flattened grid.
+    """
+    index = np.arange(rows * cols, dtype=np.int32).reshape(rows, cols)
+
+    # Every row pair alternates bottom and top, which splits each quad along the same diagonal as
+    # `grid_faces`, framed by copies of its first and last index
+    strips = np.empty((rows - 1, 2 * cols + 2), dtype=np.int32)
+    strips[:, 1:-1] = np.stack([index[1:], index[:-1]], axis=2).reshape(rows - 1, 2 * cols)
+    strips[:, 0], strips[:, -1] = strips[:, 1], strips[:, -2]
+
+    strip = strips.ravel()[1:-1].copy()
+    strip.setflags(write=False)
+    return strip
+
+
+def triangulate_grid(X: np.ndarray, Y: np.ndarray, Z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split a structured surface grid into an indexed triangle mesh.
+
+    Args:
+        X (np.ndarray): The (rows, cols) x-coordinates of the grid.
+        Y (np.ndarray): The (rows, cols) y-coordinates of the grid.
+        Z (np.ndarray): The (rows, cols) z-coordinates of the grid.
+
+    Returns:
+        tuple: A tuple of the (rows * cols, 3) vertex array and the (F, 3) array of
+               triangle vertex indices.
+    """
+    vertices = np.stack([X.ravel(), Y.ravel(), Z.ravel()], axis=1)
+    return vertices, grid_faces(*Z.shape)
+
+
+def surface_grid(trace: 'go.Surface') -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Read the coordinate grid and color values of a Surface trace as (rows, cols) arrays.
+
+    Args:
+        trace (go.Surface): The surface trace to read.
+
+    Returns:
+        tuple: The X, Y, Z grids and the values its colorscale is applied to, which are
+               `surfacecolor` when set and the z-coordinates otherwise.
+    """
+    Z = np.asarray(trace.z, dtype=float)
+    rows, cols = Z.shape
+    X = np.asarray(trace.x if trace.x is not None else np.arange(cols), dtype=float)
+    Y = np.asarray(trace.y if trace.y is not None else np.arange(rows), dtype=float)
+
+    # One-dimensional axes describe a rectilinear grid, like Plotly's own Surface handling
+    if X.ndim == 1:
+        X = np.broadcast_to(X[None, :], Z.shape)
+    if Y.ndim == 1:
+        Y = np.broadcast_to(Y[:, None], Z.shape)
+
+    values = Z if trace.surfacecolor is None else np.asarray(trace.surfacecolor, dtype=float)
+    return X, Y, Z, values
+
+
+def parse_color(color: str) -> np.ndarray:
+    """
+    Convert a Plotly color string to an RGB triple.
+
+    Args:
+        color (str): A color in rgb()/rgba(), #rrggbb / #rgb or CSS name notation.
+
+    Returns:
+        np.ndarray: The (3,) red, green and blue components in [0, 255].
+    """
+    color = color.strip().lower()
+    match = RGB_PATTERN.match(color)
+    if match:
+        return np.array([float(component) for component in match.groups()])
+    if color.startswith('#'):
+        digits = color[1:] if len(color) == 7 else ''.join(digit * 2 for digit in color[1:4])
+        return np.array([int(digits[i:i + 2], 16) for i in (0, 2, 4)], dtype=float)
+    if color in CSS_COLORS:
+        return np.array(CSS_COLORS[color], dtype=float)
+    raise ValueError(f'Unsupported color {color!r}; expected rgb(), hex or a CSS color name')
+
+
+def colorscale_colors(values: np.ndarray, colorscale: tuple, cmin: float = None, cmax: float = None) -> np.ndarray:
+    """
+    Map values through a colorscale the way Plotly colors a Surface or Mesh3d trace.
+
+    Args:
+        values (np.ndarray): The values to color.
+        colorscale (tuple): The (position, color) stops of the colorscale.
+        cmin (float, optional): The value mapped to the bottom of the colorscale. Defaults to the minimum.
+        cmax (float, optional): The value mapped to the top of the colorscale. Defaults to the maximum.
+
+    Returns:
+        np.ndarray: The (N, 4) RGBA colors as unsigned bytes, fully opaque.
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    cmin = np.nanmin(values) if cmin is None else cmin
+    cmax = np.nanmax(values) if cmax is None else cmax
+    # NaN values only occur at gaps, whose vertices are dropped later, so any color will do there
+    t = np.clip(np.nan_to_num((values - cmin) / (cmax - cmin if cmax > cmin else 1.0)), 0, 1)
+
+    positions = np.array([float(position) for position, _ in colorscale])
+    stops = np.array([parse_color(color) for _, color in colorscale])
+    colors = np.full((values.size, 4), 255, dtype=np.uint8)
+    for channel in range(3):
+        colors[:, channel] = np.rint(np.interp(t, positions, stops[:, channel]))
+    return colors
+
+
+def trace_colorscales(traces: List['go.Surface']):
+    """
+    Yield the effective colorscale of each surface trace as a hashable tuple.
+
+    Args:
+        traces (list): The surface traces.
+
+    Yields:
+        tuple: The (position, color) stops of each trace, reversed when `reversescale` is set.
+    """
+    import plotly.graph_objects as go
+
+    for trace in traces:
+        colorscale = tuple(tuple(stop) for stop in (trace.colorscale or go.Surface(colorscale='Plasma').colorscale))
+        if trace.reversescale:
+            colorscale = tuple((1 - position, color) for position, color in reversed(colorscale))
+        yield colorscale
+
+
+def merge_surfaces(fig: 'go.Figure') -> 'go.Figure':
+    """
+    Replace every Surface trace of a figure with merged, per-vertex colored Mesh3d traces.
+
+    Each surface grid is triangulated and appended to one shared vertex and index buffer.
+    Every vertex carries the color Plotly would give it on the original Surface, its value
+    mapped through the trace's colorscale and cmin / cmax, as an RGB `vertexcolor` of bytes.
+    Surfaces with different colorscales (such as Reds, Greens or the pink wrap) therefore
+    share one mesh. Plotly.js only reads byte colors unambiguously from typed arrays, so
+    the merged figure should be written with `plot_export`, which encodes them that way. Surfaces are grouped by opacity so translucent pieces such
+    as the bouquet wrap keep their look; a scene of opaque surfaces becomes one Mesh3d.
+    Traces that are not surfaces are kept as they are.
+
+    Args:
+        fig (go.Figure): The figure whose surfaces should be merged.
+
+    Returns:
+        go.Figure: A new figure with the same layout, merged meshes and remaining traces.
+    """
+    import plotly.graph_objects as go
+
+    groups = {}
+    others = []
+    for trace in fig.data:
+        if trace.type != 'surface':
+            others.append(trace)
+            continue
+        opacity = 1.0 if trace.opacity is None else trace.opacity
+        groups.setdefault(opacity, []).append(trace)
+
+    merged = go.Figure(layout=fig.layout)
+    for opacity, traces in groups.items():
+        grids = [surface_grid(trace) for trace in traces]
+        sizes = [grid[2].size for grid in grids]
+        face_counts = [2 * (grid[2].shape[0] - 1) * (grid[2].shape[1] - 1) for grid in grids]
+
+        # Preallocate the shared buffers and fill them one surface at a time
+        vertices = np.empty((3, sum(sizes)))
+        faces = np.empty((sum(face_counts), 3), dtype=np.int32)
+        colors = np.empty((sum(sizes), 3), dtype=np.uint8)
+        vertex_start = face_start = 0
+        for trace, colorscale, (X, Y, Z, values), size, face_count in zip(traces, trace_colorscales(traces), grids,
+                                                                          sizes, face_counts):
+            vertex_end, face_end = vertex_start + size, face_start + face_count
+            for axis, grid in enumerate((X, Y, Z)):
+                vertices[axis, vertex_start:vertex_end] = grid.ravel()
+            np.add(grid_faces(*Z.shape), vertex_start, out=faces[face_start:face_end])
+            colors[vertex_start:vertex_end] = colorscale_colors(values, colorscale, trace.cmin, trace.cmax)[:, :3]
+
+            vertex_start, face_start = vertex_end, face_end
+
+        merged.add_trace(go.Mesh3d(x=vertices[0], y=vertices[1], z=vertices[2],
+                                   i=faces[:, 0], j=faces[:, 1], k=faces[:, 2],
+                                   vertexcolor=colors, opacity=opacity))
+
+    for trace in others:
+        merged.add_trace(trace)
+
+    return merged
+
+
+# ****
+if __name__ == '__main__':
+    import time
+    from plot_export import figure_to_html
+    from rose_bouquet import build_rose_bouquet_figure
+
+    fig = build_rose_bouquet_figure(0)
+    merged = merge_surfaces(fig)
+
+    meshes = [trace for trace in merged.data if trace.type == 'mesh3d']
+    print(f'{len(fig.data)} traces ({sum(trace.type == "surface" for trace in fig.data)} surfaces) merged into '
+          f'{len(merged.data)} traces ({len(meshes)} meshes)')
+
+    for encoding in (None, 'float32'):
+        for name, figure in (('surfaces', fig), ('merged', merged)):
+            start = time.perf_counter()
+            page = figure_to_html(figure, encoding, include_plotlyjs=False)
+            seconds = time.perf_counter() - start
+            print(f'{name:<9} {encoding or "json":<8} to_html in {seconds:5.2f} s, {len(page) / 1e6:6.2f} MB')
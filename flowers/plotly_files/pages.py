@@ -0,0 +1,217 @@
+import ast
+import builtins
+import html
+import io
+import keyword
+import tokenize
+from pathlib import Path
+from string import Template
+
+# Directory holding the flower modules the pages show excerpts of
+PLOT_DIR = Path(__file__).resolve().parent
+
+# Template of a flower page, with $title, $plot (the plot file the page embeds), $poster (its poster image)
+# and $code placeholders
+PAGE_TEMPLATE = PLOT_DIR / 'page-template.html'
+
+# Names highlighted as built-ins when not used as attributes
+BUILTIN_NAMES = frozenset(name for name in dir(builtins) if not name.startswith('_'))
+
+# Token types that start a line, after which '@' begins a decorator rather than a matrix product
+LINE_STARTS = {tokenize.NEWLINE, tokenize.NL, tokenize.INDENT, tokenize.DEDENT, tokenize.ENCODING}
+
+# Token types of string literals, including the pieces Python 3.12 splits f-strings into
+STRING_TOKENS = {tokenize.STRING} | {getattr(tokenize, name) for name in ('FSTRING_START', 'FSTRING_MIDDLE',
+                                                                          'FSTRING_END') if hasattr(tokenize, name)}
+
+
+def highlight_python(source: str) -> str:
+    """
+    Highlight Python source as static HTML, with the class names highlight.js gives its spans.
+
+    The source is split with the standard library's tokenizer, so the page needs no
+    highlighting script and the markup is the same on every build. Everything between
+    tokens is copied verbatim, so the text of the result is exactly the source.
+
+    Args:
+        source (str): The Python source.
+
+    Returns:
+        str: The escaped source with keywords, strings, comments, numbers, literals, built-ins,
+             decorators and the names of defined functions and classes wrapped in spans.
+    """
+    # Offsets of every line's first character, to turn the tokenizer's (row, column) into offsets
+    line_offsets = [0]
+    for line in source.splitlines(keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    parts = []
+    position = 0
+    previous = None
+    decorator = False
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        start = line_offsets[token.start[0] - 1] + token.start[1]
+        end = line_offsets[token.end[0] - 1] + token.end[1]
+        if end <= start:
+            continue
+
+        css = None
+        if token.type == tokenize.COMMENT:
+            css = 'hljs-comment'
+        elif token.type in STRING_TOKENS:
+            css = 'hljs-string'
+        elif token.type == tokenize.NUMBER:
+            css = 'hljs-number'
+        elif token.type == tokenize.OP and token.string == '@' and (previous is None or previous.type in LINE_STARTS):
+            css, decorator = 'hljs-meta', True
+        elif token.type == tokenize.NAME:
+            after = previous.string if previous is not None else None
+            if after == 'def':
+                css = 'hljs-title function_'
+            elif after == 'class':
+                css = 'hljs-title class_'
+            elif decorator:
+                css = 'hljs-meta'
+            elif token.string in ('True', 'False', 'None'):
+                css = 'hljs-literal'
+            elif keyword.iskeyword(token.string):
+                css = 'hljs-keyword'
+            elif token.string in BUILTIN_NAMES and after != '.':
+                css = 'hljs-built_in'
+        if token.type == tokenize.NEWLINE or token.string == '(':
+            decorator = False
+
+        text = html.escape(source[start:end], quote=False)
+        parts.append(html.escape(source[position:start], quote=False))
+        parts.append(f'<span class="{css}">{text}</span>' if css else text)
+        position = end
+        if token.type not in (tokenize.COMMENT, tokenize.NL):
+            previous = token
+
+    parts.append(html.escape(source[position:], quote=False))
+    return ''.join(parts)
+
+
+def _definition_lines(tree: ast.Module, lines: list, name: str) -> tuple:
+    """
+    Find the lines of a module-level function, class or constant, with its decorators and the comment above it.
+
+    Args:
+        tree (ast.Module): The parsed module.
+        lines (list): The module's source lines.
+        name (str): The name the statement defines.
+
+    Returns:
+        tuple: The 1-based first and last line, or None if the module defines no such name.
+    """
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            names = {node.name}
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = {target.id for target in targets for target in ast.walk(target) if isinstance(target, ast.Name)}
+        else:
+            continue
+        if name in names:
+            first = min([node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])])
+            while first > 1 and lines[first - 2].lstrip().startswith('#'):
+                first -= 1
+            return first, node.end_lineno
+    return None
+
+
+def definition_source(qualified: str) -> str:
+    """
+    Copy one module-level definition of a flower module verbatim.
+
+    Args:
+        qualified (str): A qualified name such as 'geometry.rose_head_kernel' or 'geometry.HEAD_LIFT'.
+
+    Returns:
+        str: The definition's lines, with its decorators and the comment above it.
+    """
+    module, name = qualified.split('.')
+    source = (PLOT_DIR / f'{module}.py').read_text(encoding='utf-8')
+    lines = source.splitlines(keepends=True)
+    found = _definition_lines(ast.parse(source), lines, name)
+    if found is None:
+        raise ValueError(f"{module}.py defines no module-level {name!r}")
+    return ''.join(lines[found[0] - 1:found[1]]).rstrip('\n') + '\n'
+
+
+def source_excerpt(names: list) -> str:
+    """
+    Collect module-level definitions from the flower modules, verbatim, in the given order.
+
+    Every run of definitions from one module is headed by a comment naming the module. As in
+    the modules, consecutive constants are separated by one blank line and anything else by two.
+
+    Args:
+        names (list): Qualified names such as 'geometry.rose_head_kernel' or 'geometry.HEAD_LIFT'.
+
+    Returns:
+        str: The excerpt.
+    """
+    parts = []
+    previous = None
+    for qualified in names:
+        module, name = qualified.split('.')
+        constant = name.isupper()
+        if previous is None or module != previous[0]:
+            parts.append(('\n\n' if parts else '') + f'# {module}.py\n\n')
+        else:
+            parts.append('\n' if constant and previous[1] else '\n\n')
+        parts.append(definition_source(qualified))
+        previous = module, constant
+    return ''.join(parts)
+
+
+def render_page(excerpt: list, title: str, plot: str, poster: str) -> str:
+    """
+    Render a flower page that embeds a plot and shows the highlighted code building it.
+
+    Args:
+        excerpt (list): Qualified names of the definitions to show (see `source_excerpt`),
+            such as the geometry functions a scene is built from and its figure builder.
+        title (str): Title of the page.
+        plot (str): File name of the plot artifact the page embeds, such as 'rose-plot.html'.
+        poster (str): File name of the plot's poster image (see `poster.write_poster`), shown
+            behind the plot's frame until Plotly.js has drawn the plot over it.
+
+    Returns:
+        str: The page's HTML.
+    """
+    code = highlight_python(source_excerpt(excerpt))
+    return Template(PAGE_TEMPLATE.read_text(encoding='utf-8')).substitute(title=html.escape(title), plot=plot,
+                                                                          poster=poster, code=code)
+
+
+def write_page(excerpt: list, title: str, plot: str, poster: str, file) -> None:
+    """
+    Render a flower page (see `render_page`) and write it to a file.
+
+    Args:
+        excerpt (list): Qualified names of the definitions to show.
+        title (str): Title of the page.
+        plot (str): File name of the plot artifact the page embeds.
+        poster (str): File name of the plot's poster image.
+        file (str or Path): Path to write the page to.
+    """
+    with open(file, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(render_page(excerpt, title, plot, poster))
+
+
+# ****
+if __name__ == '__main__':
+    import time
+    from build import ARTIFACTS
+
+    # Time every flower page; tests/test_pages.py checks that the highlighted code reads as the excerpt
+    for name, artifact in ARTIFACTS.items():
+        if artifact.module != 'pages':
+            continue
+        start = time.perf_counter()
+        page = render_page(**artifact.params)
+        seconds = time.perf_counter() - start
+        print(f"{name:<20} {len(artifact.params['excerpt'])} definitions, {len(page) / 1e3:6.1f} kB, "
+              f"rendered in {seconds * 1e3:.1f} ms")
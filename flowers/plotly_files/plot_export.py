@@ -0,0 +1,439 @@
+import base64
+import os
+import numpy as np
+from contextlib import nullcontext
+from pathlib import Path
+from profiling import span
+from shared_assets import MIN_BLOCK_BYTES, PLOTLYJS_NAME, loader_tag, write_block, write_shared_scripts
+from typing import TYPE_CHECKING, Iterable, TextIO, Union
+
+# Plotly's serializers pull in most of plotly.offline, so they are only imported when a page is written
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Plotly.js dtype codes for the typed arrays this module emits
+TYPED_ARRAY_CODES = {
+    np.dtype('float32'): 'f4',
+    np.dtype('float64'): 'f8',
+    np.dtype('int16'): 'i2',
+    np.dtype('int32'): 'i4',
+    np.dtype('uint8'): 'u1',
+}
+
+# Trace attributes holding coordinate data that can be sent as typed arrays
+COORDINATE_KEYS = ('x', 'y', 'z')
+
+# Trace attributes holding triangle indices of Mesh3d traces and per-vertex color values
+INDEX_KEYS = ('i', 'j', 'k')
+VALUE_KEYS = ('intensity', 'surfacecolor')
+
+# Trace attributes holding RGB colors, such as the vertex colors of `merged_mesh.merge_surfaces`,
+# which are sent as one byte per channel
+COLOR_KEYS = ('vertexcolor', 'facecolor')
+
+# Supported values for the `encoding` argument of the plotting entry points
+ENCODINGS = (None, 'float32', 'int16')
+
+# Like 'float32', but large arrays are written to shared, cacheable data files (see `write_html`)
+SHARED_ENCODING = 'shared'
+
+# Stand in for the trace and frame lists in the HTML page written by `write_html`, which streams them in their place
+_DATA_PLACEHOLDER = '__streamed_trace_data__'
+_FRAMES_PLACEHOLDER = '__streamed_frames__'
+
+
+def encode_typed_array(values: np.ndarray, dtype: str = 'float32') -> dict:
+    """
+    Encode a numeric array as a Plotly.js base64 typed array specification.
+
+    Plotly.js decodes objects of the form {"dtype", "bdata", "shape"} natively, which
+    is far more compact and quicker to parse than the decimal JSON text that
+    `pio.to_html` writes for regular arrays.
+
+    Args:
+        values (np.ndarray): The array to encode. Two-dimensional arrays keep their shape.
+        dtype (str): The numpy dtype used for the binary payload, such as 'float32' or 'int16'.
+
+    Returns:
+        dict: A typed array specification that can replace the array in a trace.
+    """
+    # Arrays already in the payload's type, such as float32 geometry, are encoded without any copy
+    values = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    spec = {
+        'dtype': TYPED_ARRAY_CODES[np.dtype(dtype)],
+        'bdata': base64.b64encode(values).decode('ascii'),
+    }
+    if values.ndim > 1:
+        spec['shape'] = ','.join(str(n) for n in values.shape)
+    return spec
+
+
+def decode_typed_array(spec: dict) -> np.ndarray:
+    """
+    Decode a base64 typed array specification back into a numpy array.
+
+    Args:
+        spec (dict): A typed array specification produced by `encode_typed_array`.
+
+    Returns:
+        np.ndarray: The decoded array, reshaped if the specification carries a shape.
+    """
+    codes = {code: dtype for dtype, code in TYPED_ARRAY_CODES.items()}
+    values = np.frombuffer(base64.b64decode(spec['bdata']), dtype=codes[spec['dtype']].newbyteorder('<'))
+    if 'shape' in spec:
+        values = values.reshape([int(n) for n in spec['shape'].split(',')])
+    return values
+
+
+def _coordinate_arrays(traces: Iterable, keys: tuple = COORDINATE_KEYS):
+    """
+    Yield every numeric array stored under the given keys in a sequence of traces.
+
+    Args:
+        traces (Iterable): Trace dictionaries, such as the 'data' of `go.Figure.to_dict`, or the
+            trace objects of `go.Figure.data`, which are read without copying their arrays.
+        keys (tuple): The trace attributes to look at, the x/y/z coordinates by default.
+
+    Yields:
+        tuple: The trace, the attribute name, and the array stored under it.
+    """
+    for trace in traces:
+        for key in keys:
+            values = trace[key] if key in trace else None
+            if values is None or isinstance(values, dict):
+                continue
+            values = np.asarray(values)
+            if values.dtype.kind in 'fiu' and values.size:
+                yield trace, key, values
+
+
+def _figure_traces(data: Iterable, frames: Iterable) -> list:
+    """
+    List the traces of a figure followed by the traces of its animation frames.
+
+    Args:
+        data (Iterable): The figure's traces, as dictionaries or trace objects.
+        frames (Iterable): The figure's frames, as dictionaries or frame objects.
+
+    Returns:
+        list: Every trace, so that a shared int16 scale and the color encoding cover the frames too.
+    """
+    return list(data) + [trace for frame in frames if 'data' in frame and frame['data'] for trace in frame['data']]
+
+
+def coordinate_scale(traces: Iterable, encoding: str) -> float:
+    """
+    Compute the factor every coordinate of a scene is multiplied by before it is encoded.
+
+    Args:
+        traces (Iterable): The traces of the scene, as dictionaries or trace objects.
+        encoding (str): Either 'float32' or 'int16'.
+
+    Returns:
+        float: The shared int16 scale that maps the largest coordinate to the int16 range,
+               or 1.0 for 'float32'.
+    """
+    if encoding != 'int16':
+        return 1.0
+
+    # A single scale for the whole scene keeps every trace in proportion
+    max_abs = max((np.nanmax(np.abs(values)) for _, _, values in _coordinate_arrays(traces)), default=0)
+    return np.iinfo(np.int16).max / max_abs if max_abs > 0 else 1.0
+
+
+def quantize_colors(values: np.ndarray) -> np.ndarray:
+    """
+    Round RGB colors to one byte per channel.
+
+    Plotly.js reads the rows of a byte array as channels in [0, 255], while rows of floats
+    stay in [0, 1], so both are drawn the same.
+
+    Args:
+        values (np.ndarray): The (N, 3) colors, floats in [0, 1] or integers in [0, 255].
+
+    Returns:
+        np.ndarray: The (N, 3) colors as unsigned bytes.
+    """
+    if values.dtype.kind in 'iu':
+        return values.astype(np.uint8)
+    return np.rint(np.clip(values, 0, 1) * 255).astype(np.uint8)
+
+
+def encode_colors(trace: dict) -> dict:
+    """
+    Replace the RGB color arrays of one trace dictionary with byte typed arrays, in place.
+
+    Colors are encoded this way by every encoding, including the decimal JSON one, since a
+    plain JSON list of bytes is ambiguous to Plotly.js and a list of floats is twice as long.
+
+    Args:
+        trace (dict): A trace dictionary, such as one entry of `go.Figure.to_dict()['data']`.
+
+    Returns:
+        dict: The same trace dictionary.
+    """
+    for _, key, values in _coordinate_arrays([trace], COLOR_KEYS):
+        trace[key] = encode_typed_array(quantize_colors(values), 'uint8')
+
+    return trace
+
+
+def encode_trace(trace: dict, encoding: str = 'float32', scale: float = 1.0) -> dict:
+    """
+    Replace the numeric arrays of one trace dictionary with base64 typed arrays, in place.
+
+    Args:
+        trace (dict): A trace dictionary, such as one entry of `go.Figure.to_dict()['data']`.
+        encoding (str): Either 'float32' or 'int16'.
+        scale (float): The scene's coordinate scale from `coordinate_scale`.
+
+    Returns:
+        dict: The same trace dictionary.
+    """
+    for _, key, values in _coordinate_arrays([trace]):
+        if encoding == 'int16':
+            # NaN gaps, such as the separators between thorn segments, have no int16 form
+            if np.isfinite(values).all():
+                trace[key] = encode_typed_array(np.rint(values * scale), 'int16')
+            else:
+                trace[key] = encode_typed_array(values * scale, 'float32')
+        else:
+            trace[key] = encode_typed_array(values, 'float32')
+
+    # Mesh indices and color values are not coordinates, so the int16 scale never applies to them
+    for _, key, values in _coordinate_arrays([trace], INDEX_KEYS):
+        trace[key] = encode_typed_array(values, 'int32')
+    for _, key, values in _coordinate_arrays([trace], VALUE_KEYS):
+        trace[key] = encode_typed_array(values, 'float32')
+
+    return encode_colors(trace)
+
+
+def share_trace(trace: dict, directory: Path) -> dict:
+    """
+    Move the large arrays of one trace dictionary into shared data files, in place.
+
+    Arrays of at least `MIN_BLOCK_BYTES` are written with `shared_assets.write_block` and
+    replaced by references that the page's loader resolves; smaller ones are inlined as
+    typed arrays like the 'float32' encoding does. Colors are stored as bytes either way.
+
+    Args:
+        trace (dict): A trace dictionary, such as one entry of `go.Figure.to_dict()['data']`.
+        directory (Path): Directory of the page the trace is written to.
+
+    Returns:
+        dict: The same trace dictionary.
+    """
+    for keys, dtype in ((COORDINATE_KEYS, 'float32'), (INDEX_KEYS, 'int32'), (VALUE_KEYS, 'float32'),
+                        (COLOR_KEYS, 'uint8')):
+        for _, key, values in _coordinate_arrays([trace], keys):
+            if keys is COLOR_KEYS:
+                values = quantize_colors(values)
+            if values.size * np.dtype(dtype).itemsize >= MIN_BLOCK_BYTES:
+                trace[key] = write_block(values, directory, dtype, offset=keys is COORDINATE_KEYS)
+            else:
+                trace[key] = encode_typed_array(values, dtype)
+
+    return trace
+
+
+def _check_encoding(encoding: str, allowed: tuple = ENCODINGS[1:]) -> None:
+    """
+    Raise a ValueError unless `encoding` is one of the allowed encodings.
+
+    Args:
+        encoding (str): The requested encoding.
+        allowed (tuple): The encodings supported by the caller, the typed array encodings by default.
+    """
+    if encoding not in allowed:
+        raise ValueError(f"Unsupported encoding {encoding!r}; expected one of {allowed}")
+
+
+def encode_figure(fig: 'go.Figure', encoding: str = 'float32') -> dict:
+    """
+    Convert a figure into a dictionary whose coordinate arrays are base64 typed arrays.
+
+    With 'float32' each coordinate is stored at single precision, which is what WebGL
+    renders with anyway. With 'int16' every coordinate in the figure, including the traces
+    of its animation frames, is multiplied by one shared scale factor and rounded, so the scene keeps its proportions and colors
+    but hover labels show the scaled values. The worst case error is half a quantization
+    step, i.e. `max_abs / 65534` in the original units.
+
+    Args:
+        fig (go.Figure): The figure to encode.
+        encoding (str): Either 'float32' or 'int16'.
+
+    Returns:
+        dict: A figure dictionary suitable for `pio.to_html(..., validate=False)`.
+    """
+    _check_encoding(encoding)
+
+    fig_dict = fig.to_dict()
+    traces = _figure_traces(fig_dict['data'], fig_dict.get('frames', []))
+    scale = coordinate_scale(traces, encoding)
+    for trace in traces:
+        encode_trace(trace, encoding, scale)
+
+    return fig_dict
+
+
+def write_html(fig: 'go.Figure', file: Union[str, os.PathLike, TextIO], encoding: str = None, **kwargs) -> int:
+    """
+    Stream the HTML of a figure to a file one trace at a time.
+
+    The page around the plot is rendered by `pio.to_html` from the layout alone, with
+    placeholders where the trace list and the animation frames go. The traces and then the
+    frames are copied, encoded and serialized one by one with Plotly's JSON encoder (orjson
+    when it is installed) and written in place of the placeholders. Neither the full figure
+    dictionary nor the full HTML string is ever built, so peak memory is bounded by the
+    largest single trace or frame.
+    Serializing a list is the same as joining its serialized items with commas, so the
+    result is identical to `figure_to_html` with the same arguments and a fixed `div_id`.
+
+    The 'shared' encoding is meant for pages that show the same geometry. It loads Plotly.js
+    from a `plotly.min.js` next to the page (like `include_plotlyjs='directory'`, so no CDN
+    is needed) and moves large arrays into content-addressed files under `data/` (see
+    `share_trace`). A small loader script fetches them before plotting, so every page in the
+    directory reuses the browser's cached copies of the bundle and of shared blocks such as
+    the rose head mesh.
+
+    Args:
+        fig (go.Figure): The figure to write.
+        file (str, os.PathLike or file object): Path of the output file, or a text file
+            object to write to. The 'shared' encoding needs a path.
+        encoding (str, optional): None for decimal JSON coordinates, 'float32' / 'int16' to
+            embed them as base64 typed arrays (see `encode_figure`), or 'shared'.
+        **kwargs: Additional keyword arguments forwarded to `pio.to_html`.
+
+    Returns:
+        int: The number of characters written.
+    """
+    import plotly.io as pio
+    from plotly.io.json import to_json_plotly
+
+    if encoding is not None:
+        _check_encoding(encoding, ENCODINGS[1:] + (SHARED_ENCODING,))
+
+    shared = encoding == SHARED_ENCODING
+    if shared:
+        if not isinstance(file, (str, os.PathLike)):
+            raise ValueError(f"The {SHARED_ENCODING!r} encoding writes files next to the page and needs a file path")
+        directory = Path(file).resolve().parent
+        write_shared_scripts(directory)
+        kwargs['include_plotlyjs'] = 'directory'
+
+    def encode(trace_dict: dict) -> dict:
+        if shared:
+            return share_trace(trace_dict, directory)
+        if encoding:
+            return encode_trace(trace_dict, encoding, scale)
+        return encode_colors(trace_dict)
+
+    with span('encode typed arrays'):
+        scale = coordinate_scale(_figure_traces(fig.data, fig.frames), encoding) if encoding else 1.0
+
+    with span('to_html'):
+        shell = {'data': _DATA_PLACEHOLDER, 'layout': fig.layout.to_plotly_json()}
+        if fig.frames:
+            shell['frames'] = _FRAMES_PLACEHOLDER
+        kwargs.pop('validate', None)
+        html = pio.to_html(shell, validate=False, **kwargs)
+        if shared:
+            # Load the data block loader after Plotly.js and let it call Plotly.newPlot once the data is in
+            plotlyjs_tag = f'<script charset="utf-8" src="{PLOTLYJS_NAME}"></script>'
+            html = html.replace(plotlyjs_tag, plotlyjs_tag + loader_tag(), 1)
+            html = html.replace('Plotly.newPlot(', 'roseSharedData.newPlot(', 1)
+        head, tail = html.split(to_json_plotly(_DATA_PLACEHOLDER))
+        middle, tail = tail.split(to_json_plotly(_FRAMES_PLACEHOLDER)) if fig.frames else (tail, None)
+
+    opened = open(file, 'w', encoding='utf-8') if isinstance(file, (str, os.PathLike)) else nullcontext(file)
+    with opened as stream, span('stream traces'):
+        written = stream.write(head)
+        written += stream.write('[')
+        for index, trace in enumerate(fig.data):
+            written += stream.write((',' if index else '') + to_json_plotly(encode(trace.to_plotly_json())))
+        written += stream.write(']')
+        written += stream.write(middle)
+
+        # Frames are streamed one at a time like the traces, each with its own traces encoded
+        if tail is not None:
+            written += stream.write('[')
+            for index, frame in enumerate(fig.frames):
+                frame_dict = frame.to_plotly_json()
+                if 'data' in frame_dict:
+                    frame_dict['data'] = [encode(trace) for trace in frame_dict['data']]
+                written += stream.write((',' if index else '') + to_json_plotly(frame_dict))
+            written += stream.write(']')
+            written += stream.write(tail)
+
+    return written
+
+
+def figure_to_html(fig: 'go.Figure', encoding: str = None, file: Union[str, os.PathLike, TextIO] = None,
+                   **kwargs) -> str:
+    """
+    Convert a figure to HTML, optionally serializing its coordinates as typed arrays.
+
+    Args:
+        fig (go.Figure): The figure to convert.
+        encoding (str, optional): None for the default decimal JSON output of `pio.to_html`
+            (RGB colors are still sent as bytes, see `encode_colors`),
+            'float32' / 'int16' to embed coordinates as base64 typed arrays, or 'shared' to
+            move them into cacheable data files next to `file` (see `write_html`).
+        file (str, os.PathLike or file object, optional): If given, the HTML is streamed to this
+            file with `write_html` instead of being returned. Required for 'shared'.
+        **kwargs: Additional keyword arguments forwarded to `pio.to_html`.
+
+    Returns:
+        str: The HTML representation of the figure, or None if it was written to `file`.
+    """
+    import plotly.io as pio
+
+    if file is not None or encoding == SHARED_ENCODING:
+        write_html(fig, file, encoding, **kwargs)
+        return None
+
+    if encoding is None:
+        if not any(True for _ in _coordinate_arrays(_figure_traces(fig.data, fig.frames), COLOR_KEYS)):
+            with span('to_html'):
+                return pio.to_html(fig, **kwargs)
+
+        # Only the colors are encoded, the coordinates stay decimal JSON
+        with span('encode typed arrays'):
+            fig_dict = fig.to_dict()
+            for trace in _figure_traces(fig_dict['data'], fig_dict.get('frames', [])):
+                encode_colors(trace)
+        with span('to_html'):
+            return pio.to_html(fig_dict, validate=False, **kwargs)
+
+    with span('encode typed arrays'):
+        fig_dict = encode_figure(fig, encoding)
+    with span('to_html'):
+        return pio.to_html(fig_dict, validate=False, **kwargs)
+
+
+# ****
+if __name__ == '__main__':
+    # Compare the page size and round-trip error of every encoding; tests/test_plot_export.py checks them
+    from rose import build_single_rose_figure
+    from rose_head import build_rose_head_figure
+    from rose_bouquet import build_rose_bouquet_figure
+
+    int16_max = np.iinfo(np.int16).max
+    for build in (build_single_rose_figure, build_rose_head_figure, build_rose_bouquet_figure):
+        fig = build()
+        reference = [values for _, _, values in _coordinate_arrays(fig.to_dict()['data'])]
+        max_abs = max(np.nanmax(np.abs(values)) for values in reference)
+
+        print(f'{build.__name__}:')
+        for encoding in ENCODINGS:
+            size = len(figure_to_html(fig, encoding, include_plotlyjs='cdn', div_id='plot'))
+            if encoding is None:
+                print(f'    {str(encoding):<8} {size / 1e6:7.3f} MB')
+                continue
+
+            restored = [decode_typed_array(trace[key]) for trace in encode_figure(fig, encoding)['data']
+                        for key in COORDINATE_KEYS if isinstance(trace.get(key), dict)]
+            scale = int16_max / max_abs if encoding == 'int16' else 1.0
+            error = max(np.nanmax(np.abs(r / scale - v)) for r, v in zip(restored, reference))
+            print(f'    {str(encoding):<8} {size / 1e6:7.3f} MB, max error {error:.2e}')
@@ -0,0 +1,285 @@
+import os
+import struct
+import zlib
+from typing import TYPE_CHECKING, List, Tuple, Union
+
+import numpy as np
+from camera import camera_matrix, scene_transform
+from glb_export import LINES, TRIANGLE_STRIP, figure_primitives
+from merged_mesh import parse_color
+from profiling import record_arrays, session, span
+from rose import build_single_rose_figure
+from rose_bouquet import build_rose_bouquet_figure
+from rose_head import build_rose_head_figure
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Lambert shading: the share of the color every face receives, plus the share scaled by its facing ratio
+AMBIENT, DIFFUSE = 0.45, 0.55
+
+# Light direction in camera space, from above and to the left of the viewer
+LIGHT = np.array([-0.3, 0.5, 1.0]) / np.linalg.norm([-0.3, 0.5, 1.0])
+
+# Triangles are rasterized in groups whose pixel bounding boxes fit the same tile size, and in
+# chunks of at most this many candidate pixels, which bounds the temporary arrays
+MAX_CANDIDATES = 1 << 22
+
+# Figure builders of the scenes a poster can be rendered for, with their default arguments
+SCENES = {
+    'rose': (build_single_rose_figure, {'seed': 0}),
+    'rose_head': (build_rose_head_figure, {}),
+    'bouquet': (build_rose_bouquet_figure, {'seed': 0}),
+}
+
+
+def strip_triangles(strip: np.ndarray) -> np.ndarray:
+    """
+    Expand a triangle strip into a triangle list, dropping the degenerate joining triangles.
+
+    Args:
+        strip (np.ndarray): The strip's vertex indices.
+
+    Returns:
+        np.ndarray: The (F, 3) triangle vertex indices.
+    """
+    triangles = np.stack([strip[:-2], strip[1:-1], strip[2:]], axis=1)
+    distinct = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) \
+        & (triangles[:, 0] != triangles[:, 2])
+    return triangles[distinct]
+
+
+def _triangle_fragments(screen: np.ndarray, depth: np.ndarray, faces: np.ndarray,
+                        width: int, height: int) -> List[Tuple[np.ndarray, ...]]:
+    """
+    Find the pixel centers covered by each triangle, vectorized over groups of similar size.
+
+    Triangles are grouped by the power-of-two tile that holds their pixel bounding box. Within
+    a group every triangle tests all pixels of its tile at once. Barycentric coordinates and
+    depth are affine in the pixel position, so each costs one multiply-add per candidate pixel
+    and axis on top of per-triangle coefficients.
+
+    Args:
+        screen (np.ndarray): The (N, 2) vertex positions in pixels.
+        depth (np.ndarray): The (N,) vertex depths, smaller being closer.
+        faces (np.ndarray): The (F, 3) triangles to rasterize.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+
+    Returns:
+        list: Chunks of (pixel index, depth, triangle index, barycentric b1, barycentric b2) arrays.
+    """
+    a, b, c = (screen[faces[:, corner]] for corner in range(3))
+    corners = np.stack([a, b, c], axis=1)
+    low = np.maximum(np.floor(corners.min(axis=1) - 0.5).astype(np.int64) + 1, 0)
+    high = np.minimum(np.floor(corners.max(axis=1) - 0.5).astype(np.int64), [width - 1, height - 1])
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+    # Skip triangles without area, outside the image or between pixel centers
+    visible = np.flatnonzero((high >= low).all(axis=1) & (area != 0))
+    a, b, c, area, low, high = a[visible], b[visible], c[visible], area[visible], low[visible], high[visible]
+
+    # b1 = (p - a) x (c - a) / area and b2 = (b - a) x (p - a) / area as affine functions of p
+    x1, y1 = (c[:, 1] - a[:, 1]) / area, (a[:, 0] - c[:, 0]) / area
+    x2, y2 = (a[:, 1] - b[:, 1]) / area, (b[:, 0] - a[:, 0]) / area
+    origin = low + 0.5 - a
+    b1_origin, b2_origin = origin[:, 0] * x1 + origin[:, 1] * y1, origin[:, 0] * x2 + origin[:, 1] * y2
+    z0, z1, z2 = (depth[faces[visible, corner]] for corner in range(3))
+
+    # Tile width and height per triangle, each rounded up to a power of two
+    extent = high - low + 1
+    tiles = (2 ** np.ceil(np.log2(extent))).astype(np.int64)
+    keys = tiles[:, 0] * (1 << 20) + tiles[:, 1]
+
+    chunks = []
+    for key in np.unique(keys):
+        tile_x, tile_y = int(key >> 20), int(key & ((1 << 20) - 1))
+        group = np.flatnonzero(keys == key)
+        step = max(1, MAX_CANDIDATES // (tile_x * tile_y))
+        dx, dy = np.arange(tile_x), np.arange(tile_y)
+        for start in range(0, len(group), step):
+            index = group[start:start + step]
+
+            # Candidate grid of shape (triangles, tile_y, tile_x)
+            b1 = (b1_origin[index, None] + y1[index, None] * dy)[:, :, None] + (x1[index, None] * dx)[:, None, :]
+            b2 = (b2_origin[index, None] + y2[index, None] * dy)[:, :, None] + (x2[index, None] * dx)[:, None, :]
+            inside = (b1 >= 0) & (b2 >= 0) & (b1 + b2 <= 1)
+            inside &= (dy < extent[index, 1, None])[:, :, None] & (dx < extent[index, 0, None])[:, None, :]
+
+            triangle, row, col = np.nonzero(inside)
+            u, v = b1[triangle, row, col], b2[triangle, row, col]
+            triangle = index[triangle]
+            z = z0[triangle] + (z1[triangle] - z0[triangle]) * u + (z2[triangle] - z0[triangle]) * v
+            pixel = (low[triangle, 1] + row) * width + low[triangle, 0] + col
+            chunks.append((pixel, z, visible[triangle], u, v))
+    return chunks
+
+
+def _line_fragments(screen: np.ndarray, depth: np.ndarray, segments: np.ndarray,
+                    width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sample line segments about once per pixel of their length.
+
+    Args:
+        screen (np.ndarray): The (N, 2) vertex positions in pixels.
+        depth (np.ndarray): The (N,) vertex depths.
+        segments (np.ndarray): The (S, 2) segment vertex indices.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+
+    Returns:
+        tuple: The pixel indices, depths and segment indices of the samples inside the image.
+    """
+    start, end = screen[segments[:, 0]], screen[segments[:, 1]]
+    counts = np.ceil(np.linalg.norm(end - start, axis=1)).astype(np.int64) + 1
+    segment = np.repeat(np.arange(len(segments)), counts)
+    t = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) / np.repeat(counts - 1 + (counts == 1), counts)
+
+    points = start[segment] + t[:, None] * (end[segment] - start[segment])
+    z = depth[segments[segment, 0]] * (1 - t) + depth[segments[segment, 1]] * t
+    pixel = np.floor(points).astype(np.int64)
+    inside = (pixel >= 0).all(axis=1) & (pixel[:, 0] < width) & (pixel[:, 1] < height)
+    return pixel[inside, 1] * width + pixel[inside, 0], z[inside], segment[inside]
+
+
+def render_figure(fig: 'go.Figure', width: int = 1024, height: int = 1024) -> np.ndarray:
+    """
+    Rasterize the surfaces, meshes and lines of a figure into an RGB image.
+
+    The geometry is viewed through the figure's own scene camera and shaded with two-sided
+    Lambert lighting from a light that moves with the camera. Every trace is drawn opaque,
+    and each pixel takes the color of the closest surface covering its center.
+
+    Args:
+        fig (go.Figure): The figure to render.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+
+    Returns:
+        np.ndarray: The (height, width, 3) image as unsigned bytes.
+    """
+    with span('primitives'):
+        primitives = figure_primitives(fig)
+
+    with span('project'):
+        center, scale = scene_transform(fig, np.concatenate([primitive['positions'] for _, primitive in primitives]))
+        matrix, rotation = camera_matrix(fig, width, height)
+
+    background = parse_color(fig.layout.paper_bgcolor or 'white').astype(np.uint8)
+    depth_buffer = np.full(width * height, np.inf)
+    fragments = []
+    with span('rasterize'):
+        for _, primitive in primitives:
+            vertices = (primitive['positions'] - center) * scale
+            clip = np.c_[vertices, np.ones(len(vertices))] @ matrix.T
+            ndc = clip[:, :3] / clip[:, 3:]
+            screen = np.stack([(ndc[:, 0] + 1) * width / 2, (1 - ndc[:, 1]) * height / 2], axis=1)
+            depth = np.where(clip[:, 3] > 0, ndc[:, 2], np.inf)
+            colors = primitive['colors'][:, :3].astype(float)
+
+            # Line samples take the color of their segment's start, so they are stored as triangles
+            # whose corners all are that vertex
+            if primitive['mode'] == LINES:
+                pixel, z, segment = _line_fragments(screen, depth, primitive['indices'], width, height)
+                zeros = np.zeros(len(pixel))
+                fragments.append((pixel, z, colors, primitive['indices'][:, [0, 0, 0]], segment, zeros, zeros))
+                np.minimum.at(depth_buffer, pixel, z)
+                continue
+
+            faces = strip_triangles(primitive['indices']) if primitive['mode'] == TRIANGLE_STRIP \
+                else primitive['indices']
+            faces = faces[np.isfinite(depth[faces]).all(axis=1)]
+
+            # Gouraud-interpolated Lambert shading. Cross products scale by the cofactor of the diagonal
+            # box scaling, so the exported normals divided by the scale point along the box's normals.
+            normals = primitive['normals'] / scale
+            normals = (normals / np.linalg.norm(normals, axis=1, keepdims=True)) @ rotation.T
+            shaded = colors * (AMBIENT + DIFFUSE * np.abs(normals @ LIGHT))[:, None]
+            for pixel, z, triangle, u, v in _triangle_fragments(screen, depth, faces, width, height):
+                fragments.append((pixel, z, shaded, faces, triangle, u, v))
+                np.minimum.at(depth_buffer, pixel, z)
+
+    with span('resolve'):
+        image = np.tile(background, (width * height, 1))
+        # Only the closest fragment of each pixel is shaded
+        for pixel, z, shaded, faces, triangle, u, v in fragments:
+            closest = np.flatnonzero(z <= depth_buffer[pixel])
+            corners, u, v = faces[triangle[closest]], u[closest, None], v[closest, None]
+            color = shaded[corners[:, 0]] * (1 - u - v) + shaded[corners[:, 1]] * u + shaded[corners[:, 2]] * v
+            image[pixel[closest]] = np.clip(np.rint(color), 0, 255)
+        record_arrays(depth_buffer, image)
+
+    return image.reshape(height, width, 3)
+
+
+def encode_png(image: np.ndarray, level: int = 6) -> bytes:
+    """
+    Encode an RGB image as a PNG file.
+
+    Args:
+        image (np.ndarray): The (height, width, 3) image as unsigned bytes.
+        level (int): zlib compression level.
+
+    Returns:
+        bytes: The PNG file.
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    height, width, _ = image.shape
+    # Every scanline uses filter type 2 (up), storing its difference to the previous scanline, which
+    # turns the large flat areas of a rendered scene into runs of zeros
+    rows = image.reshape(height, -1)
+    scanlines = np.full((height, rows.shape[1] + 1), 2, dtype=np.uint8)
+    np.subtract(rows, np.vstack([np.zeros_like(rows[:1]), rows[:-1]]), out=scanlines[:, 1:])
+    return b''.join([b'\x89PNG\r\n\x1a\n',
+                     chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+                     chunk(b'IDAT', zlib.compress(scanlines.tobytes(), level)),
+                     chunk(b'IEND', b'')])
+
+
+def write_poster(scene: str = 'bouquet', width: int = 1024, height: int = 1024, profile: str = None,
+                 file: Union[str, os.PathLike] = None) -> bytes:
+    """
+    Render a poster image of one of the flower scenes without a browser.
+
+    Args:
+        scene (str): A key of `SCENES`: 'rose', 'rose_head' or 'bouquet'.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        profile (str, optional): Directory to write a profiling report to (see `profiling.session`).
+        file (str or os.PathLike, optional): If given, the PNG is written to this path and None is returned.
+
+    Returns:
+        bytes: The PNG file, or None if it was written to `file`.
+    """
+    builder, params = SCENES[scene]
+    with session('write_poster', profile):
+        with span('build figure'):
+            fig = builder(**params)
+        image = render_figure(fig, width, height)
+        with span('encode png'):
+            png = encode_png(image)
+
+    if file is None:
+        return png
+    with open(file, 'wb') as f:
+        f.write(png)
+    return None
+
+
+# ****
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    # Warm up Plotly's validators so the timings below only measure the poster; tests/test_poster.py checks the
+    # rendering
+    build_rose_head_figure()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in SCENES:
+            path = os.path.join(directory, 'poster.png')
+            start = time.perf_counter()
+            write_poster(name, file=path)
+            print(f'{name:<10} 1024x1024 poster in {time.perf_counter() - start:.2f} s, {os.path.getsize(path) / 1e3:.0f} kB')
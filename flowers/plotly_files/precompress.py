@@ -0,0 +1,230 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable
+
+# brotli is a build requirement, but importing this module without it still works so that `require_brotli` can say so
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Directory holding the plot artifacts; manifest keys are paths relative to it
+PLOT_DIR = Path(__file__).resolve().parent
+
+# Records the raw and compressed sizes and the content hash of every published file
+MANIFEST_PATH = PLOT_DIR / 'compression-manifest.json'
+
+# Siblings are compressed once per build and then served many times, so compression is slow but small
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Suffixes of the siblings written next to every file, one per content coding
+CODINGS = ('.br', '.gz')
+
+# Suffixes of the files worth compressing; the PNG posters already are
+COMPRESSIBLE_SUFFIXES = ('.html', '.js', '.bin')
+
+# A sibling is only written if it is at most this fraction of the raw size, so files that barely shrink,
+# such as most float32 data blocks, are served as they are
+MAX_RATIO = 0.8
+
+
+def compress(data: bytes, coding: str) -> bytes:
+    """
+    Compress bytes at maximum compression, reproducibly.
+
+    Args:
+        data (bytes): The raw bytes.
+        coding (str): '.gz' or '.br'.
+
+    Returns:
+        bytes: The compressed bytes. The gzip header carries no timestamp, so equal input
+               always gives equal output.
+    """
+    if coding == '.gz':
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    if coding == '.br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported coding {coding!r}; expected one of {', '.join(CODINGS)}")
+
+
+def _manifest_key(path: Path) -> str:
+    """
+    Name a file in the manifest by its path relative to the plot directory.
+
+    Args:
+        path (Path): The file.
+
+    Returns:
+        str: The relative POSIX path, such as 'data/0d85ef633f8c2855db74.bin' or '../index.html'.
+    """
+    return Path(os.path.relpath(Path(path).resolve(), PLOT_DIR)).as_posix()
+
+
+def _write_sibling(path: Path, coding: str, data: bytes) -> int:
+    """
+    Compress a file's bytes and write them atomically next to it, if they shrink enough.
+
+    Args:
+        path (Path): The raw file.
+        coding (str): Suffix of the sibling.
+        data (bytes): The raw file's content.
+
+    Returns:
+        int: Size of the compressed bytes, whether or not the sibling was kept.
+    """
+    compressed = compress(data, coding)
+    sibling = path.with_name(path.name + coding)
+    if len(compressed) > MAX_RATIO * len(data):
+        # A sibling left from an earlier, more compressible version would be served in place of the new file
+        sibling.unlink(missing_ok=True)
+    else:
+        temporary = sibling.with_name(sibling.name + '.tmp')
+        temporary.write_bytes(compressed)
+        os.replace(temporary, sibling)
+    return len(compressed)
+
+
+def _is_current(path: Path, entry: dict, digest: str) -> bool:
+    """
+    Check whether a file's manifest entry and siblings match its current content.
+
+    Args:
+        path (Path): The raw file.
+        entry (dict): Its entry in the manifest, empty if it has none.
+        digest (str): The SHA-256 of its current content.
+
+    Returns:
+        bool: True if every coding was recorded for this content and every kept sibling exists.
+    """
+    if entry.get('sha256') != digest or not all(coding in entry for coding in CODINGS):
+        return False
+    return all(path.with_name(path.name + coding).exists() for coding in CODINGS if coding not in entry['skipped'])
+
+
+def load_manifest() -> dict:
+    """
+    Load the manifest of precompressed files.
+
+    Returns:
+        dict: A mapping of relative path to the file's size, SHA-256, compressed size per coding
+              and the codings whose sibling was skipped for shrinking too little, empty if
+              nothing has been compressed yet.
+    """
+    if not MANIFEST_PATH.exists():
+        return {}
+    return json.loads(MANIFEST_PATH.read_text())
+
+
+def served_bytes(manifest: dict, coding: str) -> int:
+    """
+    Total the bytes a static host sends for every file in a manifest to a client accepting a coding.
+
+    Args:
+        manifest (dict): The manifest, as from `precompress`.
+        coding (str): '.br' or '.gz'.
+
+    Returns:
+        int: The sum of each file's sibling size where one was kept, and its raw size otherwise.
+    """
+    return sum(entry['bytes'] if coding in entry['skipped'] else entry[coding] for entry in manifest.values())
+
+
+def require_brotli() -> None:
+    """
+    Raise a RuntimeError unless the brotli package is installed.
+
+    `build.build` calls this before generating anything, so that a build without brotli stops
+    before it can leave a changed page next to the stale '.br' sibling of its previous version.
+    """
+    if brotli is None:
+        raise RuntimeError("The brotli package is required to write the '.br' siblings; install it with "
+                           "'pip install brotli'")
+
+
+def precompress(paths: Iterable[Path], jobs: int = None) -> Dict[str, dict]:
+    """
+    Write maximally compressed '.br' and '.gz' siblings of files in parallel and record them.
+
+    Every coding of every changed file is compressed as a separate task on a thread pool;
+    zlib and brotli release the GIL while compressing, and threads spare copying megabytes
+    of page data to worker processes. Files whose content hash matches the manifest and whose
+    siblings exist are skipped. The manifest is rewritten to list exactly the given files,
+    including those that get no sibling, so their sizes stay visible too.
+
+    Args:
+        paths (iterable): The files to compress. Files with other suffixes than
+            `COMPRESSIBLE_SUFFIXES` are left out.
+        jobs (int, optional): Number of threads. Defaults to the CPU count.
+
+    Returns:
+        dict: The updated manifest.
+    """
+    require_brotli()
+
+    previous = load_manifest()
+    paths = sorted({Path(path).resolve() for path in paths if Path(path).suffix in COMPRESSIBLE_SUFFIXES})
+
+    manifest = {}
+    stale = {}
+    for path in paths:
+        data = path.read_bytes()
+        key = _manifest_key(path)
+        digest = hashlib.sha256(data).hexdigest()
+        if _is_current(path, previous.get(key, {}), digest):
+            manifest[key] = previous[key]
+        else:
+            manifest[key] = {'bytes': len(data), 'sha256': digest, 'skipped': []}
+            stale[path] = data
+
+    tasks = [(path, coding) for path in stale for coding in CODINGS]
+    if tasks:
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            sizes = pool.map(lambda task: _write_sibling(*task, stale[task[0]]), tasks)
+            for (path, coding), size in zip(tasks, sizes):
+                entry = manifest[_manifest_key(path)]
+                entry[coding] = size
+                if size > MAX_RATIO * entry['bytes']:
+                    entry['skipped'].append(coding)
+
+    if manifest != previous:
+        MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+    return manifest
+
+
+# ****
+if __name__ == '__main__':
+    from build import load_manifest as load_build_manifest
+
+    # Compress every published file, then time a sequential pass over the same bytes and a run without
+    # changes; tests/test_precompress.py checks the siblings and the manifest
+    files = [PLOT_DIR / name for name, entry in load_build_manifest().items()]
+    files += [PLOT_DIR / asset for entry in load_build_manifest().values() for asset in entry['assets']]
+    MANIFEST_PATH.unlink(missing_ok=True)
+    start = time.perf_counter()
+    manifest = precompress(files)
+    parallel = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key, entry in manifest.items():
+        data = (PLOT_DIR / key).read_bytes()
+        for coding in CODINGS:
+            compress(data, coding)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    precompress(files)
+    unchanged = time.perf_counter() - start
+
+    raw = sum(entry['bytes'] for entry in manifest.values())
+    for coding in CODINGS:
+        kept = sum(coding not in entry['skipped'] for entry in manifest.values())
+        print(f"{coding}: {kept} of {len(manifest)} files get a sibling, "
+              f"{raw / 1e6:.2f} MB served as {served_bytes(manifest, coding) / 1e6:.2f} MB")
+    print(f'compressed in {parallel:.2f} s on {os.cpu_count()} threads ({sequential:.2f} s sequentially), '
+          f'unchanged files checked in {unchanged * 1e3:.0f} ms')
@@ -0,0 +1,228 @@
+import cProfile
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import numpy as np
+
+# Directory to write reports to; setting it enables profiling of every plotting entry point
+PROFILE_ENV = 'ROSE_PROFILE'
+
+# When set to a non-empty value, a cProfile/pstats dump is written next to each report
+PSTATS_ENV = 'ROSE_PROFILE_PSTATS'
+
+# Returned by `span` while profiling is off, so disabled instrumentation costs one global lookup
+_NULL_SPAN = nullcontext()
+
+# The profiler of the entry point currently being profiled, if any
+_active = None
+
+
+class Profiler:
+    """
+    Collects nested timing spans, array allocation sizes and figure trace counts.
+
+    Spans with the same name under the same parent are aggregated into one node, so the
+    report stays compact even when a span is entered once per rose or per stem.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the profiler with an empty root span.
+
+        Args:
+            name (str): Name of the profiled entry point, used for the root span.
+        """
+        self.root = self._node(name)
+        self.stack = [self.root]
+        self.traces = Counter()
+
+    @staticmethod
+    def _node(name: str) -> dict:
+        """
+        Create an empty span node.
+
+        Args:
+            name (str): The span's name.
+
+        Returns:
+            dict: The span node.
+        """
+        return {'name': name, 'calls': 0, 'seconds': 0.0, 'arrays': 0, 'array_bytes': 0, 'children': {}}
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Time a block of code as a child of the currently open span.
+
+        Args:
+            name (str): The span's name.
+        """
+        parent = self.stack[-1]
+        node = parent['children'].setdefault(name, self._node(name))
+        self.stack.append(node)
+        start = time.perf_counter()
+        try:
+            yield node
+        finally:
+            node['seconds'] += time.perf_counter() - start
+            node['calls'] += 1
+            self.stack.pop()
+
+    def record_arrays(self, *arrays: np.ndarray) -> None:
+        """
+        Add the count and size of freshly allocated arrays to the currently open span.
+
+        Args:
+            *arrays (np.ndarray): The arrays to record.
+        """
+        node = self.stack[-1]
+        node['arrays'] += len(arrays)
+        node['array_bytes'] += sum(np.asarray(array).nbytes for array in arrays)
+
+    def record_figure(self, fig) -> None:
+        """
+        Record how many traces of each type a figure holds.
+
+        Args:
+            fig (go.Figure): The figure to record.
+        """
+        self.traces = Counter(trace.type for trace in fig.data)
+
+    def report(self) -> dict:
+        """
+        Build the JSON-serializable report of everything recorded so far.
+
+        Returns:
+            dict: The span tree, with children as lists in first-entered order and the time spent
+                  outside any child span as `self_seconds`, and the trace counts.
+        """
+        def convert(node: dict) -> dict:
+            children = [convert(child) for child in node['children'].values()]
+            self_seconds = node['seconds'] - sum(child['seconds'] for child in children)
+            return {**node, 'self_seconds': max(self_seconds, 0.0), 'children': children}
+
+        return {'spans': convert(self.root), 'traces': sum(self.traces.values()), 'trace_types': dict(self.traces)}
+
+
+def span(name: str):
+    """
+    Time a block of code if profiling is active, otherwise do nothing.
+
+    Args:
+        name (str): The span's name.
+
+    Returns:
+        A context manager for the span.
+    """
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name)
+
+
+def record_arrays(*arrays: np.ndarray) -> None:
+    """
+    Record the size of freshly allocated arrays in the open span if profiling is active.
+
+    Args:
+        *arrays (np.ndarray): The arrays to record.
+    """
+    if _active is not None:
+        _active.record_arrays(*arrays)
+
+
+def record_figure(fig) -> None:
+    """
+    Record the trace counts of a figure if profiling is active.
+
+    Args:
+        fig (go.Figure): The figure to record.
+    """
+    if _active is not None:
+        _active.record_figure(fig)
+
+
+@contextmanager
+def session(name: str, report_dir: str = None):
+    """
+    Profile a plotting entry point and write its report when it finishes.
+
+    Profiling is enabled by passing `report_dir` or by setting the ROSE_PROFILE environment
+    variable to a directory. The report is written there as `<name>-profile.json`, plus a
+    `<name>.pstats` cProfile dump if ROSE_PROFILE_PSTATS is set. When an entry point calls
+    another one while a session is active, the inner call becomes a span of the outer one.
+
+    Args:
+        name (str): Name of the entry point, used for the root span and the file names.
+        report_dir (str, optional): Directory to write the report to. Falls back to ROSE_PROFILE.
+    """
+    global _active
+
+    report_dir = report_dir or os.environ.get(PROFILE_ENV)
+    if _active is not None:
+        with _active.span(name):
+            yield
+        return
+    if not report_dir:
+        yield
+        return
+
+    report_dir = Path(report_dir)
+    report_dir.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile() if os.environ.get(PSTATS_ENV) else None
+
+    _active = Profiler(name)
+    start = time.perf_counter()
+    try:
+        if profiler:
+            profiler.enable()
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(report_dir / f'{name}.pstats')
+
+        report = _active.report()
+        report['spans']['calls'] = 1
+        report['spans']['seconds'] = time.perf_counter() - start
+        report['spans']['self_seconds'] = report['spans']['seconds'] - sum(
+            child['seconds'] for child in report['spans']['children'])
+        _active = None
+        (report_dir / f'{name}-profile.json').write_text(json.dumps(report, indent=2) + '\n')
+
+
+def format_report(report: dict) -> str:
+    """
+    Format a profiling report as an indented per-stage timing table.
+
+    Args:
+        report (dict): A report as written by `session`.
+
+    Returns:
+        str: One line per span with its calls, total and self time, share of the root and array sizes.
+    """
+    total = report['spans']['seconds'] or 1.0
+    lines = []
+
+    def visit(node: dict, depth: int) -> None:
+        arrays = f"{node['array_bytes'] / 1e6:9.2f} MB in {node['arrays']} arrays" if node['arrays'] else ''
+        lines.append(f"{'  ' * depth + node['name']:<40} {node['calls']:6d} x {node['seconds'] * 1e3:10.2f} ms "
+                     f"(self {node['self_seconds'] * 1e3:9.2f} ms) {100 * node['seconds'] / total:6.1f} %  {arrays}")
+        for child in node['children']:
+            visit(child, depth + 1)
+
+    visit(report['spans'], 0)
+    lines.append(f"traces: {report['traces']} {report['trace_types']}")
+    return '\n'.join(lines)
+
+
+# ****
+if __name__ == '__main__':
+    import sys
+
+    # Print the per-stage timing table of one or more saved reports
+    for path in sys.argv[1:]:
+        print(format_report(json.loads(Path(path).read_text())))
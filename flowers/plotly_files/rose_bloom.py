@@ -0,0 +1,266 @@
+import json
+import os
+from typing import TYPE_CHECKING, TextIO, Union
+
+import numpy as np
+from geometry import HEAD_LIFT, PETAL_DECAY, PETAL_FREQUENCY
+from plot_export import encode_typed_array, figure_to_html
+from profiling import record_arrays, record_figure, session, span
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Petal opening of the first and last frame, as a fraction of the fully open rose head's petal angle
+BUD_OPENING, FULL_OPENING = 0.3, 1.0
+
+# Camera of the first frame; the turntable orbits it around the z axis at constant height
+START_EYE = (1.75, -2.0, 2.0)
+
+# Rebuilds the frames from the per-row petal angle terms, which are all a frame stores. The head's
+# coordinates are X = r cos(t), Y = r sin(t), Z = h + lift with r = u (x s + g s c) and
+# h = u (x c - g s^2), where u and t only vary per row, x and g only per column, and the bloom only
+# changes the petal angle's sine s and cosine c of every row.
+FRAMES_JS = """\
+(function (id, spec) {
+    function decode(array) {
+        var bytes = atob(array.bdata), buffer = new Uint8Array(bytes.length);
+        for (var i = 0; i < bytes.length; i++) {
+            buffer[i] = bytes.charCodeAt(i);
+        }
+        return new Float32Array(buffer.buffer);
+    }
+
+    var u = decode(spec.u), cosT = decode(spec.cos_t), sinT = decode(spec.sin_t);
+    var x = decode(spec.x), g = decode(spec.g), sines = decode(spec.sin_p), cosines = decode(spec.cos_p);
+    var rows = u.length, cols = x.length, frames = [];
+
+    spec.names.forEach(function (name, frame) {
+        var X = [], Y = [], Z = [];
+        for (var row = 0; row < rows; row++) {
+            var s = sines[frame * rows + row], c = cosines[frame * rows + row];
+            var xRow = new Float32Array(cols), yRow = new Float32Array(cols), zRow = new Float32Array(cols);
+            for (var col = 0; col < cols; col++) {
+                var r = u[row] * (x[col] * s + g[col] * s * c);
+                xRow[col] = r * cosT[row];
+                yRow[col] = r * sinT[row];
+                zRow[col] = u[row] * (x[col] * c - g[col] * s * s) + spec.lift;
+            }
+            X.push(xRow);
+            Y.push(yRow);
+            Z.push(zRow);
+        }
+        frames.push({name: name, traces: [0], data: [{x: X, y: Y, z: Z}],
+                     layout: {scene: {camera: {eye: spec.eyes[frame]}}}});
+    });
+    Plotly.addFrames(id, frames);
+})('{plot_id}', %s);
+"""
+
+
+def bloom_factors(openings: np.ndarray, n_radial: int = 25, n_theta: int = 1152) -> dict:
+    """
+    Factor the rose head geometry of every bloom stage into per-row and per-column terms.
+
+    Blooming scales the petal angle `p` of `geometry.rose_head_template`, which only depends
+    on the theta row. Every other term of the head either depends on the row alone or on the
+    radial column alone, so a stage is fully described by the sine and cosine of its petal
+    angle per row, and the static row and column terms are shared by all stages.
+
+    Args:
+        openings (np.ndarray): The petal opening of each stage, 1 being the fully open rose head.
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+
+    Returns:
+        dict: The static row terms 'u', 'cos_t' and 'sin_t' of shape (n_theta,), the static
+              column terms 'x' and 'g' of shape (n_radial,), and the per-stage row terms
+              'sin_p' and 'cos_p' of shape (len(openings), n_theta).
+    """
+    xr = np.linspace(0, 1, n_radial)
+    tr = np.linspace(0, 20 * np.pi, n_theta) + 4 * np.pi
+
+    # Same row terms as the template, evaluated once per row instead of once per point
+    p = (np.pi / 2) * np.exp(-tr / PETAL_DECAY)
+    u = 1 - (1 - np.mod(PETAL_FREQUENCY * tr, 2 * np.pi) / np.pi) ** 4 / 2 + np.sin(15 * tr) / 150
+
+    # All stages at once: one row of petal angles per stage
+    angles = np.asarray(openings, dtype=float)[:, None] * p
+    return {'u': u, 'cos_t': np.cos(tr), 'sin_t': np.sin(tr), 'x': xr, 'g': 2 * (xr**2 - xr)**2,
+            'sin_p': np.sin(angles), 'cos_p': np.cos(angles)}
+
+
+def bloom_frames(factors: dict) -> tuple:
+    """
+    Expand factored bloom stages into full rose head coordinates in one vectorized batch.
+
+    Args:
+        factors (dict): The factored stages, as returned by `bloom_factors`.
+
+    Returns:
+        tuple: A tuple of three numpy arrays (X, Y, Z) of shape (stages, n_theta, n_radial).
+    """
+    s, c = factors['sin_p'][:, :, None], factors['cos_p'][:, :, None]
+    u, x, g = factors['u'][:, None], factors['x'], factors['g']
+
+    r = u * (x * s + g * s * c)
+    X = r * factors['cos_t'][:, None]
+    Y = r * factors['sin_t'][:, None]
+    Z = u * (x * c - g * s * s) + HEAD_LIFT
+    record_arrays(X, Y, Z)
+    return X, Y, Z
+
+
+def turntable_eyes(num_frames: int, turns: float = 1.0) -> list:
+    """
+    Compute camera positions orbiting the rose head around the z axis.
+
+    Args:
+        num_frames (int): Number of camera positions.
+        turns (float): Number of full orbits over all positions.
+
+    Returns:
+        list: One camera eye dict with x, y and z per frame, starting at `START_EYE`.
+    """
+    radius = np.hypot(START_EYE[0], START_EYE[1])
+    angles = np.arctan2(START_EYE[1], START_EYE[0]) + 2 * np.pi * turns * np.arange(num_frames) / num_frames
+    return [dict(x=round(float(radius * np.cos(angle)), 6), y=round(float(radius * np.sin(angle)), 6), z=START_EYE[2])
+            for angle in angles]
+
+
+def build_rose_bloom_figure(num_frames: int = 60, turns: float = 1.0,
+                            n_radial: int = 25, n_theta: int = 1152) -> tuple:
+    """
+    Builds the figure of a rose head blooming on a turntable.
+
+    The figure shows the first stage, a closed bud, with a play button and a slider over all
+    frames. The frames themselves are not part of the figure: they are returned in factored
+    form and rebuilt in the browser by `FRAMES_JS`, which keeps the page close to the size of
+    the static rose head plot.
+
+    Args:
+        num_frames (int): Number of animation frames.
+        turns (float): Number of full camera orbits over the animation.
+        n_radial (int): Number of samples along the radial (petal width) axis.
+        n_theta (int): Number of samples along the theta (spiral) axis.
+
+    Returns:
+        tuple: The configured figure and the frame spec to pass to `FRAMES_JS`.
+    """
+    import plotly.graph_objects as go
+
+    with span('bloom factors'):
+        openings = np.linspace(BUD_OPENING, FULL_OPENING, num_frames)
+        factors = bloom_factors(openings, n_radial, n_theta)
+    with span('first frame'):
+        X, Y, Z = bloom_frames({**factors, 'sin_p': factors['sin_p'][:1], 'cos_p': factors['cos_p'][:1]})
+
+    names = [f'{opening:.3f}' for opening in openings]
+    eyes = turntable_eyes(num_frames, turns)
+    spec = {name: encode_typed_array(factors[name]) for name in factors}
+    spec.update(names=names, eyes=eyes, lift=HEAD_LIFT)
+
+    with span('layout'):
+        play = dict(frame=dict(duration=50, redraw=True), transition=dict(duration=0), fromcurrent=True)
+        steps = [dict(method='animate', label=name,
+                      args=[[name], dict(mode='immediate', frame=dict(duration=0, redraw=True),
+                                         transition=dict(duration=0))])
+                 for name in names]
+
+        fig = go.Figure(data=[dict(type='surface', x=X[0], y=Y[0], z=Z[0], colorscale='Reds', showscale=False)])
+        fig.update_layout(
+            title='3D Rose Bloom', autosize=True,
+            scene=dict(xaxis=dict(visible=False), yaxis=dict(visible=False), zaxis=dict(visible=False),
+                       aspectmode='cube',
+                       camera=dict(eye=eyes[0], up=dict(x=0, y=0, z=1), center=dict(x=0, y=0, z=0))),
+            margin=dict(l=0, r=0, b=0, t=30),
+            paper_bgcolor='black', plot_bgcolor='black', showlegend=False,
+            updatemenus=[dict(type='buttons', showactive=False, x=0, y=0, xanchor='left', yanchor='bottom',
+                              buttons=[dict(label='Play', method='animate', args=[None, play]),
+                                       dict(label='Pause', method='animate',
+                                            args=[[None], dict(mode='immediate', frame=dict(duration=0))])])],
+            sliders=[dict(steps=steps, x=0.15, len=0.85, y=0, yanchor='bottom',
+                          currentvalue=dict(prefix='opening ', font=dict(color='white')),
+                          font=dict(color='white'))]
+        )
+
+    return fig, spec
+
+
+def plot_rose_bloom(num_frames: int = 60, turns: float = 1.0, encoding: str = 'float32', div_id: str = None,
+                    profile: str = None, file: Union[str, os.PathLike, TextIO] = None) -> str:
+    """
+    Creates and returns the HTML of a rose head blooming while the camera orbits it.
+
+    Args:
+        num_frames (int): Number of animation frames.
+        turns (float): Number of full camera orbits over the animation.
+        encoding (str, optional): Encoding of the first frame's coordinates (see
+            `plot_export.figure_to_html`). The other frames are always stored as float32 row terms.
+        div_id (str, optional): Id of the plot's div. Plotly generates a random one if None, so pass
+            a fixed id for byte-identical output.
+        profile (str, optional): Directory to write a profiling report to (see `profiling.session`).
+        file (str or file object, optional): If given, the HTML is streamed to this path or text file
+            object (see `plot_export.write_html`) and None is returned.
+
+    Returns:
+        str: The HTML of the animation, or None if it was written to `file`.
+    """
+    with session('plot_rose_bloom', profile):
+        fig, spec = build_rose_bloom_figure(num_frames, turns)
+        record_figure(fig)
+        script = FRAMES_JS % json.dumps(spec, separators=(',', ':'))
+        return figure_to_html(fig, encoding, file, full_html=False, include_plotlyjs='cdn', div_id=div_id,
+                              post_script=script)
+
+
+# ****
+if __name__ == '__main__':
+    import shutil
+    import subprocess
+    import tempfile
+    from build import build
+    from geometry import rose_head_template
+    from rose_head import plot_rose_head
+
+    # The fully open stage is the static rose head
+    factors = bloom_factors(np.array([BUD_OPENING, FULL_OPENING]))
+    X, Y, Z = bloom_frames(factors)
+    error = max(np.abs(a[-1] - b).max() for a, b in zip((X, Y, Z), rose_head_template()))
+    print(f'open stage vs. rose_head_template: max error {error:.2e}')
+    assert error < 1e-12
+
+    # Rebuild the frames the way the page does and compare them with the NumPy batch
+    html = plot_rose_bloom(div_id='rose-bloom')
+    static = plot_rose_head('float32', div_id='rose-head')
+    print(f'60-frame bloom: {len(html) / 1e3:.0f} kB, static rose head: {len(static) / 1e3:.0f} kB '
+          f'({len(html) / len(static):.2f}x)')
+
+    # The frames are decoded by the page's own script, run under Node.js when it is installed
+    if shutil.which('node') is None:
+        print('node not found on PATH; skipping the check of the frames decoded in JavaScript')
+    else:
+        start = html.index('(function (id, spec)')
+        script = html[start:html.index('\n', html.index("})('rose-bloom', ", start))]
+        harness = """
+            var atob = function (s) { return Buffer.from(s, 'base64').toString('binary'); };
+            var Plotly = {addFrames: function (id, frames) {
+                var last = frames[frames.length - 1].data[0];
+                process.stdout.write(JSON.stringify({count: frames.length, name: frames[frames.length - 1].name,
+                    z: Array.from(last.z[100]), x: Array.from(last.x[700])}));
+            }};
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as handle:
+            handle.write(harness + script)
+        try:
+            result = json.loads(subprocess.run(['node', handle.name], capture_output=True, text=True,
+                                               check=True).stdout)
+        finally:
+            os.unlink(handle.name)
+
+        X, Y, Z = bloom_frames(bloom_factors(np.linspace(BUD_OPENING, FULL_OPENING, 60)))
+        error = max(np.abs(np.array(result['z']) - Z[-1, 100]).max(), np.abs(np.array(result['x']) - X[-1, 700]).max())
+        print(f"browser frames: {result['count']}, last '{result['name']}', max error vs. NumPy {error:.2e}")
+        assert result['count'] == 60 and error < 1e-5
+
+    # Regenerate the committed page through the build, so it keeps the build's parameters and manifest
+    build(['rose-bloom-plot.html'])
@@ -1,214 +1,19 @@
 import numpy as np
-import plotly.graph_objects as go
-import plotly.io as pio
-from typing import List, Tuple
+from decimate import decimate_figure
+from geometry import get_stem_top_center, wrap_surface
+from merged_mesh import merge_surfaces
+from plot_export import figure_to_html
+from profiling import record_figure, session, span
+from pathlib import Path
+from scene_graph import compile_spec, load_spec
+from traces import add_thorn_trace, create_rose, create_stem
+from typing import TYPE_CHECKING, List, Tuple, Union
 
-def meshgrid_transforms(x_offset: float = 0, y_offset: float = 0, z_offset: float = 0) -> tuple:
-    """
-    Calculate transformed meshgrid coordinates for 3D plotting.
-
-    This function creates a meshgrid using trigonometric and exponential transformations
-    to generate coordinates for a 3D visualization, specifically to plot a geometric
-    structure with interesting undulations and rotations that mimic a rose. Offsets 
-    can be applied to shift the entire structure along the x, y, and z axes.
-
-    Args:
-        x_offset (float): The offset to be added to all x-coordinates.
-        y_offset (float): The offset to be added to all y-coordinates.
-        z_offset (float): The offset to be added to all z-coordinates.
-
-    Returns:
-        tuple: A tuple of three numpy arrays (X, Y, Z), representing the x, y, and z
-               coordinates after applying the transformations and offsets.
-    """
-    # Create meshgrid with transformations on the theta range
-    xr, tr = np.meshgrid(np.linspace(0, 1, 25), np.linspace(0, 20 * np.pi, 1152) + 4 * np.pi)
- 
-    # Exponential decay function modulated by theta
-    p = (np.pi / 2) * np.exp(-tr / (8 * np.pi))
-    
-    # Small amplitude sin wave used to introduce finer oscillations
-    cr = np.sin(15 * tr) / 150
-    
-    # Modulation of amplitude with a decay and addition of fine oscillations
-    u = 1 - (1 - np.mod(3.6 * tr, 2 * np.pi) / np.pi) ** 4 / 2 + cr
-    
-    # Radial coordinate transformation influenced by the exponential function
-    yr = 2 * (xr**2 - xr)**2 * np.sin(p)
-    
-    # Calculating radial and height components based on the above transformations
-    rr = u * (xr * np.sin(p) + yr * np.cos(p))
-    hr = u * (xr * np.cos(p) - yr * np.sin(p))
-    
-    # Apply rotation and offset transformations to meshgrid
-    return rr * np.cos(tr) + x_offset, rr * np.sin(tr) + y_offset, hr + z_offset + 0.35
-
-
-def create_rose(fig: go.Figure, x_offset: float = 0, y_offset: float = 0, z_offset: float = 0, 
-                angle_x: float = 0, angle_y: float = 0, angle_z: float = 0) -> None:
-    """
-    Add a 3D rose shape to a given Plotly figure using specified transformations.
-
-    This function computes the meshgrid transformations to create the 3D coordinates for a rose,
-    applies rotation transformations based on the provided angles, and adds the resulting surface
-    to the given Plotly figure. The rose's position and orientation can be adjusted via offsets
-    and rotation angles.
-
-    Args:
-        fig (go.Figure): The Plotly figure to which the rose will be added.
-        x_offset (float): The offset to apply on the x-axis.
-        y_offset (float): The offset to apply on the y-axis.
-        z_offset (float): The offset to apply on the z-axis.
-        angle_x (float): The rotation angle around the x-axis in radians.
-        angle_y (float): The rotation angle around the y-axis in radians.
-        angle_z (float): The rotation angle around the z-axis in radians.
-    """
-    # Generate the 3D coordinates for the rose shape with the given offsets
-    X, Y, Z = meshgrid_transforms(x_offset, y_offset, z_offset)
-    
-    # Rotate the coordinates based on the specified angles
-    X, Y, Z = rotate_xyz(X, Y, Z, angle_x, angle_y, angle_z)
-    
-    # Add the computed surface to the Plotly figure with a red color scale
-    fig.add_trace(go.Surface(x=X, y=Y, z=Z, colorscale='Reds', showscale=False))
-
-
-def get_stem_top_center(height: float, x_offset: float, y_offset: float, curve_factor: float = 0.2,
-                        angle_x: float = 0, angle_y: float = 0, angle_z: float = 0) -> tuple:
-    """
-    Calculate the top center position of a stem after applying a curve and rotation. The curvature 
-    introduces a lateral displacement using sinusoidal functions that depend on the stem's height.
-
-    Args:
-        height (float): The height of the stem.
-        x_offset (float): The offset to apply on the x-axis.
-        y_offset (float): The offset to apply on the y-axis.
-        curve_factor (float): The factor that determines the magnitude of the curvature.
-        angle_x (float): The rotation angle around the x-axis in radians.
-        angle_y (float): The rotation angle around the y-axis in radians.
-        angle_z (float): The rotation angle around the z-axis in radians.
-
-    Returns:
-        tuple: A tuple containing the x, y, and z coordinates of the top center position after
-               applying the curvature, offsets, and rotations.
-    """
-    # Calculate initial top center position with applied curve but no rotation
-    z_top = height
-    x_top = curve_factor * np.sin(np.pi * z_top / height) + x_offset
-    y_top = curve_factor * np.cos(np.pi * z_top / height) + y_offset
-
-    # Apply rotation transformations to the calculated position
-    x_top, y_top, z_top = rotate_xyz(np.array([x_top]), np.array([y_top]), np.array([z_top]), angle_x, angle_y, angle_z)
-
-    return x_top[0], y_top[0], z_top[0]
-
-
-def rotate_xyz(X: np.ndarray, Y: np.ndarray, Z: np.ndarray, angle_x: float = 0, 
-               angle_y: float = 0, angle_z: float = 0) -> tuple:
-    """
-    Rotate a set of coordinates around the x, y, and z axes by given angles.
-
-    This function applies a sequence of rotation transformations to 3D coordinates.
-    Each rotation is performed around one of the principal axes (x, y, z), using the
-    right-hand rule. The order of rotations is first around x, then y, and finally z.
-
-    Args:
-        X (np.ndarray): The x-coordinates of the points to rotate.
-        Y (np.ndarray): The y-coordinates of the points to rotate.
-        Z (np.ndarray): The z-coordinates of the points to rotate.
-        angle_x (float): The rotation angle around the x-axis in radians.
-        angle_y (float): The rotation angle around the y-axis in radians.
-        angle_z (float): The rotation angle around the z-axis in radians.
-
-    Returns:
-        tuple: A tuple of numpy arrays (X, Y, Z), representing the coordinates after
-               the rotations have been applied.
-    """
-    # Rotation around the x-axis
-    Y_rot = Y * np.cos(angle_x) - Z * np.sin(angle_x)
-    Z_rot = Y * np.sin(angle_x) + Z * np.cos(angle_x)
-    Y, Z = Y_rot, Z_rot  # Update Y and Z after rotation around x-axis
-
-    # Rotation around the y-axis
-    X_rot = X * np.cos(angle_y) + Z * np.sin(angle_y)
-    Z_rot = -X * np.sin(angle_y) + Z * np.cos(angle_y)
-    X, Z = X_rot, Z_rot  # Update X and Z after rotation around y-axis
-
-    # Rotation around the z-axis
-    X_rot = X * np.cos(angle_z) - Y * np.sin(angle_z)
-    Y_rot = X * np.sin(angle_z) + Y * np.cos(angle_z)
-    X, Y = X_rot, Y_rot  # Update X and Y after rotation around z-axis
-
-    return X, Y, Z
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
 
-def create_stem(fig: go.Figure, height: float = 1, radius: float = 0.05, x_offset: float = 0, y_offset: float = 0, 
-                z_offset: float = 0, curve_factor: float = 0.2, thorn_frequency: int = 5, angle_x: float = 0, 
-                angle_y: float = 0, angle_z: float = 0) -> None:
-    """
-    Adds a 3D stem with optional thorns to a Plotly figure.
-
-    This function creates a 3D cylindrical stem with curvature and thorns based on the provided parameters.
-    It supports transformations such as rotation and translation (offsets), and allows customization of
-    the stem's appearance through parameters such as height, radius, and curvature. The stem and thorns
-    are then added to the provided Plotly figure object.
-
-    Args:
-        fig (go.Figure): The Plotly figure to which the stem will be added.
-        height (float): The height of the stem.
-        radius (float): The base radius of the stem.
-        x_offset (float): Horizontal offset on the x-axis.
-        y_offset (float): Horizontal offset on the y-axis.
-        z_offset (float): Vertical offset along the z-axis.
-        curve_factor (float): Factor that determines the magnitude of the stem's curvature.
-        thorn_frequency (int): Frequency of thorns per unit height of the stem.
-        angle_x (float): Rotation angle around the x-axis in radians.
-        angle_y (float): Rotation angle around the y-axis in radians.
-        angle_z (float): Rotation angle around the z-axis in radians.
-
-    """
-    # Create meshgrid for the stem geometry
-    theta = np.linspace(0, 2 * np.pi, 30)
-    z = np.linspace(0, height, 50)
-    theta, z = np.meshgrid(theta, z)
-    
-    # Calculate the curvature components of the stem
-    x_curve = curve_factor * np.sin(np.pi * z / height)
-    y_curve = curve_factor * np.cos(np.pi * z / height)
-
-    # Tapering effect for the stem's radius from base to top
-    tapering = 1 - (z / height) * 0.3
-    x = (radius * tapering * np.cos(theta)) + x_curve + x_offset
-    y = (radius * tapering * np.sin(theta)) + y_curve + y_offset
-    z = z + z_offset
-
-    # Apply rotational transformations
-    x, y, z = rotate_xyz(x, y, z, angle_x, angle_y, angle_z)
-
-    # Add the stem's surface to the figure
-    fig.add_trace(go.Surface(x=x, y=y, z=z, colorscale='Greens', showscale=False))
-    
-    # Generate thorns along the stem
-    thorn_length = radius * 1.5
-    num_thorns = int(height * thorn_frequency)
-    for i in range(num_thorns):
-        z_pos = (i / num_thorns) * height
-        theta_pos = np.random.rand() * 2 * np.pi
-        z_index = int(z_pos / height * 49)
-        x_base = x_curve[z_index, 0] + x_offset
-        y_base = y_curve[z_index, 0] + y_offset
-        x_thorn = x_base + np.array([0, thorn_length * np.cos(theta_pos)])
-        y_thorn = y_base + np.array([0, thorn_length * np.sin(theta_pos)])
-        z_thorn = np.array([z_pos + z_offset, z_pos + z_offset - thorn_length / 4])
-        
-        # Apply rotational transformations to thorns
-        x_thorn, y_thorn, z_thorn = rotate_xyz(x_thorn, y_thorn, z_thorn, angle_x, angle_y, angle_z)
-
-        # Add thorns as lines to the figure
-        fig.add_trace(go.Scatter3d(x=x_thorn, y=y_thorn, z=z_thorn, mode='lines', line=dict(color='Green', width=4)))
-
-
-def plot_roses_and_stems(stem_specs: List[Tuple[float, float, float, float, float]]) -> None:
+def plot_roses_and_stems(stem_specs: List[Tuple[float, float, float, float, float]], profile: str = None) -> None:
     """
     Plot a 3D visualization of roses and stems based on specified configurations.
 
@@ -220,34 +25,44 @@ def plot_roses_and_stems(stem_specs: List[Tuple[float, float, float, float, floa
     Args:
         stem_specs (list of tuple): A list of tuples, where each tuple contains parameters
             for a stem as (height, radius, x_offset, y_offset, z_offset).
+        profile (str, optional): Directory to write a profiling report to (see `profiling.session`).
+            Profiling is also enabled by the ROSE_PROFILE environment variable.
     """
-    
-    fig = go.Figure()  # Initialize the Plotly figure
+    import plotly.graph_objects as go
+
+    with session('plot_roses_and_stems', profile):
+        fig = go.Figure()  # Initialize the Plotly figure
+        thorns = []  # Thorn segments of every stem, drawn together as one trace
 
-    # Iterate over each specification to plot the stems and corresponding roses
-    for spec in stem_specs:
-        height, radius, x_offset, y_offset, z_offset = spec
-        # Create stem with a specified offset to account for the base height
-        create_stem(fig, height, radius, x_offset, y_offset, z_offset + 1.5)
+        # Iterate over each specification to plot the stems and corresponding roses
+        for spec in stem_specs:
+            height, radius, x_offset, y_offset, z_offset = spec
+            # Create stem with a specified offset to account for the base height
+            thorns.append(create_stem(fig, height, radius, x_offset, y_offset, z_offset + 1.5, add_thorns=False))
         
-        # Calculate the top center position of the stem for placing the rose
-        x_top, y_top, z_top = get_stem_top_center(height, x_offset, y_offset)
+            # Calculate the top center position of the stem for placing the rose
+            x_top, y_top, z_top = get_stem_top_center(height, x_offset, y_offset)
         
-        # Place the rose at the calculated position with the correct z offset
-        create_rose(fig, x_top, y_top, z_top + z_offset + 1.5)
-
-    # Configure the layout of the figure to hide axis lines and adjust margins
-    fig.update_layout(title='3D Roses and Stems Plot', autosize=True,
-                      scene=dict(xaxis=dict(visible=False),
-                                 yaxis=dict(visible=False),
-                                 zaxis=dict(visible=False)),
-                      margin=dict(l=0, r=0, b=0, t=30))
-    fig.show()  # Display the figure
+            # Place the rose at the calculated position with the correct z offset
+            create_rose(fig, x_top, y_top, z_top + z_offset + 1.5)
+
+        if thorns:
+            add_thorn_trace(fig, np.concatenate(thorns))
+
+        # Configure the layout of the figure to hide axis lines and adjust margins
+        fig.update_layout(title='3D Roses and Stems Plot', autosize=True,
+                          scene=dict(xaxis=dict(visible=False),
+                                     yaxis=dict(visible=False),
+                                     zaxis=dict(visible=False)),
+                          margin=dict(l=0, r=0, b=0, t=30))
+        record_figure(fig)
+        with span('show'):
+            fig.show()  # Display the figure
 
     
-def create_asymmetrical_wrap(fig: go.Figure, base_radius: float = 0.05, top_radius: float = 0.8, height: float = 1.2, 
+def create_asymmetrical_wrap(fig: 'go.Figure', base_radius: float = 0.05, top_radius: float = 0.8, height: float = 1.2, 
                              x_offset: float = 0, y_offset: float = 0, z_offset: float = 0, color: str = 'tan', 
-                             angular_adjustments: np.ndarray = None) -> None:
+                             angular_adjustments: np.ndarray = None, dtype: np.dtype = np.float64) -> None:
     """
     Adds an asymmetrical wrap to a Plotly figure with customizable visual adjustments.
 
@@ -266,52 +81,52 @@ def create_asymmetrical_wrap(fig: go.Figure, base_radius: float = 0.05, top_radi
         color (str): Color of the wrap.
         angular_adjustments (np.ndarray, optional): An array of values to adjust the radius at various angles.
             If None, no angular adjustments are applied.
+        dtype (np.dtype): Floating point type of the wrap's coordinates.
     """
-    # Define angles and vertical divisions for the wrap
-    theta = np.linspace(0, 2 * np.pi, 60)
-    z = np.linspace(0, height, 20)
-    theta, z = np.meshgrid(theta, z)
-
-    # Handle default case where no angular adjustments are specified
-    if angular_adjustments is None:
-        angular_adjustments = np.zeros_like(theta[0, :])  # Default to no adjustments
-
-    # Calculate adjusted radii based on angular position
-    top_radii = top_radius + 0.4 * np.sin(3 * theta[0, :] + angular_adjustments)
+    import plotly.graph_objects as go
 
-    # Interpolate between base and adjusted top radii
-    r = np.linspace(base_radius, 1, z.shape[0])[:, None] * top_radii
-
-    # Calculate coordinates in the xy-plane
-    x = r * np.cos(theta) + x_offset
-    y = r * np.sin(theta) + y_offset
-
-    # Adjust z-values to add vertical extrusions for asymmetry
-    z_extrusions = 0.5 * np.sin(2 * theta + angular_adjustments)  # Modulate z-values based on angle
-    z = z + z_extrusions * (z / height)  # Increase modulation towards the top
-    z += z_offset  # Apply vertical offset
+    x, y, z = wrap_surface(base_radius, top_radius, height, x_offset, y_offset, z_offset, angular_adjustments, dtype)
 
     # Add the computed geometry to the figure as a surface plot
-    fig.add_trace(go.Surface(x=x, y=y, z=z, opacity=0.95, colorscale=[[0, color], [1, color]], showscale=False))
+    with span('Surface trace'):
+        fig.add_trace(go.Surface(x=x, y=y, z=z, opacity=0.95, colorscale=[[0, color], [1, color]], showscale=False))
 
 
-def plot_rose_bouquet() -> str:
+def build_rose_bouquet_figure(seed: int = None, dtype: np.dtype = np.float64, head: tuple = None,
+                              curve_factor: float = 0.2, wrap_adjustments: np.ndarray = None,
+                              colorscale: str = 'Reds') -> 'go.Figure':
     """
-    Creates a 3D visualization of a rose bouquet with an artistic wrap and returns the HTML representation.
+    Builds the Plotly figure for a 3D visualization of a rose bouquet with an artistic wrap.
 
     This function constructs a 3D visualization of a central rose surrounded by multiple tilted roses,
-    set against an artistically wrapped background. The scene is built in a Plotly figure, which is then
-    converted to HTML for easy embedding or display in web environments.
+    set against an artistically wrapped background. The thorns of every stem are merged into a single
+    line trace.
+
+    Args:
+        seed (int, optional): Seed for the thorn angles. If None, the thorns differ on every call.
+        dtype (np.dtype): Floating point type of every coordinate. float32 halves the geometry's
+            memory and the work of encoding it as float32 typed arrays.
+        head (tuple, optional): The (X, Y, Z) rose head template placed on every stem, such as a
+            variant from `geometry.rose_head_template` with other petal parameters. The default
+            head if None.
+        curve_factor (float): Magnitude of every stem's curvature.
+        wrap_adjustments (np.ndarray, optional): The 60 angular adjustments of the wrap's rim (see
+            `create_asymmetrical_wrap`). A cosine of amplitude pi if None.
+        colorscale (str): The Plotly colorscale of the rose heads.
 
     Returns:
-        str: An HTML string representing the 3D plot.
+        go.Figure: The configured figure containing the stems, roses and wrap.
     """
+    import plotly.graph_objects as go
+
     fig = go.Figure() # Initialize the Plotly figure
+    rng = np.random.default_rng(seed)  # Shared generator for the thorn angles of every stem
 
     # Create the central rose with a specific height and no slant
-    create_stem(fig, height=3, radius=0.05, x_offset=0, y_offset=0, z_offset=0)
-    x_top, y_top, z_top = get_stem_top_center(3, 0, 0)  # Calculate the top center for placing the rose
-    create_rose(fig, x_top, y_top, z_top - 0.4)  # Add the rose to the figure
+    thorns = [create_stem(fig, height=3, radius=0.05, x_offset=0, y_offset=0, z_offset=0, curve_factor=curve_factor,
+                          rng=rng, add_thorns=False, dtype=dtype)]
+    x_top, y_top, z_top = get_stem_top_center(3, 0, 0, curve_factor)  # Calculate the top center for placing the rose
+    create_rose(fig, x_top, y_top, z_top - 0.4, dtype=dtype, colorscale=colorscale, template=head)  # Add the rose to the figure
 
     # Configure and place additional roses in a circular arrangement
     num_around = 5
@@ -327,63 +142,121 @@ def plot_rose_bouquet() -> str:
         angle_z = angle - np.pi / 2  # Adjust so that stems radiate outward
 
         # Create stems that originate from the same point but bend towards the top positions
-        create_stem(fig, height=distance, radius=0.05, x_offset=central_point[0], y_offset=central_point[1], z_offset=central_point[2],
-                    angle_x=theta, angle_y=0, angle_z=angle_z)
+        thorns.append(create_stem(fig, height=distance, radius=0.05, x_offset=central_point[0], y_offset=central_point[1],
+                                  z_offset=central_point[2], curve_factor=curve_factor, angle_x=theta, angle_y=0,
+                                  angle_z=angle_z, rng=rng, add_thorns=False, dtype=dtype))
 
         # Calculate exact top center based on the rotation and position
-        x_top, y_top, z_top = get_stem_top_center(distance, central_point[0], central_point[1], angle_x=theta, angle_y=0, angle_z=angle_z)
+        x_top, y_top, z_top = get_stem_top_center(distance, central_point[0], central_point[1], curve_factor,
+                                                  angle_x=theta, angle_y=0, angle_z=angle_z)
 
         # Attach roses at the calculated top positions
-        create_rose(fig, x_offset=x_top, y_offset=y_top, z_offset=z_top-0.4)
+        create_rose(fig, x_offset=x_top, y_offset=y_top, z_offset=z_top-0.4, dtype=dtype, colorscale=colorscale,
+                    template=head)
+
+    # Draw the thorns of every stem as one line trace
+    add_thorn_trace(fig, np.concatenate(thorns))
 
     # Define angular adjustments for the wrap
-    angular_adjustments = np.pi * np.cos(np.linspace(0, 2 * np.pi, 60))  # Modify this for desired asymmetry
+    if wrap_adjustments is None:
+        wrap_adjustments = np.pi * np.cos(np.linspace(0, 2 * np.pi, 60))  # Modify this for desired asymmetry
 
     # Create an asymmetrical, artistic wrap around the bouquet
-    create_asymmetrical_wrap(fig, base_radius=0.15, top_radius=2.15, height=2.3, x_offset=0, y_offset=0, z_offset=0.6, color='pink', angular_adjustments=angular_adjustments)
-
-    # Update layout and show plot
-    fig.update_layout(title={
-                                'text': '3D Rose Bouquet with Bouquet Wrap',
-                                "font": {
-                                    "color": "#333333"
-                                }, 
-                            },
-                      autosize=True,
-                      scene=dict(xaxis=dict(visible=False),
-                                 yaxis=dict(visible=False),
-                                 zaxis=dict(visible=False)),
-                      margin=dict(l=0, r=0, b=0, t=30))
-
-    fig.update_layout(
-        paper_bgcolor='black',
-        plot_bgcolor='black'
-    )
-
-    fig.update_layout(
-        scene=dict(
-            camera=dict(
-                eye=dict(x=-0.35, y=0.95, z=1.45),  # Changes where the camera is looking from
-                up=dict(x=0, y=0, z=1),         # Sets the z-axis as up
-                center=dict(x=0, y=0, z=0)      # Center of the scene
+    create_asymmetrical_wrap(fig, base_radius=0.15, top_radius=2.15, height=2.3, x_offset=0, y_offset=0, z_offset=0.6, color='pink', angular_adjustments=wrap_adjustments, dtype=dtype)
+
+    with span('layout'):
+        # Update layout and show plot
+        fig.update_layout(title={
+                                    'text': '3D Rose Bouquet with Bouquet Wrap',
+                                    "font": {
+                                        "color": "#333333"
+                                    }, 
+                                },
+                          autosize=True,
+                          scene=dict(xaxis=dict(visible=False),
+                                     yaxis=dict(visible=False),
+                                     zaxis=dict(visible=False)),
+                          margin=dict(l=0, r=0, b=0, t=30))
+
+        fig.update_layout(
+            paper_bgcolor='black',
+            plot_bgcolor='black'
+        )
+
+        fig.update_layout(
+            scene=dict(
+                camera=dict(
+                    eye=dict(x=-0.35, y=0.95, z=1.45),  # Changes where the camera is looking from
+                    up=dict(x=0, y=0, z=1),         # Sets the z-axis as up
+                    center=dict(x=0, y=0, z=0)      # Center of the scene
+                )
             )
+        ) 
+
+        fig.update_layout(
+            showlegend=False  
         )
-    ) 
 
-    fig.update_layout(
-        showlegend=False  
-    )
+    return fig
 
-    # Return HTML div as a string instead of showing the figure
-    # fig.show()
-    return pio.to_html(fig, full_html=False, include_plotlyjs='cdn')
+
+def plot_rose_bouquet(encoding: str = None, merged_mesh: bool = False, seed: int = None,
+                      div_id: str = None, profile: str = None, file=None, max_vertices: int = None,
+                      dtype: np.dtype = np.float64, spec: Union[dict, str, Path] = None) -> str:
+    """
+    Creates a 3D visualization of a rose bouquet with an artistic wrap and returns the HTML representation.
+
+    The scene is built by `build_rose_bouquet_figure` and converted to HTML for easy embedding or
+    display in web environments.
+
+    Args:
+        encoding (str, optional): None to write coordinates as decimal JSON, 'float32' / 'int16'
+            to embed them as base64 typed arrays (see `plot_export.encode_figure`), or 'shared' to
+            load them from browser-cacheable files next to `file` (see `plot_export.write_html`).
+        merged_mesh (bool): Whether to merge the roses, stems and wrap into per-vertex colored
+            Mesh3d traces (see `merged_mesh.merge_surfaces`) instead of one Surface each.
+        seed (int, optional): Seed for the thorn angles. If None, the thorns differ on every call.
+        div_id (str, optional): Id of the plot's div. Plotly generates a random one if None, so pass
+            a fixed id together with `seed` for byte-identical output.
+        profile (str, optional): Directory to write a profiling report to (see `profiling.session`).
+            Profiling is also enabled by the ROSE_PROFILE environment variable.
+        file (str or file object, optional): If given, the HTML is streamed to this path or text file
+            object one trace at a time (see `plot_export.write_html`) and None is returned.
+        max_vertices (int, optional): If given, every rose head, stem and wrap is decimated to at
+            most this many vertices (see `decimate.decimate_figure`), e.g. 5000 for large bouquets.
+        dtype (np.dtype): Floating point type of the geometry (see `build_rose_bouquet_figure`).
+        spec (dict, str or Path, optional): A bouquet spec, or a TOML or JSON file holding one, to
+            draw instead of the built-in bouquet (see `scene_graph.expand_spec`). A given `seed`
+            and a `dtype` other than float64 replace the spec's own.
+
+    Returns:
+        str: An HTML string representing the 3D plot.
+    """
+    if spec is not None:
+        spec = dict(spec) if isinstance(spec, dict) else load_spec(spec)
+        if seed is not None:
+            spec['seed'] = seed
+        if np.dtype(dtype) != np.float64:
+            spec['dtype'] = np.dtype(dtype).name
+
+    with session('plot_rose_bouquet', profile):
+        with span('build figure'):
+            fig = build_rose_bouquet_figure(seed, dtype) if spec is None else compile_spec(spec).figure()
+        if max_vertices is not None:
+            with span('decimate'):
+                fig, _ = decimate_figure(fig, max_vertices=max_vertices)
+        if merged_mesh:
+            with span('merge_surfaces'):
+                fig = merge_surfaces(fig)
+        record_figure(fig)
+
+        # Return HTML div as a string instead of showing the figure
+        return figure_to_html(fig, encoding, file, full_html=False, include_plotlyjs='cdn', div_id=div_id)
 
 
 # ****
 if __name__ == '__main__':
-    # Plot the combined 3D rose bouquet with artistic wrap
-    plot_html = plot_rose_bouquet()
+    from build import build
 
-    # Save the plot to a file
-    with open('rose-bouquet-plot.html', 'w') as f:
-        f.write(plot_html)
+    # Regenerate the committed page through the build, so it keeps the build's parameters and manifest
+    build(['rose-bouquet-plot.html'])
@@ -0,0 +1,392 @@
+import json
+import time
+import tomllib
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Union
+
+import numpy as np
+from geometry import (PETAL_DECAY, PETAL_FREQUENCY, generate_thorns, get_stem_top_center, meshgrid_transforms,
+                      rose_head_template, stem_surface, thorn_lines, wrap_surface)
+from profiling import span
+from transforms import affine_matrix, apply_affine
+
+# Plotly is only imported once a figure is assembled
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# The spec of the bouquet `rose_bouquet.build_rose_bouquet_figure` draws
+DEFAULT_SPEC = Path(__file__).resolve().parent / 'bouquet.toml'
+
+# Parameters of every node kind with their defaults; a spec's [defaults] tables override them
+NODE_DEFAULTS = {
+    'stem': {'height': 3.0, 'radius': 0.05, 'x_offset': 0.0, 'y_offset': 0.0, 'curve_factor': 0.2,
+             'angle_x': 0.0, 'angle_y': 0.0, 'angle_z': 0.0},
+    'head': {'z_offset': -0.4, 'petal_frequency': PETAL_FREQUENCY, 'decay': PETAL_DECAY, 'colorscale': 'Reds'},
+    'thorns': {'frequency': 5, 'seed': 0},
+    'wrap': {'base_radius': 0.15, 'top_radius': 2.15, 'height': 2.3, 'x_offset': 0.0, 'y_offset': 0.0,
+             'z_offset': 0.6, 'amplitude': np.pi, 'color': 'pink', 'opacity': 0.95},
+}
+
+# Parameters that only restyle a node's trace, so changing them never recomputes its geometry
+STYLE_PARAMETERS = {'colorscale', 'color', 'opacity'}
+
+# Keys of a ring of stems that are not stem parameters
+RING_PARAMETERS = {'id', 'count', 'distance', 'height', 'turns', 'head', 'thorns'}
+
+
+class Node(NamedTuple):
+    """One piece of a bouquet: a stem, the head or thorns on a stem, or the wrap."""
+    id: str  # Unique name, such as 'center', 'ring-3' or 'ring-3/head'
+    kind: str  # A key of `NODE_DEFAULTS`
+    parent: str  # Id of the stem a head or thorns sit on, None for stems and the wrap
+    params: dict  # Every parameter of the kind, with the spec's values filled in
+
+
+def load_spec(path: Union[str, Path] = DEFAULT_SPEC) -> dict:
+    """
+    Read a bouquet spec from a TOML or JSON file.
+
+    Args:
+        path (str or Path): The spec file, read as TOML unless it ends in '.json'.
+
+    Returns:
+        dict: The spec.
+    """
+    path = Path(path)
+    with open(path, 'rb') as f:
+        return json.load(f) if path.suffix == '.json' else tomllib.load(f)
+
+
+def _node_params(kind: str, defaults: dict, values: dict, where: str) -> dict:
+    """
+    Fill in the parameters of one node and reject any its kind does not have.
+
+    Args:
+        kind (str): The node's kind.
+        defaults (dict): The spec's [defaults] tables.
+        values (dict): The parameters given for this node.
+        where (str): The node's id, for error messages.
+
+    Returns:
+        dict: Every parameter of the kind.
+    """
+    unknown = set(values) - set(NODE_DEFAULTS[kind])
+    if unknown:
+        raise ValueError(f"unknown {kind} parameters for {where!r}: {', '.join(sorted(unknown))}; "
+                         f"expected some of {', '.join(NODE_DEFAULTS[kind])}")
+    return {**NODE_DEFAULTS[kind], **defaults.get(kind, {}), **values}
+
+
+def expand_spec(spec: dict) -> List[Node]:
+    """
+    Expand a bouquet spec into its nodes.
+
+    A spec has explicit [[stems]] and [[rings]] of stems that radiate from the base and tilt
+    outwards, as `build_rose_bouquet_figure` places its outer roses, plus an optional [wrap].
+    Every stem carries a head and thorns unless its `head` or `thorns` is false, and an inline
+    table there overrides their parameters. Thorns draw their angles from a generator seeded
+    by the spec's seed and their stem's id, so editing one stem never reshuffles another's.
+
+    Args:
+        spec (dict): The spec, as from `load_spec`.
+
+    Returns:
+        list: The nodes, every stem directly followed by its head and thorns, and the wrap last.
+    """
+    defaults = spec.get('defaults', {})
+    seed = spec.get('seed', 0)
+
+    stems = [dict(stem) for stem in spec.get('stems', [])]
+    for ring in spec.get('rings', []):
+        count, distance, height = ring['count'], ring['distance'], ring['height']
+        angles = np.linspace(0, 2 * np.pi * ring.get('turns', 1), count, endpoint=False)
+        overrides = {key: value for key, value in ring.items() if key not in RING_PARAMETERS}
+        for index, angle in enumerate(angles):
+            # Stems start at the base and tilt outwards, with slightly less slant than their rose's angle
+            stems.append({**overrides, 'id': f"{ring['id']}-{index}", 'height': float(np.sqrt(distance**2 + height**2)),
+                          'angle_x': float(np.arctan(distance / (height + 0.4))), 'angle_z': float(angle - np.pi / 2),
+                          'head': ring.get('head', {}), 'thorns': ring.get('thorns', {})})
+
+    nodes = []
+    for stem in stems:
+        stem_id = stem.pop('id')
+        head, thorns = stem.pop('head', {}), stem.pop('thorns', {})
+        nodes.append(Node(stem_id, 'stem', None, _node_params('stem', defaults, stem, stem_id)))
+        if head is not False:
+            nodes.append(Node(f'{stem_id}/head', 'head', stem_id,
+                              _node_params('head', defaults, head or {}, f'{stem_id}/head')))
+        if thorns is not False:
+            thorns = {'seed': zlib.crc32(f'{seed}/{stem_id}'.encode()), **(thorns or {})}
+            nodes.append(Node(f'{stem_id}/thorns', 'thorns', stem_id,
+                              _node_params('thorns', defaults, thorns, f'{stem_id}/thorns')))
+    if 'wrap' in spec:
+        nodes.append(Node('wrap', 'wrap', None, _node_params('wrap', defaults, spec['wrap'], 'wrap')))
+
+    ids = [node.id for node in nodes]
+    duplicates = sorted({node_id for node_id in ids if ids.count(node_id) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate node ids: {', '.join(duplicates)}")
+    return nodes
+
+
+class SceneGraph:
+    """
+    A bouquet compiled from a spec, which recomputes only the nodes an edit affects.
+
+    Every node's geometry is cached under a key of its kind, its geometry parameters and,
+    for heads and thorns, what they take from their stem: a head only the stem's top center,
+    thorns all of the stem's parameters. An edit changes the keys of the edited node and of
+    the children it moves, and only those are computed again. Nodes with equal keys share
+    one cached buffer, and every head with the same petal parameters places the same
+    memoized `rose_head_template`. `figure` patches only the traces whose nodes changed.
+    """
+
+    def __init__(self, spec: dict):
+        self.title = spec.get('title', '3D Rose Bouquet')
+        self.camera = spec.get('camera')
+        self.dtype = np.dtype(spec.get('dtype', 'float64'))
+        self.nodes = {node.id: node for node in expand_spec(spec)}
+        self.cache = {}
+        self.keys = {}
+        self.computed = []
+        self._fig = None
+        self._drawn = {}
+
+    def update(self, node_id: str, **params) -> None:
+        """
+        Change parameters of one node; the geometry is recomputed by the next `evaluate`.
+
+        Args:
+            node_id (str): Id of the node, such as 'ring-3' or 'ring-3/head'.
+            **params: New values of some of the node's parameters.
+        """
+        node = self.nodes[node_id]
+        unknown = set(params) - set(node.params)
+        if unknown:
+            raise ValueError(f"unknown {node.kind} parameters for {node_id!r}: {', '.join(sorted(unknown))}")
+        self.nodes[node_id] = node._replace(params={**node.params, **params})
+
+    def _key(self, node: Node) -> tuple:
+        """
+        Compute the cache key of a node's geometry from its inputs and its parent's transform.
+
+        Args:
+            node (Node): A node whose parent already has a key.
+
+        Returns:
+            tuple: A hashable key that changes whenever the node's geometry would.
+        """
+        own = tuple(sorted((name, value) for name, value in node.params.items() if name not in STYLE_PARAMETERS))
+        if node.kind == 'head':
+            return node.kind, own, self.cache[self.keys[node.parent]]['top']
+        if node.kind == 'thorns':
+            return node.kind, own, self.keys[node.parent]
+        return node.kind, own
+
+    def _compute(self, node: Node) -> dict:
+        """
+        Compute the geometry of one node.
+
+        Args:
+            node (Node): The node.
+
+        Returns:
+            dict: The x, y and z arrays of a surface, the (N, 2, 3) points of thorns, and for
+                  stems also the top center their head is placed on.
+        """
+        params = node.params
+        if node.kind == 'stem':
+            angles = params['angle_x'], params['angle_y'], params['angle_z']
+            # Thorns are nodes of their own, so the stem is built without any
+            x, y, z, _ = stem_surface(params['height'], params['radius'], params['x_offset'], params['y_offset'], 0,
+                                      params['curve_factor'], 0, *angles, dtype=self.dtype)
+            top = get_stem_top_center(params['height'], params['x_offset'], params['y_offset'], params['curve_factor'],
+                                      *angles)
+            return {'x': x, 'y': y, 'z': z, 'top': tuple(float(value) for value in top)}
+
+        if node.kind == 'head':
+            template = rose_head_template(dtype=self.dtype, petal_frequency=params['petal_frequency'],
+                                          decay=params['decay'])
+            x_top, y_top, z_top = self.cache[self.keys[node.parent]]['top']
+            x, y, z = meshgrid_transforms(x_top, y_top, z_top + params['z_offset'], dtype=self.dtype, template=template)
+            return {'x': x, 'y': y, 'z': z}
+
+        if node.kind == 'thorns':
+            stem = self.nodes[node.parent].params
+            points = generate_thorns(stem['height'], stem['radius'], stem['x_offset'], stem['y_offset'], 0,
+                                     stem['curve_factor'], params['frequency'], np.random.default_rng(params['seed']),
+                                     self.dtype)
+            rotation = affine_matrix(stem['angle_x'], stem['angle_y'], stem['angle_z'])
+            return {'points': apply_affine(rotation, points.reshape(-1, 3)).reshape(points.shape)}
+
+        adjustments = params['amplitude'] * np.cos(np.linspace(0, 2 * np.pi, 60))
+        x, y, z = wrap_surface(params['base_radius'], params['top_radius'], params['height'], params['x_offset'],
+                               params['y_offset'], params['z_offset'], adjustments, self.dtype)
+        return {'x': x, 'y': y, 'z': z}
+
+    def evaluate(self) -> List[str]:
+        """
+        Bring the geometry of every node up to date, computing only what changed.
+
+        Cached geometry no node uses anymore is dropped.
+
+        Returns:
+            list: Ids of the nodes whose geometry was computed.
+        """
+        self.computed = []
+        # Stems come before their heads and thorns in `expand_spec`, so parents always have a key here
+        for node in self.nodes.values():
+            key = self._key(node)
+            if key not in self.cache:
+                with span(f'{node.kind} node'):
+                    self.cache[key] = self._compute(node)
+                self.computed.append(node.id)
+            self.keys[node.id] = key
+
+        used = set(self.keys.values())
+        self.cache = {key: geometry for key, geometry in self.cache.items() if key in used}
+        return self.computed
+
+    def geometry(self, node_id: str) -> dict:
+        """
+        Look up the cached geometry of a node, as of the last `evaluate`.
+
+        Args:
+            node_id (str): Id of the node.
+
+        Returns:
+            dict: The node's geometry (see `_compute`), shared with every node of the same key.
+        """
+        return self.cache[self.keys[node_id]]
+
+    def _trace(self, node: Node) -> dict:
+        """
+        Describe the trace of a stem, head or wrap node as `build_rose_bouquet_figure` draws it.
+
+        Args:
+            node (Node): The node.
+
+        Returns:
+            dict: The trace's properties.
+        """
+        geometry = self.geometry(node.id)
+        trace = dict(type='surface', x=geometry['x'], y=geometry['y'], z=geometry['z'], showscale=False)
+        if node.kind == 'stem':
+            trace['colorscale'] = 'Greens'
+        elif node.kind == 'head':
+            trace['colorscale'] = node.params['colorscale']
+        else:
+            color = node.params['color']
+            trace.update(colorscale=[[0, color], [1, color]], opacity=node.params['opacity'])
+        return trace
+
+    def _thorn_trace(self) -> dict:
+        """
+        Merge the thorns of every stem into one line trace.
+
+        Returns:
+            dict: The trace's properties.
+        """
+        points = [self.geometry(node.id)['points'] for node in self.nodes.values() if node.kind == 'thorns']
+        x, y, z = thorn_lines(np.concatenate(points) if points else np.empty((0, 2, 3), dtype=self.dtype))
+        return dict(type='scatter3d', x=x, y=y, z=z, mode='lines', line=dict(color='Green', width=4))
+
+    def figure(self) -> 'go.Figure':
+        """
+        Evaluate the graph and return its figure, patching only the traces of changed nodes.
+
+        The figure is built once; afterwards the same figure is returned with the traces of
+        changed nodes replaced, and rebuilt only when nodes were added or removed. Traces come
+        in the order `build_rose_bouquet_figure` adds them: each stem followed by its head,
+        then all thorns as one line trace and the wrap.
+
+        Returns:
+            go.Figure: The bouquet's figure.
+        """
+        import plotly.graph_objects as go
+
+        self.evaluate()
+        drawn = [node for node in self.nodes.values() if node.kind != 'thorns']
+        thorns = tuple(self.keys[node.id] for node in self.nodes.values() if node.kind == 'thorns')
+        state = {node.id: (self.keys[node.id], node.params) for node in drawn}
+
+        if self._fig is None or list(state) != list(self._drawn):
+            with span('scene traces'):
+                data = [self._trace(node) for node in drawn if node.kind != 'wrap']
+                data += [self._thorn_trace()] + [self._trace(node) for node in drawn if node.kind == 'wrap']
+                self._fig = go.Figure(data=data)
+            with span('layout'):
+                scene = dict(xaxis=dict(visible=False), yaxis=dict(visible=False), zaxis=dict(visible=False))
+                if self.camera is not None:
+                    scene['camera'] = self.camera
+                self._fig.update_layout(title={'text': self.title, 'font': {'color': '#333333'}}, autosize=True,
+                                        scene=scene, margin=dict(l=0, r=0, b=0, t=30), paper_bgcolor='black',
+                                        plot_bgcolor='black', showlegend=False)
+        else:
+            with span('patch traces'), self._fig.batch_update():
+                order = [node for node in drawn if node.kind != 'wrap'] + [None] + \
+                        [node for node in drawn if node.kind == 'wrap']
+                for index, node in enumerate(order):
+                    if node is None:
+                        if thorns != self._drawn_thorns:
+                            self._fig.data[index].update(self._thorn_trace())
+                    elif state[node.id] != self._drawn[node.id]:
+                        self._fig.data[index].update(self._trace(node))
+
+        self._drawn, self._drawn_thorns = state, thorns
+        return self._fig
+
+
+def compile_spec(spec: Union[dict, str, Path] = DEFAULT_SPEC) -> SceneGraph:
+    """
+    Compile a bouquet spec into a scene graph.
+
+    Args:
+        spec (dict, str or Path): The spec, or a TOML or JSON file holding it.
+
+    Returns:
+        SceneGraph: The graph, evaluated on its first `figure` call.
+    """
+    return SceneGraph(spec if isinstance(spec, dict) else load_spec(spec))
+
+
+def large_bouquet_spec(ring_sizes: tuple = (7, 14, 28)) -> dict:
+    """
+    Extend the default spec with rings of roses, 50 in all with the default ring sizes.
+
+    Args:
+        ring_sizes (tuple): Number of roses in each ring, drawn successively farther out.
+
+    Returns:
+        dict: The spec.
+    """
+    spec = load_spec()
+    spec['rings'] = [{'id': f'ring{index}', 'count': count, 'distance': 0.8 * (index + 1), 'height': 2.8 - 0.3 * index,
+                      'turns': 1} for index, count in enumerate(ring_sizes)]
+    spec['wrap'] = {**spec['wrap'], 'top_radius': 3.2}
+    return spec
+
+
+# ****
+if __name__ == '__main__':
+    # Time a 50-rose bouquet, built once and then edited one node at a time; tests/test_scene_graph.py checks
+    # that the edits recompute only their nodes and that the default spec reproduces the built-in bouquet
+    spec = large_bouquet_spec()
+    start = time.perf_counter()
+    graph = compile_spec(spec)
+    graph.figure()
+    seconds = time.perf_counter() - start
+    print(f'{sum(node.kind == "head" for node in graph.nodes.values())} roses: full build {seconds * 1e3:6.1f} ms, '
+          f'{len(graph.computed)} nodes computed, {len(graph.cache)} cached buffers')
+
+    edits = [('ring2-11', {'angle_x': 0.5}), ('ring1-3/head', {'petal_frequency': 4.2}),
+             ('ring1-3/head', {'colorscale': 'Purples'}), ('center', {'radius': 0.08}),
+             ('wrap', {'amplitude': 2.0})]
+    for node_id, params in edits:
+        graph.update(node_id, **params)
+        start = time.perf_counter()
+        graph.figure()
+        seconds = time.perf_counter() - start
+        spec_edit = ', '.join(f'{name}={value}' for name, value in params.items())
+        print(f'  {node_id:<13} {spec_edit:<22} {seconds * 1e3:6.1f} ms, computed: {", ".join(graph.computed) or "none"}')
@@ -0,0 +1,588 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+from geometry import rose_head_template
+from plot_export import figure_to_html
+from sweep import DEFAULTS, SCENES, build_scene, warm_plotly
+
+# brotli is optional; without it pages are offered with gzip only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Address the server listens on by default
+HOST, PORT = '127.0.0.1', 8050
+
+# Upper bound of the cached pages' total size, counting every content coding of a page
+CACHE_BYTES = 256 * 2**20
+
+# Compressed content codings in order of preference
+CODINGS = ('br', 'gzip')
+
+# Pages are compressed once per build and then served many times, so compression is slow but small
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Query parameters every scene accepts besides its swept ones, with their defaults and allowed values
+PAGE_DEFAULTS = {'seed': 0, 'encoding': 'float32', 'dtype': 'float32'}
+PAGE_CHOICES = {'encoding': ('float32', 'int16', 'json'), 'dtype': ('float32', 'float64')}
+
+# Scenes drawn without thorns, whose pages ignore the seed, so it is left out of their cache keys
+UNSEEDED_SCENES = ('rose_head',)
+
+# Seconds an idle keep-alive connection is held open
+KEEP_ALIVE_SECONDS = 15
+
+# Reason phrases of the statuses the server sends
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class Page(NamedTuple):
+    """
+    One built page in every content coding it is offered in.
+
+    Attributes:
+        digest (str): Hexadecimal digest of the uncompressed page, the base of its ETags.
+        bodies (dict): The page's bytes keyed by content coding: 'identity', 'gzip' and, when
+            brotli is installed, 'br'.
+        seconds (float): Time the worker spent building and compressing the page.
+    """
+    digest: str
+    bodies: dict
+    seconds: float
+
+    @property
+    def size(self) -> int:
+        """
+        int: The bytes the page holds in the cache.
+        """
+        return sum(len(body) for body in self.bodies.values())
+
+    def etag(self, coding: str) -> str:
+        """
+        Get the strong ETag of one representation of the page.
+
+        Every coding is a different sequence of bytes, so each needs its own strong validator.
+
+        Args:
+            coding (str): The content coding, a key of `bodies`.
+
+        Returns:
+            str: The quoted entity tag.
+        """
+        return f'"{self.digest}"' if coding == 'identity' else f'"{self.digest}-{coding}"'
+
+
+def normalize_params(scene: str, query: Dict[str, str]) -> Tuple[Tuple[str, object], ...]:
+    """
+    Validate the query parameters of a page request and bring them into canonical form.
+
+    Values are parsed to the type of their default and missing ones are filled in, so
+    requests spelling the same page differently, such as `curve_factor=0.20` and no
+    `curve_factor` at all, map to the same cache key. Scenes in `UNSEEDED_SCENES` accept
+    a seed but leave it out of their parameters.
+
+    Args:
+        scene (str): The requested scene, a key of `sweep.SCENES`.
+        query (dict): The raw query parameters.
+
+    Returns:
+        tuple: The sorted (name, value) pairs of every parameter of the page.
+
+    Raises:
+        ValueError: If a parameter is unknown to the scene, its value cannot be parsed or is out
+            of range, such as a negative seed or a colorscale Plotly has no name for.
+    """
+    from plotly.colors import named_colorscales
+
+    defaults = {name: DEFAULTS[name] for name in SCENES[scene][2]}
+    defaults.update(PAGE_DEFAULTS)
+
+    unknown = set(query) - set(defaults)
+    if unknown:
+        raise ValueError(f"unknown parameters for {scene}: {', '.join(sorted(unknown))}; "
+                         f"expected some of {', '.join(defaults)}")
+
+    params = {}
+    for name, default in defaults.items():
+        value = query.get(name, default)
+        try:
+            params[name] = type(default)(value)
+        except ValueError:
+            raise ValueError(f'invalid value {value!r} for {name}') from None
+        if name in PAGE_CHOICES and params[name] not in PAGE_CHOICES[name]:
+            raise ValueError(f"invalid value {value!r} for {name}; expected one of {', '.join(PAGE_CHOICES[name])}")
+        if isinstance(params[name], float) and not np.isfinite(params[name]):
+            raise ValueError(f'invalid value {value!r} for {name}')
+        if name == 'seed' and params[name] < 0:
+            raise ValueError(f'invalid value {value!r} for seed; expected a non-negative integer')
+        # Plotly matches colorscale names case-insensitively, and a '_r' suffix reverses any of them
+        if name == 'colorscale' and params[name].lower().removesuffix('_r') not in named_colorscales():
+            raise ValueError(f"invalid value {value!r} for colorscale; expected a named Plotly colorscale "
+                             f"such as 'Reds' or 'Viridis_r'")
+    if scene in UNSEEDED_SCENES:
+        del params['seed']
+    return tuple(sorted(params.items()))
+
+
+def render_page(scene: str, params: Tuple[Tuple[str, object], ...]) -> Page:
+    """
+    Build one page and compress it, in a worker process.
+
+    Args:
+        scene (str): The scene to build, a key of `sweep.SCENES`.
+        params (tuple): The normalized parameters from `normalize_params`.
+
+    Returns:
+        Page: The page in every content coding the server offers.
+    """
+    start = time.perf_counter()
+    params = dict(params)
+    seed, encoding, dtype = (params.pop(name, default) for name, default in PAGE_DEFAULTS.items())
+
+    # Rose head templates are memoized per worker, so only new petal parameters cost a kernel evaluation
+    head = rose_head_template(dtype=np.dtype(dtype), petal_frequency=params['petal_frequency'],
+                              decay=params['decay'])
+    fig = build_scene(scene, params, head, dtype, seed)
+    body = figure_to_html(fig, None if encoding == 'json' else encoding, full_html=True, include_plotlyjs='cdn',
+                          div_id=f'{scene}-plot').encode('utf-8')
+
+    bodies = {'identity': body, 'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return Page(hashlib.sha256(body).hexdigest()[:32], bodies, time.perf_counter() - start)
+
+
+def negotiate(accept_encoding: str, offered: tuple) -> str:
+    """
+    Pick the content coding of a response from the client's Accept-Encoding header.
+
+    Args:
+        accept_encoding (str): The header's value, empty if the client sent none.
+        offered (tuple): The compressed codings the page is available in, most preferred first.
+
+    Returns:
+        str: The chosen coding; 'identity' unless the client accepts a compressed one.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, parameters = item.strip().lower().partition(';')
+        weight = 1.0
+        for parameter in parameters.split(';'):
+            name, _, value = parameter.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+
+    # An explicit weight wins over the wildcard, and codings weighted 0 are refused
+    candidates = [(weights.get(coding, weights.get('*', 0.0)), -rank, coding)
+                  for rank, coding in enumerate(offered)]
+    best = max(candidates, default=(0.0, 0, 'identity'))
+    return best[2] if best[0] > 0 else 'identity'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Evaluate an If-None-Match header against a response's ETag.
+
+    If-None-Match uses the weak comparison, so a `W/` prefix on either side is ignored.
+
+    Args:
+        if_none_match (str): The header's value.
+        etag (str): The quoted ETag of the selected representation.
+
+    Returns:
+        bool: Whether the client's cached copy is current.
+    """
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in tags)
+
+
+class PageCache:
+    """
+    A least recently used cache of pages, bounded by their total size in bytes.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes (int): Largest total size of the cached pages. Pages larger than this are
+                served but never cached.
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.pages = OrderedDict()
+
+    def get(self, key: tuple) -> Page:
+        """
+        Look up a page and mark it as most recently used.
+
+        Args:
+            key (tuple): The page's cache key.
+
+        Returns:
+            Page: The cached page, or None if it is not cached.
+        """
+        page = self.pages.get(key)
+        if page is not None:
+            self.pages.move_to_end(key)
+        return page
+
+    def put(self, key: tuple, page: Page) -> None:
+        """
+        Cache a page, evicting the least recently used ones until it fits.
+
+        Args:
+            key (tuple): The page's cache key.
+            page (Page): The page to cache.
+        """
+        if page.size > self.max_bytes:
+            return
+        if key in self.pages:
+            self.bytes -= self.pages.pop(key).size
+        while self.bytes + page.size > self.max_bytes:
+            self.bytes -= self.pages.popitem(last=False)[1].size
+        self.pages[key] = page
+        self.bytes += page.size
+
+
+class FigureServer:
+    """
+    Serves the flower scenes over HTTP, building each page on first request.
+
+    Builds run in a process pool, so the event loop keeps serving cached pages while a figure
+    is being built. Concurrent requests for a page that is being built wait for that build
+    instead of starting their own.
+    """
+
+    def __init__(self, jobs: int = None, cache_bytes: int = CACHE_BYTES):
+        """
+        Initialize the server and its worker pool.
+
+        Args:
+            jobs (int, optional): Number of worker processes. Defaults to the CPU count.
+            cache_bytes (int): Size bound of the page cache (see `PageCache`).
+        """
+        self.pool = ProcessPoolExecutor(max_workers=jobs or os.cpu_count(), initializer=warm_plotly)
+        self.cache = PageCache(cache_bytes)
+        self.pending = {}
+        self.stats = {'requests': 0, 'builds': 0, 'hits': 0, 'coalesced': 0, 'not_modified': 0}
+
+    async def page(self, scene: str, params: tuple) -> Page:
+        """
+        Get a page from the cache, from a build in progress, or from a new build.
+
+        Args:
+            scene (str): The requested scene.
+            params (tuple): The normalized parameters from `normalize_params`.
+
+        Returns:
+            Page: The built page.
+        """
+        key = (scene, params)
+        page = self.cache.get(key)
+        if page is not None:
+            self.stats['hits'] += 1
+            return page
+
+        if key in self.pending:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['builds'] += 1
+            self.pending[key] = asyncio.get_running_loop().run_in_executor(self.pool, render_page, scene, params)
+        build = self.pending[key]
+        try:
+            # Shielded, so a client disconnecting does not cancel the build the other waiters share
+            page = await asyncio.shield(build)
+        finally:
+            if self.pending.get(key) is build and build.done():
+                del self.pending[key]
+        self.cache.put(key, page)
+        return page
+
+    async def respond(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Handle one request.
+
+        Args:
+            method (str): The request method.
+            target (str): The request target, a path with an optional query.
+            headers (dict): The request headers, with lower-case names.
+
+        Returns:
+            tuple: The status code, the response headers and the body.
+        """
+        self.stats['requests'] += 1
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+
+        url = urlsplit(target)
+        scene = url.path.strip('/')
+        if scene == 'stats':
+            stats = dict(self.stats, cached_pages=len(self.cache.pages), cached_bytes=self.cache.bytes)
+            return 200, {'Content-Type': 'application/json'}, json.dumps(stats).encode()
+        if scene not in SCENES:
+            return 404, {}, f"unknown scene; expected one of {', '.join(SCENES)}\n".encode()
+
+        try:
+            params = normalize_params(scene, dict(parse_qsl(url.query)))
+        except ValueError as error:
+            return 400, {}, f'{error}\n'.encode()
+
+        try:
+            page = await self.page(scene, params)
+        except Exception as error:
+            return 500, {}, f'failed to build {scene}: {error!r}\n'.encode()
+
+        coding = negotiate(headers.get('accept-encoding', ''), tuple(c for c in CODINGS if c in page.bodies))
+        response_headers = {'ETag': page.etag(coding), 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if etag_matches(headers.get('if-none-match', ''), page.etag(coding)):
+            self.stats['not_modified'] += 1
+            return 304, response_headers, b''
+
+        response_headers['Content-Type'] = 'text/html; charset=utf-8'
+        if coding != 'identity':
+            response_headers['Content-Encoding'] = coding
+        return 200, response_headers, page.bodies[coding]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve the requests of one connection, keeping it open between requests.
+
+        Args:
+            reader (asyncio.StreamReader): The connection's incoming stream.
+            writer (asyncio.StreamWriter): The connection's outgoing stream.
+        """
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+                if not request_line.strip():
+                    break
+                request = request_line.decode('latin-1').split()
+                if len(request) == 3:
+                    method, target, version = request
+                    headers = {}
+                    while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    status, response_headers, body = await self.respond(method, target, headers)
+                else:
+                    # Without a request line the rest of the stream cannot be framed, so the connection ends here
+                    method, version, headers = 'GET', 'HTTP/1.1', {'connection': 'close'}
+                    status, response_headers, body = 400, {}, b'malformed request line\n'
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+
+                response_headers.setdefault('Content-Type', 'text/plain; charset=utf-8')
+                response_headers['Content-Length'] = str(len(body))
+                response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                head = f'HTTP/1.1 {status} {REASONS[status]}\r\n' + ''.join(
+                    f'{name}: {value}\r\n' for name, value in response_headers.items()) + '\r\n'
+                writer.write(head.encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Idle keep-alive connections are cancelled when the loop shuts down, which simply ends them
+            pass
+        finally:
+            writer.close()
+
+    def close(self) -> None:
+        """
+        Shut the worker pool down.
+        """
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def fetch(host: str, port: int, target: str, headers: Dict[str, str] = None,
+                connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter] = None) -> Tuple[int, dict, bytes]:
+    """
+    Send one GET request over a keep-alive connection and read the response.
+
+    Args:
+        host (str): The server's host.
+        port (int): The server's port.
+        target (str): The request target.
+        headers (dict, optional): Extra request headers.
+        connection (tuple, optional): An open (reader, writer) pair to reuse. A new connection is
+            opened and closed if None.
+
+    Returns:
+        tuple: The status code, the response headers with lower-case names and the body.
+    """
+    reader, writer = connection or await asyncio.open_connection(host, port)
+    lines = [f'GET {target} HTTP/1.1', f'Host: {host}:{port}'] + [f'{k}: {v}' for k, v in (headers or {}).items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        response_headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(response_headers.get('content-length', 0)))
+
+    if connection is None:
+        writer.close()
+        await writer.wait_closed()
+    return status, response_headers, body
+
+
+async def load(host: str, port: int, targets: List[str], concurrency: int = 8,
+               headers: Dict[str, str] = None) -> np.ndarray:
+    """
+    Request a list of targets from a number of concurrent keep-alive clients.
+
+    Args:
+        host (str): The server's host.
+        port (int): The server's port.
+        targets (list): The request targets, handed out to the clients in order.
+        concurrency (int): Number of concurrent clients, each with its own connection.
+        headers (dict, optional): Request headers sent with every request.
+
+    Returns:
+        np.ndarray: The latency of every request in seconds.
+    """
+    queue = list(reversed(targets))
+    latencies = []
+
+    async def client() -> None:
+        connection = await asyncio.open_connection(host, port)
+        try:
+            while queue:
+                target = queue.pop()
+                start = time.perf_counter()
+                status, _, _ = await fetch(host, port, target, headers, connection)
+                latencies.append(time.perf_counter() - start)
+                assert status in (200, 304), f'{target}: {status}'
+        finally:
+            connection[1].close()
+            await connection[1].wait_closed()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return np.array(latencies)
+
+
+async def benchmark(jobs: int = None) -> None:
+    """
+    Start a server on a free port and measure its latencies under a local load generator.
+
+    The run covers cold builds of distinct pages, a burst of identical requests for a page
+    nobody has built yet, cached pages with gzip, and revalidations answered with 304.
+
+    Args:
+        jobs (int, optional): Number of worker processes.
+    """
+    app = FigureServer(jobs)
+    server = await asyncio.start_server(app.handle, HOST, 0)
+    host, port = server.sockets[0].getsockname()[:2]
+    gzip_headers = {'Accept-Encoding': 'gzip, br'}
+
+    def report(name: str, latencies: np.ndarray) -> None:
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+        print(f'{name:<44} {len(latencies):5d} requests  p50 {p50:8.2f} ms  p99 {p99:8.2f} ms')
+
+    try:
+        # One request to start the workers, which is not part of any measurement
+        await fetch(host, port, '/rose_head?colorscale=Greys')
+
+        scenes = ['/rose_head', '/rose', '/bouquet']
+        cold = [f'{scene}?curve_factor={0.1 + index / 100}' if scene != '/rose_head' else f'{scene}?decay={20 + index}'
+                for index in range(4) for scene in scenes]
+        report('cold builds (12 distinct pages)', await load(host, port, cold, 1, gzip_headers))
+
+        builds = app.stats['builds']
+        burst = await load(host, port, ['/bouquet?curve_factor=0.33'] * 32, 32, gzip_headers)
+        report(f"burst of 32 identical cold requests ({app.stats['builds'] - builds} build)", burst)
+
+        # Invalid parameters are rejected before any build, and the rose head ignores the seed
+        builds = app.stats['builds']
+        for target in ('/rose_head?colorscale=NotAScale', '/rose?seed=-1', '/rose?seed=x', '/bouquet?decay=nan'):
+            status, _, body = await fetch(host, port, target)
+            assert status == 400, f'{target}: {status} {body!r}'
+        assert (await fetch(host, port, '/rose_head?seed=5&colorscale=Greys'))[0] == 200
+        assert app.stats['builds'] == builds
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b'GARBAGE\r\n\r\n')
+        assert (await reader.readline()).startswith(b'HTTP/1.1 400 ')
+        writer.close()
+
+        warm = [cold[index % len(cold)] for index in range(600)]
+        report('cached pages, gzip', await load(host, port, warm, 8, gzip_headers))
+        report('cached pages, identity', await load(host, port, warm, 8))
+
+        _, response_headers, _ = await fetch(host, port, '/bouquet?curve_factor=0.33', gzip_headers)
+        revalidate = dict(gzip_headers, **{'If-None-Match': response_headers['etag']})
+        report('revalidations (304)', await load(host, port, ['/bouquet?curve_factor=0.33'] * 600, 8, revalidate))
+
+        _, _, identity = await fetch(host, port, '/bouquet?curve_factor=0.33')
+        _, _, compressed = await fetch(host, port, '/bouquet?curve_factor=0.33', gzip_headers)
+        print(f'bouquet page: {len(identity) / 1e6:.2f} MB, gzip {len(compressed) / 1e6:.2f} MB'
+              f"{'' if brotli else ' (brotli is not installed)'}")
+        print(f"stats: {app.stats}, cache {len(app.cache.pages)} pages / {app.cache.bytes / 1e6:.1f} MB")
+    finally:
+        server.close()
+        await server.wait_closed()
+        app.close()
+
+
+async def serve(host: str = HOST, port: int = PORT, jobs: int = None, cache_bytes: int = CACHE_BYTES) -> None:
+    """
+    Serve the flower scenes until interrupted.
+
+    Args:
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        jobs (int, optional): Number of worker processes.
+        cache_bytes (int): Size bound of the page cache.
+    """
+    app = FigureServer(jobs, cache_bytes)
+    server = await asyncio.start_server(app.handle, host, port)
+    print(f"serving {', '.join(f'http://{host}:{port}/{scene}' for scene in SCENES)}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.close()
+
+
+# ****
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the flower scenes, built on request from query parameters.')
+    parser.add_argument('--host', default=HOST, help=f'address to listen on (default: {HOST})')
+    parser.add_argument('--port', type=int, default=PORT, help=f'port to listen on (default: {PORT})')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--cache-mb', type=float, default=CACHE_BYTES / 2**20, help='size bound of the page cache')
+    parser.add_argument('--benchmark', action='store_true', help='measure latencies under a local load generator')
+    args = parser.parse_args()
+
+    try:
+        if args.benchmark:
+            asyncio.run(benchmark(args.jobs))
+        else:
+            asyncio.run(serve(args.host, args.port, args.jobs, int(args.cache_mb * 2**20)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,62 @@
+window.roseSharedData = window.roseSharedData || (function () {
+    var arrayTypes = {f4: Float32Array, i4: Int32Array, u1: Uint8Array};
+    var requests = {};
+
+    function fetchBlock(href) {
+        if (!requests[href]) {
+            requests[href] = fetch(href).then(function (response) {
+                if (!response.ok) {
+                    throw new Error('Failed to load ' + href + ': ' + response.status);
+                }
+                return response.arrayBuffer();
+            });
+        }
+        return requests[href];
+    }
+
+    function isBlock(value) {
+        return value !== null && typeof value === 'object' && typeof value.href === 'string' && 'dtype' in value;
+    }
+
+    function decode(block, buffer) {
+        var values = new arrayTypes[block.dtype](buffer);
+        if (block.offset) {
+            var shifted = new Float32Array(values.length);
+            for (var i = 0; i < values.length; i++) {
+                shifted[i] = values[i] + block.offset;
+            }
+            values = shifted;
+        }
+        if (!block.shape) {
+            return values;
+        }
+        var rows = [], cols = block.shape[1];
+        for (var row = 0; row < block.shape[0]; row++) {
+            rows.push(values.subarray(row * cols, (row + 1) * cols));
+        }
+        return rows;
+    }
+
+    function collect(node, pending) {
+        Object.keys(node).forEach(function (key) {
+            var value = node[key];
+            if (isBlock(value)) {
+                pending.push(fetchBlock(value.href).then(function (buffer) {
+                    node[key] = decode(value, buffer);
+                }));
+            } else if (value !== null && typeof value === 'object') {
+                collect(value, pending);
+            }
+        });
+    }
+
+    return {
+        newPlot: function (id, data, layout, config) {
+            var pending = [];
+            collect(data, pending);
+            return Promise.all(pending).then(function () {
+                return Plotly.newPlot(id, data, layout, config);
+            });
+        }
+    };
+})();
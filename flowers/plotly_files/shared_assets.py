@@ -0,0 +1,159 @@
+import hashlib
+import numpy as np
+from pathlib import Path
+
+# File names of the shared scripts, written next to the pages that load them
+PLOTLYJS_NAME = 'plotly.min.js'
+LOADER_NAME = 'shared-data.js'
+
+# Subdirectory holding the content-addressed data blocks
+DATA_DIR = 'data'
+
+# Arrays smaller than this stay inline in the page, where a separate request would cost more than it saves
+MIN_BLOCK_BYTES = 4096
+
+# Resolves the data blocks referenced by a figure, then plots it. Each block is fetched once
+# per page and cached by the browser across pages, since its name never changes.
+LOADER_JS = """\
+window.roseSharedData = window.roseSharedData || (function () {
+    var arrayTypes = {f4: Float32Array, i4: Int32Array, u1: Uint8Array};
+    var requests = {};
+
+    function fetchBlock(href) {
+        if (!requests[href]) {
+            requests[href] = fetch(href).then(function (response) {
+                if (!response.ok) {
+                    throw new Error('Failed to load ' + href + ': ' + response.status);
+                }
+                return response.arrayBuffer();
+            });
+        }
+        return requests[href];
+    }
+
+    function isBlock(value) {
+        return value !== null && typeof value === 'object' && typeof value.href === 'string' && 'dtype' in value;
+    }
+
+    function decode(block, buffer) {
+        var values = new arrayTypes[block.dtype](buffer);
+        if (block.offset) {
+            var shifted = new Float32Array(values.length);
+            for (var i = 0; i < values.length; i++) {
+                shifted[i] = values[i] + block.offset;
+            }
+            values = shifted;
+        }
+        if (!block.shape) {
+            return values;
+        }
+        var rows = [], cols = block.shape[1];
+        for (var row = 0; row < block.shape[0]; row++) {
+            rows.push(values.subarray(row * cols, (row + 1) * cols));
+        }
+        return rows;
+    }
+
+    function collect(node, pending) {
+        Object.keys(node).forEach(function (key) {
+            var value = node[key];
+            if (isBlock(value)) {
+                pending.push(fetchBlock(value.href).then(function (buffer) {
+                    node[key] = decode(value, buffer);
+                }));
+            } else if (value !== null && typeof value === 'object') {
+                collect(value, pending);
+            }
+        });
+    }
+
+    return {
+        newPlot: function (id, data, layout, config) {
+            var pending = [];
+            collect(data, pending);
+            return Promise.all(pending).then(function () {
+                return Plotly.newPlot(id, data, layout, config);
+            });
+        }
+    };
+})();
+"""
+
+
+def _write_if_changed(path: Path, data: bytes) -> None:
+    """
+    Write a file unless it already holds exactly these bytes, so unchanged assets keep their timestamps.
+
+    Args:
+        path (Path): The file to write.
+        data (bytes): Its content.
+    """
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + '.tmp')
+    temporary.write_bytes(data)
+    temporary.replace(path)
+
+
+def write_shared_scripts(directory: Path) -> None:
+    """
+    Write the Plotly.js bundle and the data block loader into a directory.
+
+    The bundle is the one `include_plotlyjs='directory'` expects next to the page, so the
+    pages work without a CDN and every page in the directory shares one cached copy.
+
+    Args:
+        directory (Path): Directory of the pages that load the scripts.
+    """
+    from plotly.offline import get_plotlyjs
+
+    _write_if_changed(directory / PLOTLYJS_NAME, get_plotlyjs().encode('utf-8'))
+    _write_if_changed(directory / LOADER_NAME, LOADER_JS.encode('utf-8'))
+
+
+def write_block(values: np.ndarray, directory: Path, dtype: str = 'float32', offset: bool = True) -> dict:
+    """
+    Store an array as a content-addressed binary file and return a reference to it.
+
+    Coordinates are stored relative to their minimum, which is kept in the reference as an
+    offset. Translated copies of the same geometry, such as every rose head placed on a stem,
+    therefore usually produce the same bytes and share one file across all pages. When
+    rounding makes two copies differ, each simply gets its own file.
+
+    Args:
+        values (np.ndarray): The array to store; two-dimensional arrays keep their shape.
+        directory (Path): Directory of the page; blocks go to its `DATA_DIR` subdirectory.
+        dtype (str): The numpy dtype of the stored values, 'float32', 'int32' or 'uint8'.
+        offset (bool): Whether to store the values relative to their minimum.
+
+    Returns:
+        dict: A reference with the dtype code, the shape of 2D arrays, the block's relative
+              URL and the offset to add back, which the loader replaces by the array.
+    """
+    values = np.asarray(values)
+    minimum = float(np.nanmin(values)) if offset and np.isfinite(values).any() else 0.0
+    data = np.ascontiguousarray(values - minimum if minimum else values, dtype=np.dtype(dtype).newbyteorder('<'))
+
+    code = {'float32': 'f4', 'int32': 'i4', 'uint8': 'u1'}[dtype]
+    payload = data.tobytes()
+    digest = hashlib.sha256(f'{code}:{data.shape}:'.encode() + payload).hexdigest()[:20]
+    href = f'{DATA_DIR}/{digest}.bin'
+    _write_if_changed(directory / href, payload)
+
+    block = {'dtype': code, 'href': href}
+    if data.ndim > 1:
+        block['shape'] = list(data.shape)
+    if minimum:
+        block['offset'] = minimum
+    return block
+
+
+def loader_tag() -> str:
+    """
+    Build the tag that includes the data block loader in a page.
+
+    Returns:
+        str: The script tag that loads the data block loader from the page's directory.
+    """
+    return f'<script charset="utf-8" src="{LOADER_NAME}"></script>'
@@ -0,0 +1,300 @@
+import argparse
+import csv
+import hashlib
+import importlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple
+
+import numpy as np
+from geometry import PETAL_DECAY, PETAL_FREQUENCY, rose_head_kernel
+from plot_export import ENCODINGS, figure_to_html
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Swept parameters and their defaults, which every variant not sweeping them keeps
+DEFAULTS = {
+    'petal_frequency': PETAL_FREQUENCY,
+    'decay': PETAL_DECAY,
+    'curve_factor': 0.2,
+    'wrap_amplitude': np.pi,
+    'colorscale': 'Reds',
+}
+
+# Parameters that change the rose head itself, so variants differing in them need their own template
+HEAD_PARAMETERS = ('petal_frequency', 'decay')
+
+# Scenes that can be swept: the module and figure builder generating them and the parameters they use
+SCENES = {
+    'rose': ('rose', 'build_single_rose_figure', ('petal_frequency', 'decay', 'curve_factor', 'colorscale')),
+    'rose_head': ('rose_head', 'build_rose_head_figure', ('petal_frequency', 'decay', 'colorscale')),
+    'bouquet': ('rose_bouquet', 'build_rose_bouquet_figure', tuple(DEFAULTS)),
+}
+
+# Columns of the index written next to the variants, before the swept parameters
+INDEX_FIELDS = ('name', 'scene', 'file', 'bytes', 'seconds')
+
+# The shared memory block of the running worker process and its rose head templates, set by `_attach_templates`
+_segment, _templates = None, None
+
+
+class Variant(NamedTuple):
+    """
+    Describes one variant of a sweep.
+
+    Attributes:
+        name (str): File name stem of the variant, derived from its scene and parameters.
+        scene (str): The scene it shows, a key of `SCENES`.
+        params (dict): The value of every parameter the scene uses.
+        head (int): Index of its rose head template in the shared template block.
+    """
+    name: str
+    scene: str
+    params: dict
+    head: int
+
+
+def expand_grid(grid: Dict[str, list], scene: str = 'bouquet') -> List[dict]:
+    """
+    List every combination of a parameter grid.
+
+    Args:
+        grid (dict): The values to sweep per parameter name, a subset of `DEFAULTS`. Parameters
+            left out keep their default.
+        scene (str): The scene being swept, a key of `SCENES`.
+
+    Returns:
+        list: One dict of parameter values per variant, holding every parameter the scene uses.
+    """
+    if scene not in SCENES:
+        raise ValueError(f'Unknown scene {scene!r}; expected one of {tuple(SCENES)}')
+    used = SCENES[scene][2]
+    unsupported = set(grid) - set(used)
+    if unsupported:
+        raise ValueError(f"The {scene!r} scene has no parameters {', '.join(sorted(unsupported))}; "
+                         f'expected some of {used}')
+
+    axes = [list(grid.get(name, [DEFAULTS[name]])) for name in used]
+    return [dict(zip(used, values)) for values in itertools.product(*axes)]
+
+
+def variant_name(scene: str, params: dict) -> str:
+    """
+    Name a variant after a digest of its parameters, so reruns of a grid reuse the same names.
+
+    Args:
+        scene (str): The scene the variant shows.
+        params (dict): The variant's parameter values.
+
+    Returns:
+        str: The scene name followed by a short hexadecimal digest.
+    """
+    digest = hashlib.sha256(json.dumps([scene, params], sort_keys=True).encode()).hexdigest()
+    return f'{scene}-{digest[:10]}'
+
+
+def warm_plotly() -> None:
+    """
+    Load Plotly's validators and default template, which it otherwise does on first use.
+
+    Worker pools call this as their initializer, so the first page of every worker is not
+    timed with it.
+    """
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    pio.to_html(go.Figure([go.Surface(), go.Scatter3d()]), include_plotlyjs=False)
+
+
+def build_scene(scene: str, params: dict, head: tuple = None, dtype: np.dtype = np.float32,
+                seed: int = 0) -> 'go.Figure':
+    """
+    Build the figure of one scene for a set of swept parameters.
+
+    Args:
+        scene (str): The scene to build, a key of `SCENES`.
+        params (dict): Values of the parameters the scene uses, as from `expand_grid`. The petal
+            parameters must already be baked into `head`.
+        head (tuple, optional): The (X, Y, Z) rose head template, in `dtype`. The default head if None.
+        dtype (np.dtype): Floating point type of the geometry.
+        seed (int): Seed for the thorn angles.
+
+    Returns:
+        go.Figure: The scene's figure.
+    """
+    module, function, _ = SCENES[scene]
+    build = getattr(importlib.import_module(module), function)
+
+    params = {name: value for name, value in params.items() if name not in HEAD_PARAMETERS}
+    kwargs = {'dtype': np.dtype(dtype), 'head': head}
+    if scene != 'rose_head':
+        kwargs['seed'] = seed
+    if 'wrap_amplitude' in params:
+        kwargs['wrap_adjustments'] = params.pop('wrap_amplitude') * np.cos(np.linspace(0, 2 * np.pi, 60))
+    return build(**kwargs, **params)
+
+
+def _attach_templates(name: str, shape: tuple, dtype: str) -> None:
+    """
+    Map the shared rose head templates into a worker process.
+
+    This runs once per worker as the pool's initializer, so tasks only carry the index of
+    their template instead of pickled copies of its arrays.
+
+    Args:
+        name (str): Name of the shared memory block holding the templates.
+        shape (tuple): The (heads, 3, n_theta, n_radial) shape of the templates.
+        dtype (str): The templates' numpy dtype.
+    """
+    global _segment, _templates
+    warm_plotly()
+
+    # The block is unmapped once its SharedMemory object is collected, so it lives as long as the worker
+    _segment = SharedMemory(name)
+    _templates = np.ndarray(shape, dtype=dtype, buffer=_segment.buf)
+    _templates.setflags(write=False)
+
+
+def render_variant(variant: Variant, directory: Path, encoding: str = 'float32', seed: int = 0,
+                   dtype: str = 'float32') -> dict:
+    """
+    Build and write one variant in a worker process.
+
+    Args:
+        variant (Variant): The variant to render.
+        directory (Path): Directory to write its HTML page to.
+        encoding (str, optional): Coordinate encoding of the page (see `plot_export.figure_to_html`).
+        seed (int): Seed for the thorn angles, shared by every variant so they only differ in
+            the swept parameters.
+        dtype (str): Floating point type of the geometry, which must match the templates'.
+
+    Returns:
+        dict: The variant's name, scene, file name, size in bytes, build and write time in
+              seconds, and parameter values.
+    """
+    start = time.perf_counter()
+    fig = build_scene(variant.scene, variant.params, tuple(_templates[variant.head]), dtype, seed)
+
+    # Write next to the target and swap it in, so an interrupted sweep leaves no partial pages
+    output = directory / f'{variant.name}.html'
+    temporary = output.with_name(output.name + '.tmp')
+    figure_to_html(fig, encoding, temporary, full_html=True, include_plotlyjs='cdn', div_id=variant.name)
+    os.replace(temporary, output)
+
+    return {'name': variant.name, 'scene': variant.scene, 'file': output.name, 'bytes': output.stat().st_size,
+            'seconds': time.perf_counter() - start, **variant.params}
+
+
+def write_index(records: List[dict], directory: Path) -> None:
+    """
+    Write the index of a sweep as `index.json` and `index.csv`.
+
+    Args:
+        records (list): One record per variant, as returned by `render_variant`.
+        directory (Path): Directory holding the variants.
+    """
+    (directory / 'index.json').write_text(json.dumps(records, indent=2) + '\n')
+
+    fields = list(INDEX_FIELDS) + [name for name in DEFAULTS if any(name in record for record in records)]
+    with open(directory / 'index.csv', 'w', newline='') as stream:
+        writer = csv.DictWriter(stream, fields)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def sweep(grid: Dict[str, list], scene: str = 'bouquet', directory: os.PathLike = 'sweep', encoding: str = 'float32',
+          seed: int = 0, dtype: np.dtype = np.float32, jobs: int = None, n_radial: int = 25,
+          n_theta: int = 1152) -> List[dict]:
+    """
+    Render every variant of a parameter grid across a process pool.
+
+    The rose head is the only part of a scene that is expensive to share: every distinct pair
+    of petal frequency and decay gets one template, computed here by `geometry.rose_head_kernel`
+    straight into a shared memory block. The workers map that block once when they start and
+    place views of it on their stems, so no template is pickled or recomputed per task.
+
+    Args:
+        grid (dict): The values to sweep per parameter (see `expand_grid`).
+        scene (str): The scene to sweep, a key of `SCENES`.
+        directory (os.PathLike): Directory to write the variants and their index to.
+        encoding (str, optional): Coordinate encoding of the pages (see `plot_export.figure_to_html`).
+            The 'shared' encoding is not supported, as workers would race on the same data blocks.
+        seed (int): Seed for the thorn angles of every variant.
+        dtype (np.dtype): Floating point type of the templates and the geometry.
+        jobs (int, optional): Number of worker processes. Defaults to the CPU count.
+        n_radial (int): Number of samples along the radial (petal width) axis of the heads.
+        n_theta (int): Number of samples along the theta (spiral) axis of the heads.
+
+    Returns:
+        list: The index records of every variant, in grid order.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unsupported encoding {encoding!r}; expected one of {ENCODINGS}')
+
+    combinations = expand_grid(grid, scene)
+    heads = sorted({tuple(params.get(name, DEFAULTS[name]) for name in HEAD_PARAMETERS) for params in combinations})
+    variants = [Variant(variant_name(scene, params), scene, params,
+                        heads.index(tuple(params.get(name, DEFAULTS[name]) for name in HEAD_PARAMETERS)))
+                for params in combinations]
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    dtype = np.dtype(dtype)
+    shape = (len(heads), 3, n_theta, n_radial)
+    segment = SharedMemory(create=True, size=int(np.prod(shape)) * dtype.itemsize)
+    try:
+        templates = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        for index, (petal_frequency, decay) in enumerate(heads):
+            rose_head_kernel(n_radial, n_theta, templates[index], petal_frequency=petal_frequency, decay=decay)
+        del templates  # The block cannot be closed while a view of it is alive
+
+        render = partial(render_variant, directory=directory, encoding=encoding, seed=seed, dtype=dtype.str)
+        with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count(), len(variants)),
+                                 initializer=_attach_templates, initargs=(segment.name, shape, dtype.str)) as pool:
+            records = list(pool.map(render, variants))
+    finally:
+        segment.close()
+        segment.unlink()
+
+    write_index(records, directory)
+    return records
+
+
+# ****
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render every combination of a grid of rose parameters.')
+    parser.add_argument('--scene', choices=SCENES, default='bouquet', help='scene to sweep (default: bouquet)')
+    parser.add_argument('--petal-frequency', type=float, nargs='+',
+                        help=f'petals per turn of the head spiral (default: {PETAL_FREQUENCY})')
+    parser.add_argument('--decay', type=float, nargs='+',
+                        help=f'spiral angle over which the petal angle decays by e (default: 8 pi = {PETAL_DECAY:.4g})')
+    parser.add_argument('--curve-factor', type=float, nargs='+', help='stem curvature (default: 0.2)')
+    parser.add_argument('--wrap-amplitude', type=float, nargs='+',
+                        help='amplitude of the wrap\'s angular adjustments (default: pi)')
+    parser.add_argument('--colorscale', nargs='+', help='colorscale of the rose heads (default: Reds)')
+    parser.add_argument('--out', type=Path, default=Path('sweep'), help='output directory (default: ./sweep)')
+    parser.add_argument('--encoding', choices=['json', 'float32', 'int16'], default='float32',
+                        help='coordinate encoding of the pages (default: float32)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the thorn angles')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args()
+
+    grid = {name: values for name, values in vars(args).items() if name in DEFAULTS and values is not None}
+    start = time.perf_counter()
+    records = sweep(grid, args.scene, args.out, None if args.encoding == 'json' else args.encoding, args.seed,
+                    jobs=args.jobs)
+    elapsed = time.perf_counter() - start
+
+    for record in records:
+        print(f"{record['file']:<26} {record['bytes'] / 1e6:6.2f} MB {record['seconds']:6.2f} s  "
+              + ' '.join(f'{name}={record[name]}' for name in grid))
+    print(f"{len(records)} variants, {sum(r['bytes'] for r in records) / 1e6:.1f} MB in {elapsed:.2f} s "
+          f"({sum(r['seconds'] for r in records):.2f} s of rendering), index in {args.out / 'index.csv'}")
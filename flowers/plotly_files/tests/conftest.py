@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The flower modules import each other by bare name, as when their scripts run from their own directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
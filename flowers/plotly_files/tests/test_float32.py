@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from benchmark import check_float32
+from plot_export import COORDINATE_KEYS, decode_typed_array, encode_figure
+from rose import build_single_rose_figure
+from rose_bouquet import build_rose_bouquet_figure
+from rose_head import build_rose_head_figure
+
+# Figure builders of the flower scenes, called with a fixed seed so both precisions draw the same thorns
+BUILDERS = {
+    'rose': lambda dtype: build_single_rose_figure(0, dtype),
+    'rose_head': lambda dtype: build_rose_head_figure(dtype),
+    'bouquet': lambda dtype: build_rose_bouquet_figure(0, dtype),
+}
+
+
+def coordinates(fig):
+    return [np.asarray(trace[key]) for trace in fig.data for key in COORDINATE_KEYS if trace[key] is not None]
+
+
+@pytest.fixture(scope='module', params=list(BUILDERS))
+def figures(request):
+    build = BUILDERS[request.param]
+    return build(np.float64), build(np.float32)
+
+
+def test_float32_scene_stays_within_tolerance(figures):
+    full, single = (coordinates(fig) for fig in figures)
+    assert len(full) == len(single)
+    assert all(values.dtype == np.float32 for values in single)
+
+    # A few float32 rounding steps of the largest coordinate, which is what WebGL draws at anyway
+    tolerance = 4 * np.finfo(np.float32).eps * max(np.nanmax(np.abs(values)) for values in full)
+    assert max(np.nanmax(np.abs(values - reference)) for values, reference in zip(single, full)) <= tolerance
+
+
+def test_float32_scene_is_encoded_exactly(figures):
+    _, single = figures
+    restored = [decode_typed_array(trace[key]) for trace in encode_figure(single, 'float32')['data']
+                for key in COORDINATE_KEYS if isinstance(trace.get(key), dict)]
+    assert len(restored) == len(coordinates(single))
+    assert all(np.array_equal(values, expected, equal_nan=True)
+               for values, expected in zip(restored, coordinates(single)))
+
+
+def test_float32_halves_memory_of_large_scenes():
+    result = check_float32(num_roses=16)
+    assert result['max_error'] <= result['tolerance']
+    assert result['bytes'][np.float32] * 2 == result['bytes'][np.float64]
+    assert result['peak_bytes'][np.float32] <= 0.6 * result['peak_bytes'][np.float64]
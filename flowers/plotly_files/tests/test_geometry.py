@@ -0,0 +1,129 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import geometry
+from transforms import rotation_matrices
+
+# Seconds a fresh interpreter may spend importing the geometry core or a flower module,
+# which includes about 0.15 s for NumPy itself; importing Plotly took 0.8 s before it was made lazy
+IMPORT_BUDGET = 0.5
+
+# Modules that must import without Plotly
+LIGHT_MODULES = ('geometry', 'traces', 'rose', 'rose_head', 'rose_bouquet', 'rose_field', 'scene_graph')
+
+# Rotation angles and offsets the geometry is checked at
+ANGLES = [(0, 0, 0), (0.3, -0.2, 1.1), (np.pi / 2, np.pi / 3, -np.pi / 4)]
+OFFSETS = [(0, 0, 0), (0.5, -0.2, 2.6)]
+
+
+def baseline_meshgrid_transforms(x_offset=0, y_offset=0, z_offset=0):
+    # The rose head as the original rose.py computed it, on the full meshgrid
+    xr, tr = np.meshgrid(np.linspace(0, 1, 25), np.linspace(0, 20 * np.pi, 1152) + 4 * np.pi)
+    p = (np.pi / 2) * np.exp(-tr / (8 * np.pi))
+    cr = np.sin(15 * tr) / 150
+    u = 1 - (1 - np.mod(3.6 * tr, 2 * np.pi) / np.pi) ** 4 / 2 + cr
+    yr = 2 * (xr**2 - xr)**2 * np.sin(p)
+    rr = u * (xr * np.sin(p) + yr * np.cos(p))
+    hr = u * (xr * np.cos(p) - yr * np.sin(p))
+    return rr * np.cos(tr) + x_offset, rr * np.sin(tr) + y_offset, hr + z_offset + 0.35
+
+
+def baseline_rotate_xyz(X, Y, Z, angle_x=0, angle_y=0, angle_z=0):
+    # One rotation after the other, about x, then y, then z
+    Y, Z = Y * np.cos(angle_x) - Z * np.sin(angle_x), Y * np.sin(angle_x) + Z * np.cos(angle_x)
+    X, Z = X * np.cos(angle_y) + Z * np.sin(angle_y), -X * np.sin(angle_y) + Z * np.cos(angle_y)
+    X, Y = X * np.cos(angle_z) - Y * np.sin(angle_z), X * np.sin(angle_z) + Y * np.cos(angle_z)
+    return X, Y, Z
+
+
+def baseline_stem(height=1, radius=0.05, x_offset=0, y_offset=0, z_offset=0, curve_factor=0.2, angle_x=0,
+                  angle_y=0, angle_z=0):
+    theta, z = np.meshgrid(np.linspace(0, 2 * np.pi, 30), np.linspace(0, height, 50))
+    x_curve = curve_factor * np.sin(np.pi * z / height)
+    y_curve = curve_factor * np.cos(np.pi * z / height)
+    tapering = 1 - (z / height) * 0.3
+    x = (radius * tapering * np.cos(theta)) + x_curve + x_offset
+    y = (radius * tapering * np.sin(theta)) + y_curve + y_offset
+    return baseline_rotate_xyz(x, y, z + z_offset, angle_x, angle_y, angle_z)
+
+
+def baseline_stem_top_center(height, x_offset, y_offset, curve_factor=0.2, angle_x=0, angle_y=0, angle_z=0):
+    x_top = curve_factor * np.sin(np.pi) + x_offset
+    y_top = curve_factor * np.cos(np.pi) + y_offset
+    x_top, y_top, z_top = baseline_rotate_xyz(np.array([x_top]), np.array([y_top]), np.array([height]),
+                                              angle_x, angle_y, angle_z)
+    return x_top[0], y_top[0], z_top[0]
+
+
+def baseline_wrap(base_radius=0.05, top_radius=0.8, height=1.2, x_offset=0, y_offset=0, z_offset=0,
+                  angular_adjustments=None):
+    theta, z = np.meshgrid(np.linspace(0, 2 * np.pi, 60), np.linspace(0, height, 20))
+    if angular_adjustments is None:
+        angular_adjustments = np.zeros_like(theta[0, :])
+    top_radii = top_radius + 0.4 * np.sin(3 * theta[0, :] + angular_adjustments)
+    r = np.linspace(base_radius, 1, z.shape[0])[:, None] * top_radii
+    z_extrusions = 0.5 * np.sin(2 * theta + angular_adjustments)
+    return (r * np.cos(theta) + x_offset, r * np.sin(theta) + y_offset,
+            z + z_extrusions * (z / height) + z_offset)
+
+
+def assert_close(actual, expected, tolerance=1e-12):
+    for values, reference in zip(actual, expected):
+        assert values.shape == reference.shape
+        np.testing.assert_allclose(values, reference, rtol=0, atol=tolerance)
+
+
+@pytest.mark.parametrize('offset', OFFSETS)
+def test_meshgrid_transforms_matches_baseline(offset):
+    assert_close(geometry.meshgrid_transforms(*offset), baseline_meshgrid_transforms(*offset))
+
+
+@pytest.mark.parametrize('angles', ANGLES)
+def test_rotate_xyz_matches_baseline(angles):
+    surface = baseline_meshgrid_transforms(0.5, -0.2, 2.6)
+    assert_close(geometry.rotate_xyz(*surface, *angles), baseline_rotate_xyz(*surface, *angles))
+
+
+def test_meshgrid_transforms_batch_matches_baseline():
+    rng = np.random.default_rng(0)
+    angles, offsets = rng.uniform(-np.pi, np.pi, (8, 3)), rng.uniform(-5, 5, (8, 3))
+    batch = geometry.meshgrid_transforms_batch(offsets, rotation_matrices(angles))
+    for head, angle, offset in zip(batch, angles, offsets):
+        expected = baseline_rotate_xyz(*baseline_meshgrid_transforms(), *angle)
+        assert_close(head, [values + shift for values, shift in zip(expected, offset)])
+
+
+@pytest.mark.parametrize('angles', ANGLES)
+def test_get_stem_top_center_matches_baseline(angles):
+    np.testing.assert_allclose(geometry.get_stem_top_center(3, 0.5, -0.2, 0.2, *angles),
+                               baseline_stem_top_center(3, 0.5, -0.2, 0.2, *angles), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('angles', ANGLES)
+def test_stem_surface_matches_baseline(angles):
+    params = {'height': 2.8, 'radius': 0.05, 'x_offset': 0.3, 'y_offset': -0.1, 'z_offset': 0.2, 'curve_factor': 0.2}
+    x, y, z, _ = geometry.stem_surface(**params, angle_x=angles[0], angle_y=angles[1], angle_z=angles[2],
+                                       rng=np.random.default_rng(0))
+    assert_close((x, y, z), baseline_stem(**params, angle_x=angles[0], angle_y=angles[1], angle_z=angles[2]))
+
+
+@pytest.mark.parametrize('angular_adjustments', [None, np.pi * np.cos(np.linspace(0, 2 * np.pi, 60))])
+def test_wrap_surface_matches_baseline(angular_adjustments):
+    params = {'base_radius': 0.15, 'top_radius': 2.15, 'height': 2.3, 'z_offset': 0.6}
+    assert_close(geometry.wrap_surface(**params, angular_adjustments=angular_adjustments),
+                 baseline_wrap(**params, angular_adjustments=angular_adjustments))
+
+
+@pytest.mark.parametrize('module', LIGHT_MODULES)
+def test_import_stays_within_budget_without_plotly(module):
+    probe = (f'import sys, time; start = time.perf_counter(); import {module}; '
+             f'print(time.perf_counter() - start, any(name.startswith("plotly") for name in sys.modules))')
+
+    # The best of three fresh interpreters, since the first run also pays for a cold file cache
+    runs = [subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+                           cwd=Path(geometry.__file__).parent).stdout.split() for _ in range(3)]
+    assert not any(plotly == 'True' for _, plotly in runs), f'importing {module} imports plotly'
+    assert min(float(seconds) for seconds, _ in runs) <= IMPORT_BUDGET
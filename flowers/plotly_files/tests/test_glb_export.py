@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from glb_export import (ACCESSOR_COMPONENTS, BYTE, FLOAT, QUANTIZATION_EXTENSION, SHORT, SHORT_MAX, UNSIGNED_BYTE,
+                        UNSIGNED_INT, UNSIGNED_SHORT, figure_primitives, figure_to_glb, read_glb, write_glb)
+from merged_mesh import merge_surfaces
+from rose import build_single_rose_figure
+from rose_bouquet import build_rose_bouquet_figure
+from rose_head import build_rose_head_figure
+
+# Numpy types of the accessor component types the exporter writes, and the range of the normalized ones
+TYPES = {BYTE: np.int8, UNSIGNED_BYTE: np.uint8, SHORT: np.int16, UNSIGNED_SHORT: np.uint16,
+         UNSIGNED_INT: np.uint32, FLOAT: np.float32}
+LIMITS = {BYTE: 127, UNSIGNED_BYTE: 255, SHORT: SHORT_MAX}
+
+# Figure builders of the exported scenes
+BUILDERS = {
+    'rose': lambda: build_single_rose_figure(0),
+    'rose_head': build_rose_head_figure,
+    'bouquet': lambda: build_rose_bouquet_figure(0),
+    'merged bouquet': lambda: merge_surfaces(build_rose_bouquet_figure(0)),
+}
+
+
+def accessor_array(document, binary, index):
+    accessor = document['accessors'][index]
+    view = document['bufferViews'][accessor['bufferView']]
+    dtype = np.dtype(TYPES[accessor['componentType']])
+    components = ACCESSOR_COMPONENTS[accessor['type']]
+    stride = view.get('byteStride', dtype.itemsize * components) // dtype.itemsize
+    values = np.frombuffer(binary, dtype, accessor['count'] * stride, view['byteOffset'])
+    values = values.reshape(accessor['count'], stride)[:, :components]
+    return values / LIMITS[accessor['componentType']] if accessor.get('normalized') else values
+
+
+@pytest.fixture(scope='module', params=list(BUILDERS))
+def fig(request):
+    return BUILDERS[request.param]()
+
+
+@pytest.mark.parametrize('quantize', [False, True])
+def test_glb_round_trip(fig, quantize):
+    document, binary = read_glb(figure_to_glb(fig, quantize))
+    primitives = figure_primitives(fig)
+    assert len(document['nodes']) == len(primitives) + 1
+    assert (QUANTIZATION_EXTENSION in document.get('extensionsRequired', [])) == quantize
+
+    # Every primitive, read back into the frame of its node, matches the source traces
+    for node, (_, primitive) in zip(document['nodes'][1:], primitives):
+        mesh = document['meshes'][node['mesh']]
+        attributes = mesh['primitives'][0]['attributes']
+        positions = accessor_array(document, binary, attributes['POSITION'])
+        positions = positions * node.get('scale', 1.0) + node.get('translation', 0.0)
+        step = node['scale'][0] / SHORT_MAX if quantize else 0.0
+        assert np.abs(positions - primitive['positions']).max() <= step / 2 + 1e-5
+
+        indices = accessor_array(document, binary, mesh['primitives'][0]['indices'])
+        assert indices.max() < len(positions)
+        np.testing.assert_array_equal(indices.ravel(), primitive['indices'].ravel())
+
+        colors = accessor_array(document, binary, attributes['COLOR_0'])
+        np.testing.assert_array_equal(np.rint(colors * 255), primitive['colors'])
+        if 'NORMAL' in attributes:
+            normals = accessor_array(document, binary, attributes['NORMAL'])
+            assert np.abs(normals - primitive['normals']).max() < 5e-3
+
+
+def test_quantized_glb_is_smaller(fig):
+    assert len(figure_to_glb(fig, quantize=True)) < len(figure_to_glb(fig))
+
+
+def test_write_glb(tmp_path):
+    fig = build_rose_head_figure()
+    path = tmp_path / 'scene.glb'
+    assert write_glb(fig, path) == path.stat().st_size
+    assert read_glb(path.read_bytes())[0]['asset']['version'] == '2.0'
+
+
+def test_read_glb_rejects_other_files():
+    with pytest.raises(ValueError):
+        read_glb(b'\x89PNG\r\n\x1a\n' + bytes(12))
@@ -0,0 +1,72 @@
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+from lod import (HEAD_TIERS, IMPOSTOR_PIXELS, VIEWPORT, head_sphere, level_report, projected_diameters, select_levels,
+                 tier_limits)
+from rose_bouquet import build_rose_bouquet_figure
+from rose_field import build_rose_field, field_levels, random_rose_field
+
+# A camera low over the field, looking across it, so near and far roses differ most in size
+LOW_CAMERA = dict(eye=dict(x=-1.6, y=-1.6, z=0.25), center=dict(x=0, y=0, z=-0.1))
+
+
+def surface_vertices(fig):
+    # Surface vertices and impostor points, the quantities `level_report` counts
+    return sum(int(np.isfinite(np.asarray(trace.z, dtype=float)).sum()) for trace in fig.data
+               if trace.type == 'surface' or trace.name == 'impostors')
+
+
+def test_tier_limits_descend_to_the_impostor_size():
+    limits = tier_limits()
+    assert len(limits) == len(HEAD_TIERS)
+    assert (np.diff(limits) < 0).all() and limits[-1] == IMPOSTOR_PIXELS
+
+
+def test_select_levels_at_the_tier_limits():
+    limits = tier_limits()
+    diameters = np.concatenate([limits + 0.01, limits - 0.01, [1000.0, 0.0]])
+    levels = select_levels(diameters)
+
+    np.testing.assert_array_equal(levels[:len(limits)], np.arange(len(limits)))
+    np.testing.assert_array_equal(levels[len(limits):-2], np.arange(1, len(limits) + 1))
+    assert list(levels[-2:]) == [0, len(HEAD_TIERS)]
+
+
+def test_bouquet_heads_keep_the_full_resolution():
+    # The bouquet's heads are all close to its camera
+    bouquet = build_rose_bouquet_figure(seed=0)
+    centers = np.array([[(np.nanmin(trace[axis]) + np.nanmax(trace[axis])) / 2 for axis in 'xyz']
+                        for trace in bouquet.data[1:12:2]])
+    bounds = np.concatenate([np.c_[np.ravel(trace.x), np.ravel(trace.y), np.ravel(trace.z)] for trace in bouquet.data])
+    diameters = projected_diameters(bouquet, centers, np.full(len(centers), head_sphere()[1]), bounds)
+
+    assert (select_levels(diameters) == 0).all()
+
+
+def test_spheres_behind_the_camera_have_no_size():
+    fig = go.Figure(layout=dict(scene=dict(camera=dict(eye=dict(x=0, y=0, z=2), up=dict(x=0, y=1, z=0)))))
+    bounds = np.array([[-1, -1, -1], [1, 1, 1]])
+    diameters = projected_diameters(fig, np.array([[0, 0, 0], [0, 0, 0.5], [0, 0, 5]]), np.full(3, 0.1), bounds)
+
+    assert diameters[1] > diameters[0] > 0 and diameters[2] == 0
+
+
+@pytest.mark.parametrize('camera, viewport', [(None, VIEWPORT), (LOW_CAMERA, VIEWPORT), (None, (320, 240))],
+                         ids=['default', 'low', 'thumbnail'])
+def test_field_matches_its_level_report(camera, viewport):
+    layout = random_rose_field(100)
+    report = level_report(field_levels(layout['positions'], layout['heights'], layout['orientations'],
+                                       layout['scales'], camera, viewport=viewport))
+    fig = build_rose_field(**layout, camera=camera, lod=True, viewport=viewport)
+
+    assert surface_vertices(fig) == report['vertices_after']
+    if viewport != VIEWPORT:
+        assert report['vertices_after'] < report['vertices_before']
+
+
+def test_field_without_lod_keeps_every_vertex():
+    layout = random_rose_field(20)
+    report = level_report(field_levels(layout['positions'], layout['heights'], layout['orientations'],
+                                       layout['scales']))
+
+    assert surface_vertices(build_rose_field(**layout)) == report['vertices_before']
@@ -0,0 +1,64 @@
+import re
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+from merged_mesh import colorscale_colors, merge_surfaces, parse_color, surface_grid, trace_colorscales
+from plot_export import decode_typed_array, figure_to_html
+from rose_bouquet import build_rose_bouquet_figure, create_asymmetrical_wrap
+
+# Color strings in every notation Plotly accepts, with the bytes they stand for
+COLORS = [
+    ('rgb(255, 192, 203)', (255, 192, 203)),
+    ('rgba(34, 139, 34, 0.5)', (34, 139, 34)),
+    ('#d2b48c', (210, 180, 140)),
+    ('#0f0', (0, 255, 0)),
+    ('Pink', (255, 192, 203)),
+    ('tan', (210, 180, 140)),
+    ('lightgoldenrodyellow', (250, 250, 210)),
+]
+
+
+@pytest.mark.parametrize('color, expected', COLORS)
+def test_parse_color(color, expected):
+    np.testing.assert_array_equal(parse_color(color), expected)
+
+
+def test_parse_color_rejects_unknown_names():
+    with pytest.raises(ValueError, match='notacolor'):
+        parse_color('notacolor')
+
+
+def test_merged_vertices_keep_their_surface_colors():
+    fig = build_rose_bouquet_figure(0)
+    merged = merge_surfaces(fig)
+
+    meshes = [trace for trace in merged.data if trace.type == 'mesh3d']
+    assert len(meshes) < sum(trace.type == 'surface' for trace in fig.data)
+    for mesh in meshes:
+        sources = [trace for trace in fig.data if trace.type == 'surface'
+                   and (1.0 if trace.opacity is None else trace.opacity) == mesh.opacity]
+        expected = np.concatenate([colorscale_colors(surface_grid(trace)[3], colorscale, trace.cmin, trace.cmax)
+                                   for trace, colorscale in zip(sources, trace_colorscales(sources))])
+        np.testing.assert_array_equal(np.asarray(mesh.vertexcolor), expected[:, :3])
+
+
+def test_default_wrap_color_merges():
+    fig = go.Figure()
+    create_asymmetrical_wrap(fig)
+
+    colors = np.asarray(merge_surfaces(fig).data[0].vertexcolor)
+    assert (colors == (210, 180, 140)).all()
+
+
+@pytest.mark.parametrize('encoding', [None, 'float32'])
+def test_merged_colors_are_written_as_bytes(encoding):
+    merged = merge_surfaces(build_rose_bouquet_figure(0))
+    page = figure_to_html(merged, encoding, include_plotlyjs=False, div_id='plot')
+
+    specs = re.findall(r'"vertexcolor":\{"dtype":"u1","bdata":"([^"]*)","shape":"(\d+),3"\}', page)
+    meshes = [trace for trace in merged.data if trace.type == 'mesh3d']
+    assert len(specs) == len(meshes)
+    for mesh, (bdata, rows) in zip(meshes, specs):
+        # Plotly escapes the slashes of the page's JSON
+        restored = decode_typed_array({'dtype': 'u1', 'bdata': bdata.replace('\\u002f', '/'), 'shape': f'{rows},3'})
+        np.testing.assert_array_equal(restored, mesh.vertexcolor)
@@ -0,0 +1,50 @@
+import html
+import re
+
+import pytest
+from build import ARTIFACTS
+from pages import PLOT_DIR, definition_source, highlight_python, render_page, source_excerpt
+
+# The flower pages the build renders, with the parameters it renders them with
+PAGES = {name: artifact.params for name, artifact in ARTIFACTS.items() if artifact.module == 'pages'}
+
+
+def text(markup):
+    return html.unescape(re.sub(r'<[^>]+>', '', markup))
+
+
+@pytest.mark.parametrize('name', list(PAGES))
+def test_highlighted_code_reads_as_the_excerpt(name):
+    params = PAGES[name]
+    page = render_page(**params)
+
+    # The highlighted code holds every definition verbatim, and the page needs no script to show it
+    code = text(re.search(r'<code[^>]*>(.*)</code>', page, re.DOTALL).group(1))
+    assert code == source_excerpt(params['excerpt'])
+    assert all(definition_source(qualified) in code for qualified in params['excerpt'])
+    assert '<script' not in page
+
+
+@pytest.mark.parametrize('module', ['geometry', 'transforms', 'rose', 'pages'])
+def test_highlighting_keeps_every_character(module):
+    source = (PLOT_DIR / f'{module}.py').read_text(encoding='utf-8')
+    assert text(highlight_python(source)) == source
+
+
+def test_highlight_classes():
+    markup = highlight_python("@lru_cache(maxsize=4)\ndef f(x=None):\n    return len('a') + 1  # one\n")
+    spans = dict((content, css) for css, content in re.findall(r'<span class="([^"]+)">([^<]*)</span>', markup))
+
+    assert spans == {'@': 'hljs-meta', 'lru_cache': 'hljs-meta', 'def': 'hljs-keyword', 'f': 'hljs-title function_',
+                     'None': 'hljs-literal', 'return': 'hljs-keyword', 'len': 'hljs-built_in',
+                     "'a'": 'hljs-string', '1': 'hljs-number', '4': 'hljs-number', '# one': 'hljs-comment'}
+
+
+def test_definition_source_includes_the_comment_above():
+    source = definition_source('geometry.HEAD_LIFT')
+    assert source.startswith('#') and 'HEAD_LIFT =' in source
+
+
+def test_unknown_definitions_are_rejected():
+    with pytest.raises(ValueError, match='no_such_name'):
+        definition_source('geometry.no_such_name')
@@ -0,0 +1,81 @@
+import io
+
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+from plot_export import (COORDINATE_KEYS, ENCODINGS, _coordinate_arrays, decode_typed_array, encode_figure,
+                         figure_to_html, write_html)
+from rose import build_single_rose_figure
+from rose_bouquet import build_rose_bouquet_figure
+from rose_head import build_rose_head_figure
+
+
+@pytest.fixture(scope='module', params=[build_single_rose_figure, build_rose_head_figure, build_rose_bouquet_figure],
+                ids=['rose', 'rose_head', 'bouquet'])
+def fig(request):
+    return request.param()
+
+
+@pytest.mark.parametrize('encoding', ['float32', 'int16'])
+def test_round_trip_within_tolerance(fig, encoding):
+    reference = [values for _, _, values in _coordinate_arrays(fig.to_dict()['data'])]
+    max_abs = max(np.nanmax(np.abs(values)) for values in reference)
+    restored = [decode_typed_array(trace[key]) for trace in encode_figure(fig, encoding)['data']
+                for key in COORDINATE_KEYS if isinstance(trace.get(key), dict)]
+    assert len(restored) == len(reference)
+
+    # float32 keeps ~7 significant digits; int16 is within half a quantization step of the shared scale
+    int16_max = np.iinfo(np.int16).max
+    scale = int16_max / max_abs if encoding == 'int16' else 1.0
+    tolerance = 1e-6 * max_abs if encoding == 'float32' else 0.5 * max_abs / int16_max + 1e-12
+    error = max(np.nanmax(np.abs(values / scale - expected)) for values, expected in zip(restored, reference))
+    assert error <= tolerance
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_streaming_matches_to_html(fig, encoding):
+    html = figure_to_html(fig, encoding, include_plotlyjs='cdn', div_id='plot')
+    stream = io.StringIO()
+    write_html(fig, stream, encoding, include_plotlyjs='cdn', div_id='plot')
+    assert stream.getvalue() == html
+
+
+def test_typed_arrays_shrink_the_page(fig):
+    sizes = {encoding: len(figure_to_html(fig, encoding, include_plotlyjs='cdn')) for encoding in ENCODINGS}
+    assert sizes['float32'] < sizes[None] / 2
+    assert sizes['int16'] < sizes['float32']
+
+
+def test_unknown_encoding_is_rejected(fig):
+    with pytest.raises(ValueError, match='Unsupported encoding'):
+        encode_figure(fig, 'float16')
+
+
+def animated_figure():
+    # A rose head that grows over three frames, the last one reaching beyond the first frame's coordinates
+    fig = build_rose_head_figure()
+    head = fig.data[0]
+    fig.frames = [go.Frame(name=str(size), data=[go.Surface(x=head.x * size, y=head.y * size, z=head.z * size)])
+                  for size in (1, 2, 4)]
+    return fig
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_streaming_matches_to_html_with_frames(encoding):
+    fig = animated_figure()
+    html = figure_to_html(fig, encoding, include_plotlyjs='cdn', div_id='plot')
+    stream = io.StringIO()
+    write_html(fig, stream, encoding, include_plotlyjs='cdn', div_id='plot')
+    assert stream.getvalue() == html
+    assert "Plotly.addFrames('plot'" in html
+
+
+def test_frames_share_the_int16_scale():
+    fig = animated_figure()
+    encoded = encode_figure(fig, 'int16')
+    frames = [decode_typed_array(frame['data'][0][key]) for frame in encoded['frames'] for key in COORDINATE_KEYS]
+
+    # The largest frame sets the scale, so the figure's own traces use only a quarter of the int16 range
+    int16_max = np.iinfo(np.int16).max
+    assert max(np.abs(values).max() for values in frames) == int16_max
+    assert np.abs(decode_typed_array(encoded['data'][0]['z'])).max() <= int16_max / 4 + 1
@@ -0,0 +1,54 @@
+import struct
+import zlib
+
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+from merged_mesh import parse_color
+from poster import SCENES, encode_png, render_figure, write_poster
+
+
+def decode_png(png):
+    # Only the PNGs `encode_png` writes: one IDAT chunk of 8-bit RGB scanlines, all filtered with 'up'
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    width, height = struct.unpack('>II', png[16:24])
+    idat = png.index(b'IDAT')
+    length = struct.unpack('>I', png[idat - 4:idat])[0]
+    scanlines = np.frombuffer(zlib.decompress(png[idat + 4:idat + 4 + length]), np.uint8).reshape(height, -1)
+    assert (scanlines[:, 0] == 2).all()
+    return np.cumsum(scanlines[:, 1:], axis=0, dtype=np.uint8).reshape(height, width, 3)
+
+
+def test_encode_png_round_trip():
+    image = np.random.default_rng(0).integers(0, 256, (31, 17, 3), dtype=np.uint8)
+    np.testing.assert_array_equal(decode_png(encode_png(image)), image)
+
+
+def test_plane_is_covered_without_cracks():
+    # A flat grid seen from above must cover its whole outline, without cracks between triangles
+    grid = np.linspace(-1, 1, 97)
+    camera = dict(eye=dict(x=0, y=0, z=2.5), up=dict(x=0, y=1, z=0))
+    plane = go.Figure(data=[go.Surface(x=grid, y=grid, z=np.zeros((97, 97)), colorscale='Greys')],
+                      layout=dict(paper_bgcolor='black', scene=dict(camera=camera)))
+
+    covered = render_figure(plane, 256, 256).any(axis=2)
+    rows, cols = np.nonzero(covered)
+    assert covered[rows.min():rows.max() + 1, cols.min():cols.max() + 1].all()
+
+
+@pytest.mark.parametrize('scene', list(SCENES))
+def test_poster_draws_the_scene_on_the_background(scene):
+    image = decode_png(write_poster(scene, width=160, height=120))
+    assert image.shape == (120, 160, 3)
+
+    # The corners show the figure's background, the middle shows the scene
+    builder, params = SCENES[scene]
+    background = parse_color(builder(**params).layout.paper_bgcolor or 'white')
+    assert (image[[0, 0, -1, -1], [0, -1, 0, -1]] == background).all()
+    assert (image != background).any(axis=2)[30:90, 40:120].mean() > 0.02
+
+
+def test_write_poster_to_file(tmp_path):
+    path = tmp_path / 'poster.png'
+    assert write_poster('rose_head', width=64, height=64, file=path) is None
+    assert path.read_bytes() == write_poster('rose_head', width=64, height=64)
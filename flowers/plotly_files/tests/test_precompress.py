@@ -0,0 +1,91 @@
+import gzip
+import os
+
+import brotli
+import build
+import numpy as np
+import pytest
+import precompress
+from precompress import CODINGS, MAX_RATIO, compress, load_manifest, served_bytes
+
+
+@pytest.fixture
+def plot_dir(tmp_path, monkeypatch):
+    # A plot directory of its own, so the tests never touch the published files or their manifest
+    monkeypatch.setattr(precompress, 'PLOT_DIR', tmp_path.resolve())
+    monkeypatch.setattr(precompress, 'MANIFEST_PATH', tmp_path / 'compression-manifest.json')
+    (tmp_path / 'page.html').write_text('<p>rose</p>\n' * 1000)
+    (tmp_path / 'noise.bin').write_bytes(np.random.default_rng(0).bytes(4096))
+    (tmp_path / 'poster.png').write_bytes(b'\x89PNG' + bytes(4096))
+    return tmp_path
+
+
+def test_compress_round_trip():
+    data = b'petal ' * 1000
+    assert gzip.decompress(compress(data, '.gz')) == data
+    assert brotli.decompress(compress(data, '.br')) == data
+
+    # No timestamp in the gzip header, so rebuilding gives the same bytes
+    assert compress(data, '.gz') == compress(data, '.gz')
+
+
+def test_compress_rejects_unknown_codings():
+    with pytest.raises(ValueError, match='.zst'):
+        compress(b'', '.zst')
+
+
+def test_precompress_writes_siblings_that_shrink(plot_dir):
+    manifest = precompress.precompress(plot_dir.iterdir())
+    assert set(manifest) == {'page.html', 'noise.bin'}
+    assert manifest == load_manifest()
+
+    page = (plot_dir / 'page.html').read_bytes()
+    for coding in CODINGS:
+        assert (plot_dir / ('page.html' + coding)).read_bytes() == compress(page, coding)
+        assert manifest['page.html'][coding] == len(compress(page, coding))
+
+        # Random bytes do not shrink, so they are served as they are
+        assert not (plot_dir / ('noise.bin' + coding)).exists()
+        assert manifest['noise.bin'][coding] > MAX_RATIO * manifest['noise.bin']['bytes']
+    assert manifest['page.html']['skipped'] == [] and sorted(manifest['noise.bin']['skipped']) == sorted(CODINGS)
+    assert served_bytes(manifest, '.gz') == manifest['page.html']['.gz'] + manifest['noise.bin']['bytes']
+
+
+def test_unchanged_files_are_skipped(plot_dir):
+    manifest = precompress.precompress(plot_dir.iterdir())
+    sibling = plot_dir / 'page.html.br'
+    os.utime(sibling, (0, 0))
+
+    assert precompress.precompress(plot_dir.iterdir()) == manifest
+    assert sibling.stat().st_mtime == 0
+
+    # A deleted sibling is written again
+    sibling.unlink()
+    precompress.precompress(plot_dir.iterdir())
+    assert sibling.exists()
+
+
+def test_stale_siblings_are_removed(plot_dir):
+    precompress.precompress(plot_dir.iterdir())
+    (plot_dir / 'page.html').write_bytes(np.random.default_rng(1).bytes(4096))
+
+    manifest = precompress.precompress(plot_dir.iterdir())
+    assert not any((plot_dir / ('page.html' + coding)).exists() for coding in CODINGS)
+    assert sorted(manifest['page.html']['skipped']) == sorted(CODINGS)
+
+
+def test_brotli_is_required(plot_dir, monkeypatch):
+    monkeypatch.setattr(precompress, 'brotli', None)
+    with pytest.raises(RuntimeError, match='brotli'):
+        precompress.precompress(plot_dir.iterdir())
+    assert not (plot_dir / 'page.html.gz').exists()
+
+
+def test_build_stops_before_writing_without_brotli(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError('build started generating artifacts')
+
+    monkeypatch.setattr(precompress, 'brotli', None)
+    monkeypatch.setattr(build, 'ProcessPoolExecutor', no_pool)
+    with pytest.raises(RuntimeError, match='brotli'):
+        build.build(['rose-plot.html'], force=True)
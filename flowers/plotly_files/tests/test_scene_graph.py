@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from rose_bouquet import build_rose_bouquet_figure
+from scene_graph import SceneGraph, compile_spec, large_bouquet_spec
+
+# Edits of the 50-rose bouquet, with the nodes each one must recompute and nothing else
+EDITS = [
+    ('ring2-11', {'angle_x': 0.5}, ['ring2-11', 'ring2-11/head', 'ring2-11/thorns']),
+    ('ring1-3/head', {'petal_frequency': 4.2}, ['ring1-3/head']),
+    ('ring1-3/head', {'colorscale': 'Purples'}, []),
+    ('center', {'radius': 0.08}, ['center', 'center/thorns']),
+    ('wrap', {'amplitude': 2.0}, ['wrap']),
+]
+
+
+def style(trace):
+    return {name: value for name, value in trace.to_plotly_json().items() if name not in 'xyz'}
+
+
+def test_default_spec_reproduces_the_bouquet():
+    # bouquet.toml draws the built-in bouquet; only the thorns, seeded per stem, differ
+    reference = build_rose_bouquet_figure(seed=0)
+    fig = compile_spec().figure()
+
+    assert len(fig.data) == len(reference.data)
+    for ours, theirs in zip(fig.data, reference.data):
+        assert ours.type == theirs.type
+        if ours.type == 'surface':
+            assert all(np.array_equal(ours[axis], theirs[axis]) for axis in 'xyz')
+            assert ours.colorscale == theirs.colorscale
+
+
+@pytest.mark.parametrize('node_id, params, expected', EDITS)
+def test_update_recomputes_only_the_edited_nodes(node_id, params, expected):
+    graph = compile_spec(large_bouquet_spec())
+    graph.figure()
+
+    graph.update(node_id, **params)
+    graph.figure()
+    assert graph.computed == expected
+
+
+def test_patched_figure_matches_a_fresh_graph():
+    spec = large_bouquet_spec()
+    graph = compile_spec(spec)
+    fig = graph.figure()
+    fresh = SceneGraph(spec)
+    for node_id, params, _ in EDITS:
+        graph.update(node_id, **params)
+        graph.figure()
+        fresh.update(node_id, **params)
+
+    patched, rebuilt = graph.figure(), fresh.figure()
+    assert patched is fig and len(patched.data) == len(rebuilt.data)
+    for ours, theirs in zip(patched.data, rebuilt.data):
+        assert all(np.array_equal(ours[axis], theirs[axis], equal_nan=True) for axis in 'xyz')
+        assert style(ours) == style(theirs)
+
+
+def test_identical_nodes_share_one_buffer():
+    spec = large_bouquet_spec()
+    spec['stems'].append({**spec['stems'][0], 'id': 'twin'})
+    graph = compile_spec(spec)
+    graph.figure()
+
+    assert graph.geometry('twin')['x'] is graph.geometry('center')['x']
+    assert 'twin' not in graph.computed
+
+
+def test_unknown_parameters_are_rejected():
+    graph = compile_spec()
+    with pytest.raises(ValueError, match='petals'):
+        graph.update('center/head', petals=3)
@@ -0,0 +1,117 @@
+import numpy as np
+from geometry import meshgrid_transforms, rotate_xyz, stem_surface, thorn_lines
+from profiling import record_arrays, span
+from typing import TYPE_CHECKING
+
+# Plotly is imported by the functions that build figures, so the flower modules importing these helpers stay cheap
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+
+def create_rose(fig: 'go.Figure', x_offset: float = 0, y_offset: float = 0, z_offset: float = 0, 
+                angle_x: float = 0, angle_y: float = 0, angle_z: float = 0, dtype: np.dtype = np.float64,
+                colorscale: str = 'Reds', template: tuple = None) -> None:
+    """
+    Add a 3D rose shape to a given Plotly figure using specified transformations.
+
+    This function computes the meshgrid transformations to create the 3D coordinates for a rose,
+    applies rotation transformations based on the provided angles, and adds the resulting surface
+    to the given Plotly figure. The rose's position and orientation can be adjusted via offsets
+    and rotation angles.
+
+    Args:
+        fig (go.Figure): The Plotly figure to which the rose will be added.
+        x_offset (float): The offset to apply on the x-axis.
+        y_offset (float): The offset to apply on the y-axis.
+        z_offset (float): The offset to apply on the z-axis.
+        angle_x (float): The rotation angle around the x-axis in radians.
+        angle_y (float): The rotation angle around the y-axis in radians.
+        angle_z (float): The rotation angle around the z-axis in radians.
+        dtype (np.dtype): Floating point type of the rose's coordinates.
+        colorscale (str): The Plotly colorscale of the rose head.
+        template (tuple, optional): The (X, Y, Z) head to place instead of the default one (see
+            `geometry.meshgrid_transforms`).
+    """
+    import plotly.graph_objects as go
+
+    with span('rose geometry'):
+        # Generate the 3D coordinates for the rose shape with the given offsets
+        X, Y, Z = meshgrid_transforms(x_offset, y_offset, z_offset, dtype=dtype, template=template)
+        
+        # Rotate the coordinates based on the specified angles
+        X, Y, Z = rotate_xyz(X, Y, Z, angle_x, angle_y, angle_z)
+        record_arrays(X, Y, Z)
+    
+    # Add the computed surface to the Plotly figure, with a red color scale by default
+    with span('Surface trace'):
+        fig.add_trace(go.Surface(x=X, y=Y, z=Z, colorscale=colorscale, showscale=False))
+
+
+def create_stem(fig: 'go.Figure', height: float = 1, radius: float = 0.05, x_offset: float = 0, y_offset: float = 0, 
+                z_offset: float = 0, curve_factor: float = 0.2, thorn_frequency: int = 5, angle_x: float = 0, 
+                angle_y: float = 0, angle_z: float = 0, rng: np.random.Generator = None,
+                add_thorns: bool = True, dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Adds a 3D stem with optional thorns to a Plotly figure.
+
+    This function creates a 3D cylindrical stem with curvature and thorns based on the provided parameters.
+    It supports transformations such as rotation and translation (offsets), and allows customization of
+    the stem's appearance through parameters such as height, radius, and curvature. The stem and thorns
+    are then added to the provided Plotly figure object, with all thorns of the stem drawn as a single
+    line trace. Callers drawing many stems can pass `add_thorns=False` and merge the returned segments
+    of every stem into one trace with `add_thorn_trace`.
+
+    Args:
+        fig (go.Figure): The Plotly figure to which the stem will be added.
+        height (float): The height of the stem.
+        radius (float): The base radius of the stem.
+        x_offset (float): Horizontal offset on the x-axis.
+        y_offset (float): Horizontal offset on the y-axis.
+        z_offset (float): Vertical offset along the z-axis.
+        curve_factor (float): Factor that determines the magnitude of the stem's curvature.
+        thorn_frequency (int): Frequency of thorns per unit height of the stem.
+        angle_x (float): Rotation angle around the x-axis in radians.
+        angle_y (float): Rotation angle around the y-axis in radians.
+        angle_z (float): Rotation angle around the z-axis in radians.
+        rng (np.random.Generator, optional): Generator used to draw the thorn angles. A freshly
+            seeded generator is used if None.
+        add_thorns (bool): Whether to add the thorns to the figure as a line trace.
+        dtype (np.dtype): Floating point type of the stem's and thorns' coordinates.
+
+    Returns:
+        np.ndarray: An array of shape (num_thorns, 2, 3) holding the rotated start and end point
+                    of every thorn.
+    """
+    import plotly.graph_objects as go
+
+    x, y, z, thorn_points = stem_surface(height, radius, x_offset, y_offset, z_offset, curve_factor, thorn_frequency,
+                                         angle_x, angle_y, angle_z, rng, dtype)
+
+    # Add the stem's surface to the figure
+    with span('Surface trace'):
+        fig.add_trace(go.Surface(x=x, y=y, z=z, colorscale='Greens', showscale=False))
+
+    # Add thorns as a single line trace to the figure
+    if add_thorns:
+        add_thorn_trace(fig, thorn_points)
+
+    return thorn_points
+
+
+def add_thorn_trace(fig: 'go.Figure', thorn_points: np.ndarray) -> None:
+    """
+    Add any number of thorn segments to a figure as a single line trace.
+
+    The segments are laid out by `geometry.thorn_lines`, with a NaN gap between consecutive
+    thorns. This replaces one trace per thorn with one trace overall.
+
+    Args:
+        fig (go.Figure): The Plotly figure to which the thorns will be added.
+        thorn_points (np.ndarray): An array of shape (num_thorns, 2, 3) of thorn start and end points.
+    """
+    import plotly.graph_objects as go
+
+    x, y, z = thorn_lines(thorn_points)
+
+    with span('thorn trace'):
+        fig.add_trace(go.Scatter3d(x=x, y=y, z=z, mode='lines', line=dict(color='Green', width=4)))